@@ -26,4 +26,7 @@ setup(name='sosw',
       packages=find_packages(exclude=['docs', 'test', 'examples', "*.test", "*.test.*"]),
       install_requires=[
           'boto3>=1.20'
-      ])
+      ],
+      extras_require={
+          'zstd': ['zstandard'],
+      })
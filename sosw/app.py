@@ -41,6 +41,7 @@ except ImportError:
     logger.setLevel(logging.INFO)
 
 import boto3
+import botocore.config
 import os
 
 from collections import defaultdict
@@ -172,8 +173,14 @@ class Processor:
 
             else:
                 # The other supported option is to load boto3 client if it exists.
+                # The optional `{module_name}_config` is passed as ``botocore.config.Config`` for it.
                 try:
-                    setattr(self, f"{module_name}_client", boto3.client(module_name))
+                    boto3_client_config = self.config.get(f"{module_name}_config")
+                    if boto3_client_config:
+                        client = boto3.client(module_name, config=botocore.config.Config(**boto3_client_config))
+                    else:
+                        client = boto3.client(module_name)
+                    setattr(self, f"{module_name}_client", client)
                     continue
                 except Exception:
                     raise RuntimeError(f"Failed to import for service {module_name}. Component naming problem.")
@@ -0,0 +1,199 @@
+"""
+..  hidden-code-block:: text
+    :label: View Licence Agreement <br>
+
+    sosw - Serverless Orchestrator of Serverless Workers
+
+    The MIT License (MIT)
+    Copyright (C) 2024  sosw core contributors <info@sosw.app>
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+
+__all__ = ['DurationStats']
+__author__ = "Nikolay Grishchenko"
+__version__ = "1.0"
+
+try:
+    from aws_lambda_powertools import Logger
+
+    logger = Logger(child=True)
+
+except ImportError:
+    import logging
+
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+
+import math
+import time
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class DurationStats:
+    """
+    Running statistics of durations stored as a flat record of numeric attributes that is updated only
+    with atomic increments. Any number of concurrent writers can update the same record (e.g. a DynamoDB item)
+    with a single ``UpdateItem`` without reading it first. The records are also mergeable by summing attributes.
+
+    The record consists of:
+
+    - `count` and `total` of the durations.
+    - The quantile sketch (similar to DDSketch): counters of logarithmic buckets `q_{index}`. The quantiles
+      are estimated with the ``relative_accuracy`` (2% by default) of the value.
+    - The exponentially weighted moving average (EWMA) in time with the ``halflife`` in seconds. The weights grow
+      exponentially in time (forward decay), so the older values lose weight without ever updating them.
+      To keep the numbers small, the weights are relative to the start of the epoch of 4 halflives: `ews_{epoch}`
+      and `eww_{epoch}` are the weighted sum and the sum of weights. The epochs older than the previous one are
+      removed by the writers.
+
+    ..  code-block:: python
+
+        increments, to_remove = DurationStats().get_increments(42.5)
+        dynamo_db_client.update(keys={'labourer_id': 'some_function'}, attributes_to_increment=increments,
+                                attributes_to_remove=to_remove, table_name='sosw_labourer_stats')
+    """
+
+    EPOCH_HALFLIVES = 4
+
+
+    def __init__(self, relative_accuracy: float = 0.02, min_value: float = 0.01, halflife: float = 3600):
+        """
+        :param float relative_accuracy: Relative accuracy of the estimated quantiles.
+        :param float min_value:         The durations below this value are counted in the lowest bucket.
+        :param float halflife:          Halflife of the weights of EWMA in seconds.
+        """
+
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.halflife = halflife
+
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._decay = math.log(2) / halflife
+        self._epoch_length = self.EPOCH_HALFLIVES * halflife
+
+
+    def bucket_index(self, value: float) -> int:
+        """ Index of the sketch bucket for the `value`. The bucket `i` holds values in (min * gamma^(i-1), min * gamma^i]. """
+
+        if value <= self.min_value:
+            return 0
+
+        return math.ceil(math.log(value / self.min_value) / self._log_gamma)
+
+
+    def bucket_value(self, index: int) -> float:
+        """ Representative value of the bucket with the relative error not greater than ``relative_accuracy``. """
+
+        if index <= 0:
+            return self.min_value
+
+        return self.min_value * 2 * self.gamma ** index / (self.gamma + 1)
+
+
+    def get_epoch(self, now: float) -> int:
+        return int(now // self._epoch_length)
+
+
+    def get_increments(self, duration: float, now: Optional[float] = None) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Calculate the increments of the record attributes to add the `duration`.
+
+        :param float duration:  Duration in seconds.
+        :param float now:       Timestamp of the duration. Default: current time.
+        :return:                Tuple of the dictionary of increments (numeric strings) and names of attributes
+                                to remove from the record (expired epochs of EWMA).
+        """
+
+        now = time.time() if now is None else now
+        epoch = self.get_epoch(now)
+        weight = math.exp(self._decay * (now - epoch * self._epoch_length))
+
+        increments = {
+            'count':                                '1',
+            'total':                                f"{duration:.6f}",
+            f"q_{self.bucket_index(duration)}":     '1',
+            f"ews_{epoch}":                         f"{duration * weight:.6f}",
+            f"eww_{epoch}":                         f"{weight:.6f}",
+        }
+
+        return increments, [f"ews_{epoch - 2}", f"eww_{epoch - 2}"]
+
+
+    def get_buckets(self, record: Dict) -> Dict[int, int]:
+        """ Extract the sketch buckets from the `record`. """
+
+        return {int(k[2:]): int(v) for k, v in record.items() if k.startswith('q_') and v}
+
+
+    def quantile(self, buckets: Dict[int, int], q: float) -> Optional[float]:
+        """ Estimate the quantile `q` (0..1) from the sketch `buckets`. """
+
+        count = sum(buckets.values())
+        if not count:
+            return None
+
+        rank = q * (count - 1)
+        seen = 0
+        for index in sorted(buckets):
+            seen += buckets[index]
+            if seen > rank:
+                return self.bucket_value(index)
+
+
+    def ewma(self, record: Dict) -> Optional[float]:
+        """ Exponentially weighted moving average of the durations from the `record`. """
+
+        epochs = [int(k[4:]) for k in record if k.startswith('ews_')]
+        if not epochs:
+            return None
+
+        latest = max(epochs)
+        weighted_sum = weights = 0.0
+        for epoch in epochs:
+            # Rescale the weights of older epochs to the start of the latest one.
+            scale = math.exp(-self._decay * (latest - epoch) * self._epoch_length)
+            weighted_sum += float(record[f"ews_{epoch}"]) * scale
+            weights += float(record.get(f"eww_{epoch}", 0)) * scale
+
+        return weighted_sum / weights if weights else None
+
+
+    def summarize(self, record: Optional[Dict], quantiles: Iterable[float] = (0.5, 0.95, 0.99)) -> Dict:
+        """
+        Summary of the `record`: `count`, `average`, `ewma` and the `quantiles` as `p50`, `p95`, etc.
+        The values are None if the record is empty.
+        """
+
+        record = record or {}
+        count = int(record.get('count', 0))
+        buckets = self.get_buckets(record)
+
+        result = {
+            'count':   count,
+            'average': float(record['total']) / count if count else None,
+            'ewma':    self.ewma(record),
+        }
+
+        for q in quantiles:
+            result[f"p{round(q * 100)}"] = self.quantile(buckets, q)
+
+        return result
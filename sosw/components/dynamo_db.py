@@ -54,6 +54,7 @@ from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
 
 from .benchmark import benchmark
 from .helpers import chunks, to_bool
+from .rate_limiter import TokenBucket
 
 
 class DynamoDbClient:
@@ -81,6 +82,9 @@ class DynamoDbClient:
 
     """
 
+    # Maximum number of actions in a single ``TransactWriteItems`` call.
+    TRANSACT_WRITE_MAX_ITEMS = 100
+
 
     def __init__(self, config):
         assert isinstance(config, dict), "Config must be provided during DynamoDbClient initialization"
@@ -824,6 +828,89 @@ class DynamoDbClient:
         return result
 
 
+    def batch_write_items_one_table(self, rows: List[Dict], table_name: Optional[str] = None, max_retries: int = 5,
+                                    retry_wait_base_time: float = 0.2, rate_limiter: Optional[TokenBucket] = None):
+        """
+        Puts a batch of items to a single dynamo table. Rows are sent in chunks of 25 items (limit of
+        ``batch_write_item``). Existing items with the same keys are overwritten.
+
+        :param list rows:   Rows to put to the table. key is column name, value is value.
+
+        Optional
+
+        :param str table_name:
+        :param int max_retries: If some items were not processed (e.g. throttled), retry them this many times.
+                                Waiting between retries is multiplied by 2 after each retry.
+        :param float retry_wait_base_time: Wait this much time after first retry. Will wait twice longer in each retry.
+        :param rate_limiter:    TokenBucket of WCU to pace the writes. Every request waits for tokens for its items
+                                and then consumes the actual ``ConsumedCapacity`` reported by DynamoDB. Throttling
+                                (unprocessed items or ``ProvisionedThroughputExceededException``) backs it off.
+        :raises Exception:  If some items are still unprocessed after all the retries.
+        """
+
+        table_name = self._get_validate_table_name(table_name)
+
+        put_requests = [{'PutRequest': {'Item': self.dict_to_dynamo(row, strict=False)}} for row in rows]
+
+
+        def get_unprocessed_items(db_result):
+            return db_result.get('UnprocessedItems', {}).get(table_name)
+
+
+        def write(items):
+            if rate_limiter:
+                rate_limiter.wait(len(items))
+
+            try:
+                result = self.dynamo_client.batch_write_item(RequestItems={table_name: items},
+                                                             ReturnConsumedCapacity='TOTAL')
+            except self.dynamo_client.exceptions.ProvisionedThroughputExceededException:
+                if not rate_limiter:
+                    raise
+                logger.warning("batch_write_item throttled for %s items to %s", len(items), table_name)
+                result = {'UnprocessedItems': {table_name: items}}
+
+            self.stats['dynamo_batch_write_queries'] += 1
+
+            consumed = sum(x.get('CapacityUnits', 0) for x in result.get('ConsumedCapacity', []))
+            self.stats['dynamo_batch_write_consumed_wcu'] += consumed
+
+            if rate_limiter:
+                rate_limiter.consume(consumed)
+                if get_unprocessed_items(result):
+                    rate_limiter.throttled()
+                else:
+                    rate_limiter.succeeded()
+
+            return result
+
+
+        for put_requests_chunk in chunks(put_requests, 25):
+
+            logger.debug("batch_write_item of %s items to %s", len(put_requests_chunk), table_name)
+            latest_result = write(put_requests_chunk)
+            unprocessed_items = get_unprocessed_items(latest_result)
+
+            retry_num = 0
+            wait_time = retry_wait_base_time
+            while unprocessed_items and retry_num < max_retries:
+                logger.warning("batch_write_item action did NOT finish successfully. Retrying %s unprocessed items.",
+                               len(unprocessed_items))
+                # With the rate limiter, the backoff is handled by the throttled bucket itself.
+                if not rate_limiter:
+                    time.sleep(wait_time)
+                latest_result = write(unprocessed_items)
+                self.stats['dynamo_batch_write_retries'] += 1
+                retry_num += 1
+                wait_time *= 2
+                unprocessed_items = get_unprocessed_items(latest_result)
+
+            # After the retries still we have a bad result... then raise Exception
+            if unprocessed_items:
+                raise Exception(f"batch_write_items action failed for table {table_name}, "
+                                f"unprocessed items: {unprocessed_items}")
+
+
     def build_put_query(self, row, table_name=None, overwrite_existing=True):
         table_name = self._get_validate_table_name(table_name)
         dynamo_formatted_row = self.dict_to_dynamo(row, strict=False)
@@ -890,30 +977,11 @@ class DynamoDbClient:
         self.put(row, table_name, overwrite_existing=False)
 
 
-    # @benchmark
-    def update(self, keys: Dict, attributes_to_update: Optional[Dict] = None,
-               attributes_to_increment: Optional[Dict] = None, table_name: Optional[str] = None,
-               condition_expression: Optional[str] = None, attributes_to_remove: Optional[List[str]] = None):
-        """
-        Updates an item in DynamoDB. Will create a new item if it doesn't exist.
-        IMPORTANT - If you want to make sure it exists, use ``patch`` method
-
-        :param dict keys:
-            Keys and values of the row we update.
-            Example, in a table where the hash key is 'hk' and the range key is 'rk':
-            ``{'hk': 'cat', 'rk': '123'}``
-        :param dict attributes_to_update:
-            Dict of the attributes to be updated.
-            Can contain both existing attributes and new attributes.
-            Will update existing, and create new attributes.
-            Example: ``{'col_name': 'some_value'}``
-        :param dict attributes_to_increment:
-            Attribute names to increment, and the value to increment by. If the attribute doesn't exist, will create it.
-            Example: ``{'some_counter': '3'}``
-        :param list attributes_to_remove: Will remove these attributes from the record
-        :param str condition_expression: Condition Expression that must be fulfilled on the object to update.
-        :param str table_name: Name of the table
-        """
+    def build_update_query(self, keys: Dict, attributes_to_update: Optional[Dict] = None,
+                           attributes_to_increment: Optional[Dict] = None, table_name: Optional[str] = None,
+                           condition_expression: Optional[str] = None,
+                           attributes_to_remove: Optional[List[str]] = None) -> Dict:
+        """ Construct the query for ``update_item``. For the description of arguments see ``update()``. """
 
         table_name = self._get_validate_table_name(table_name)
 
@@ -969,11 +1037,53 @@ class DynamoDbClient:
                 update_item_query['ExpressionAttributeValues'] = update_item_query.get('ExpressionAttributeValues', {})
                 update_item_query['ExpressionAttributeValues'].update(values)
 
+        return update_item_query
+
+
+    # @benchmark
+    def update(self, keys: Dict, attributes_to_update: Optional[Dict] = None,
+               attributes_to_increment: Optional[Dict] = None, table_name: Optional[str] = None,
+               condition_expression: Optional[str] = None, attributes_to_remove: Optional[List[str]] = None,
+               return_values: Optional[str] = None) -> Optional[Dict]:
+        """
+        Updates an item in DynamoDB. Will create a new item if it doesn't exist.
+        IMPORTANT - If you want to make sure it exists, use ``patch`` method
+
+        :param dict keys:
+            Keys and values of the row we update.
+            Example, in a table where the hash key is 'hk' and the range key is 'rk':
+            ``{'hk': 'cat', 'rk': '123'}``
+        :param dict attributes_to_update:
+            Dict of the attributes to be updated.
+            Can contain both existing attributes and new attributes.
+            Will update existing, and create new attributes.
+            Example: ``{'col_name': 'some_value'}``
+        :param dict attributes_to_increment:
+            Attribute names to increment, and the value to increment by. If the attribute doesn't exist, will create it.
+            Example: ``{'some_counter': '3'}``
+        :param list attributes_to_remove: Will remove these attributes from the record
+        :param str condition_expression: Condition Expression that must be fulfilled on the object to update.
+        :param str table_name: Name of the table
+        :param str return_values: Optional `ReturnValues` of the UpdateItem call (e.g. ``'ALL_NEW'``).
+            If specified, the returned attributes are converted to a dictionary (all fields) and returned.
+        """
+
+        update_item_query = self.build_update_query(keys=keys, attributes_to_update=attributes_to_update,
+                                                    attributes_to_increment=attributes_to_increment,
+                                                    table_name=table_name, condition_expression=condition_expression,
+                                                    attributes_to_remove=attributes_to_remove)
+
+        if return_values:
+            update_item_query['ReturnValues'] = return_values
+
         logger.debug("Updating an item, query: %s", update_item_query)
         response = self.dynamo_client.update_item(**update_item_query)
         logger.debug("Update result: %s", response)
         self.stats['dynamo_update_queries'] += 1
 
+        if return_values:
+            return self.dynamo_to_dict(response.get('Attributes', {}), fetch_all_fields=True)
+
 
     def patch(self, keys: Dict, attributes_to_update: Optional[Dict] = None,
               attributes_to_increment: Optional[Dict] = None, table_name: Optional[str] = None,
@@ -1001,30 +1111,39 @@ class DynamoDbClient:
         self.dynamo_client.delete_item(**query)
 
 
-    def make_put_transaction_item(self, row, table_name=None):
-        return {'Put': self.build_put_query(row, table_name)}
+    def make_put_transaction_item(self, row, table_name=None, overwrite_existing=True):
+        return {'Put': self.build_put_query(row, table_name, overwrite_existing)}
 
 
     def make_delete_transaction_item(self, row, table_name):
         return {'Delete': self.build_delete_query(row, table_name)}
 
 
+    def make_update_transaction_item(self, keys: Dict, table_name: Optional[str] = None, **kwargs):
+        """ Accepts the same arguments as ``update()`` except for `return_values`. """
+
+        return {'Update': self.build_update_query(keys, table_name=table_name, **kwargs)}
+
+
     def transact_write(self, *transactions: Dict):
         """
         Executes many write transaction. Can execute operations on different tables.
-        Will split transactions to chunks - because transact_write_items accepts up to 10 actions.
-        WARNING: If you're expecting a transaction on more than 10 operations - AWS DynamoDB doesn't support it.
+        Will split transactions to chunks - because transact_write_items accepts up to 100 actions
+        (``TRANSACT_WRITE_MAX_ITEMS``).
+        WARNING: If you're expecting a transaction on more than 100 operations - AWS DynamoDB doesn't support it.
+        Every chunk is a separate transaction.
 
         ..  code-block:: python
 
             dynamo_db_client = DynamoDbClient(config)
             t1 = dynamo_db_client.make_put_transaction_item(row, table_name='table1')
             t2 = dynamo_db_client.make_delete_transaction_item(row, table_name='table2')
-            dynamo_db_client.transact_write(t1, t2)
+            t3 = dynamo_db_client.make_update_transaction_item(keys, attributes_to_increment={'cnt': 1})
+            dynamo_db_client.transact_write(t1, t2, t3)
 
         """
 
-        supported_actions = ['Put', 'Delete']
+        supported_actions = ['Put', 'Delete', 'Update']
         for t in transactions:
             assert isinstance(t, dict), "transaction must be a dictionary"
             assert len(t) == 1, "one transaction must contain only one operation"
@@ -1034,7 +1153,7 @@ class DynamoDbClient:
             assert isinstance(t[action], dict), f"transaction[{action}] must be a dictionary. bad type: " \
                                                 f"{type(t[action])}"
 
-        for t_chunk in chunks(transactions, 10):
+        for t_chunk in chunks(transactions, self.TRANSACT_WRITE_MAX_ITEMS):
             logger.debug("Transactions: %s", t_chunk)
 
             response = self.dynamo_client.transact_write_items(TransactItems=t_chunk)
@@ -0,0 +1,183 @@
+"""
+..  hidden-code-block:: text
+    :label: View Licence Agreement <br>
+
+    sosw - Serverless Orchestrator of Serverless Workers
+
+    The MIT License (MIT)
+    Copyright (C) 2024  sosw core contributors <info@sosw.app>
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+
+__all__ = ['FramedFileWriter', 'read_frames', 'get_compression', 'COMPRESSION_EXTENSIONS']
+__author__ = "Nikolay Grishchenko"
+__version__ = "1.0"
+
+try:
+    from aws_lambda_powertools import Logger
+
+    logger = Logger(child=True)
+
+except ImportError:
+    import logging
+
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+
+import gzip
+import struct
+
+from typing import BinaryIO, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSION_EXTENSIONS = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+FRAME_HEADER = struct.Struct('>I')
+
+
+def get_compression(file_name: str) -> Optional[str]:
+    """ Identify the compression of framed file by extension. Returns None for plain (not framed) files. """
+
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if file_name.endswith(extension):
+            return compression
+
+
+def _validate_compression(compression: str):
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unsupported compression: {compression}. Supported: {list(COMPRESSION_EXTENSIONS)}")
+
+    if compression == 'zstd' and zstandard is None:
+        raise RuntimeError("The `zstd` compression requires the `zstandard` package. Install `sosw[zstd]`.")
+
+
+def compress(data: bytes, compression: str) -> bytes:
+    _validate_compression(compression)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(data: bytes, compression: str) -> bytes:
+    _validate_compression(compression)
+    if compression == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class FramedFileWriter:
+    """
+    Writes text rows to a file as a sequence of independently compressed frames.
+
+    Every frame is a 4 byte big-endian length of the compressed block followed by the block itself.
+    The block holds up to `rows_per_frame` rows. As frames do not depend on each other, the reading may start
+    at the byte offset of any frame (e.g. a checkpoint or a ranged download from S3).
+
+    ..  code-block:: python
+
+        with FramedFileWriter('/tmp/queue.txt.gz', compression='gzip', rows_per_frame=50) as f:
+            for row in rows:
+                f.write(f"{json.dumps(row)}\n")
+    """
+
+    def __init__(self, file_name: str, compression: str, rows_per_frame: int = 50):
+        _validate_compression(compression)
+
+        self.compression = compression
+        self.rows_per_frame = rows_per_frame
+        self._file = open(file_name, 'wb')
+        self._rows = []
+
+
+    def write(self, row: str):
+        """ Buffer the `row`. The row should end with a newline. """
+
+        self._rows.append(row)
+        if len(self._rows) >= self.rows_per_frame:
+            self.flush()
+
+
+    def flush(self):
+        """ Write the buffered rows as a frame. """
+
+        if not self._rows:
+            return
+
+        block = compress(''.join(self._rows).encode(), self.compression)
+        self._file.write(FRAME_HEADER.pack(len(block)))
+        self._file.write(block)
+        self._rows = []
+
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Do not write the partial frame if something went wrong.
+        if exc_type is not None:
+            self._rows = []
+        self.close()
+
+
+def read_frames(f: BinaryIO, compression: str, rows: int = 1) -> List[str]:
+    """
+    Read whole frames from the current position of the binary file `f` until at least `rows` rows are read
+    or the file ends. The position of `f` is left at the beginning of the next frame.
+
+    :param f:               File opened in binary mode.
+    :param compression:     Compression of frames.
+    :param rows:            Minimum number of rows to read.
+    :return:                List of rows (with newlines).
+    """
+
+    result = []
+
+    while len(result) < rows:
+        header = f.read(FRAME_HEADER.size)
+        if not header:
+            break
+
+        if len(header) < FRAME_HEADER.size:
+            raise ValueError(f"Truncated frame header in file {f.name}")
+
+        size, = FRAME_HEADER.unpack(header)
+        block = f.read(size)
+        if len(block) < size:
+            raise ValueError(f"Truncated frame in file {f.name}")
+
+        result.extend(decompress(block, compression).decode().splitlines(keepends=True))
+
+    return result
@@ -57,6 +57,7 @@ __all__ = ['validate_account_to_dashed',
            'trim_arn_to_name',
            'trim_arn_to_account',
            'make_hash',
+           'make_stable_hash',
            'to_bool',
            'get_message_dict_from_sns_event',
            'is_event_from_sns',
@@ -911,6 +912,34 @@ def make_hash(o):
     return hash(tuple(frozenset(sorted(new_o.items()))))
 
 
+def _normalize_for_stable_hash(o):
+    if isinstance(o, dict):
+        return {str(k): _normalize_for_stable_hash(v) for k, v in o.items()}
+
+    if isinstance(o, (tuple, list)):
+        return [_normalize_for_stable_hash(e) for e in o]
+
+    # Sets have no order, so sort them by the canonical representation of elements.
+    if isinstance(o, (set, frozenset)):
+        return sorted([_normalize_for_stable_hash(e) for e in o],
+                      key=lambda x: json.dumps(x, sort_keys=True, default=str))
+
+    return o
+
+
+def make_stable_hash(o) -> str:
+    """
+    Makes a SHA-256 hex digest of a dictionary, list, tuple or set to any level.
+
+    Unlike ``make_hash()`` the result does not depend on the built-in ``hash()``, so it is stable
+    between processes and invocations. The order of keys in dictionaries and elements in sets does not matter.
+    Tuples are treated as lists, values that are not JSON serializable are converted to strings.
+    """
+
+    canonical = json.dumps(_normalize_for_stable_hash(o), sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
 def to_bool(val):
     if isinstance(val, (bool, int, float)):
         return bool(val)
@@ -0,0 +1,281 @@
+"""
+..  hidden-code-block:: text
+    :label: View Licence Agreement <br>
+
+    sosw - Serverless Orchestrator of Serverless Workers
+
+    The MIT License (MIT)
+    Copyright (C) 2024  sosw core contributors <info@sosw.app>
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+
+__all__ = ['InvocationController', 'CoefficientInvocationController', 'AIMDInvocationController',
+           'LabourerObservation', 'get_invocation_controller']
+__author__ = "Nikolay Grishchenko"
+__version__ = "1.0"
+
+try:
+    from aws_lambda_powertools import Logger
+
+    logger = Logger(child=True)
+
+except ImportError:
+    import logging
+
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+
+import math
+import threading
+import time
+
+from collections import defaultdict
+from copy import deepcopy
+from importlib import import_module
+from typing import Any, Callable, Dict, Optional
+
+from sosw.components.helpers import recursive_update
+from sosw.labourer import Labourer
+
+
+class LabourerObservation:
+    """
+    Lazy observation of the Labourer state for the InvocationController.
+
+    The values are calculated by the given getters on the first access and cached, so the controller pays
+    (e.g. DynamoDB queries for the queue length) only for the values it really uses.
+
+    ..  code-block:: python
+
+        observation = LabourerObservation(health=lambda: 4, running=lambda: task_client.count_running(labourer))
+        observation.get('running')
+    """
+
+    def __init__(self, **getters: Callable[[], Any]):
+        self._getters = getters
+        self._values = {}
+
+
+    def get(self, name: str) -> Any:
+        """ Value of the observed parameter `name`. Raises KeyError if there is no getter for it. """
+
+        if name not in self._values:
+            self._values[name] = self._getters[name]()
+
+        return self._values[name]
+
+
+class InvocationController:
+    """
+    Base class of controllers deciding how many tasks the Orchestrator should invoke for a Labourer in this tick.
+
+    The Orchestrator creates one controller for the container (it survives warm invocations) and calls
+    ``get_invocation_number()`` for every Labourer in every dispatch cycle. After the invocation it reports back
+    the number of actually invoked tasks with ``record_invocations()``, so the controller can keep its state
+    between the ticks.
+
+    The available parameters of :class:`LabourerObservation`:
+
+    - `health`              - Eco status of the Labourer (see ECO_STATUSES)
+    - `max_invocations`     - Maximum simultaneous invocations configured for the Labourer
+    - `running`             - Number of currently running tasks
+    - `queue_length`        - Number of tasks waiting in the queue
+    - `average_duration`    - Average duration of tasks in seconds (may be None if unknown)
+
+    Custom implementations should inherit this class and can be configured for the Orchestrator with
+    ``config['invocation_controller']`` as a dotted path to the class.
+    """
+
+    DEFAULT_CONFIG = {}
+
+
+    def __init__(self, config: Optional[Dict] = None):
+        self.config = recursive_update(deepcopy(self.DEFAULT_CONFIG), config or {})
+        self.stats = defaultdict(int)
+
+
+    def get_invocation_number(self, labourer: Labourer, observation: LabourerObservation) -> int:
+        """ Number of tasks to invoke for the `labourer` now. """
+        raise NotImplementedError
+
+
+    def record_invocations(self, labourer: Labourer, count: int):
+        """ Feedback from the Orchestrator with the number of tasks actually invoked for the `labourer`. """
+        pass
+
+
+class CoefficientInvocationController(InvocationController):
+    """
+    The classic behaviour of the Orchestrator. The desired number of running tasks is `max_invocations` multiplied
+    by the coefficient for the current `health` (``config['invocation_number_coefficient']``).
+    The controller invokes the difference between desired and `running`.
+    """
+
+    DEFAULT_CONFIG = {
+        'invocation_number_coefficient': {
+            0: 0,
+            1: 0,
+            2: 0.5,
+            3: 0.75,
+            4: 1
+        },
+    }
+
+
+    def get_invocation_number(self, labourer: Labourer, observation: LabourerObservation) -> int:
+
+        health = observation.get('health')
+        coefficient = next(v for k, v in self.config['invocation_number_coefficient'].items() if health == k)
+
+        desired = int(math.floor(observation.get('max_invocations') * coefficient))
+        running = observation.get('running')
+
+        logger.info(f"Labourer: {labourer.id} has currently running {running} tasks and desired {desired} "
+                    f"with respect to status {health}.")
+
+        return max(desired - running, 0)
+
+
+class AIMDInvocationController(InvocationController):
+    """
+    Additive increase / multiplicative decrease of the concurrency limit of every Labourer, similar to
+    the congestion control of TCP.
+
+    - If the `health` went down since the previous tick or is not better than ``backoff_health``,
+      the limit is multiplied by ``decrease_factor``. With the `health` 0 nothing is invoked at all.
+    - Otherwise, if the limit was saturated in the previous tick (running + invoked reached it), the limit grows
+      by the number of tasks completed since the previous tick, but at least by ``additive_increase``.
+      Throughput of the Labourer speeds up the growth, so backlogs of short tasks are drained faster.
+    - The limit stays between ``min_limit`` and `max_invocations` of the Labourer.
+
+    The number of invocations is limited by the concurrency required to drain the `queue_length` during
+    ``drain_seconds`` with the `average_duration` of tasks. This saves the downstream resources from bursts
+    that would not make the queue drain faster.
+
+    The completions are estimated from the previous tick: running + invoked then, minus running now.
+    """
+
+    DEFAULT_CONFIG = {
+        # The limit of a new Labourer as a share of its `max_invocations`.
+        'initial_limit_share': 0.5,
+        'min_limit':           1,
+        'additive_increase':   1,
+        'decrease_factor':     0.5,
+        # Decrease the limit if health is at this eco status or lower.
+        'backoff_health':      2,
+        # Desired time to drain the current queue. Limits the concurrency for short queues.
+        'drain_seconds':       60,
+    }
+
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.state: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+
+    def get_limit(self, labourer: Labourer, observation: LabourerObservation) -> float:
+        """ Update the concurrency limit of the `labourer` with the `observation` and return it. """
+
+        _cfg = self.config.get
+
+        health = observation.get('health')
+        running = observation.get('running')
+        max_invocations = observation.get('max_invocations')
+
+        with self._lock:
+            state = self.state.setdefault(labourer.id, {})
+
+        limit = state.get('limit')
+        if limit is None:
+            limit = max(_cfg('min_limit'), max_invocations * _cfg('initial_limit_share'))
+
+        elif health < state['health'] or health <= _cfg('backoff_health'):
+            limit = limit * _cfg('decrease_factor')
+            with self._lock:
+                self.stats['invocation_controller_decreases'] += 1
+
+        elif state['running'] + state['invoked'] >= math.floor(limit):
+            completed = max(0, state['running'] + state['invoked'] - running)
+            limit = limit + max(_cfg('additive_increase'), completed)
+            with self._lock:
+                self.stats['invocation_controller_increases'] += 1
+
+        limit = min(max(limit, _cfg('min_limit')), max_invocations)
+        state.update(limit=limit, health=health, running=running, invoked=0, updated_at=time.time())
+
+        return limit
+
+
+    def get_invocation_number(self, labourer: Labourer, observation: LabourerObservation) -> int:
+
+        limit = self.get_limit(labourer, observation)
+
+        if observation.get('health') == 0:
+            logger.info(f"Labourer: {labourer.id} has bad health. Not invoking anything.")
+            return 0
+
+        running = observation.get('running')
+        available = int(math.floor(limit)) - running
+        if available < 1:
+            return 0
+
+        queue_length = observation.get('queue_length')
+        if queue_length < 1:
+            return 0
+
+        average_duration = observation.get('average_duration')
+        if average_duration:
+            required = math.ceil(queue_length * average_duration / self.config['drain_seconds'])
+        else:
+            required = queue_length
+
+        result = max(0, min(available, queue_length, required))
+
+        logger.info(f"Labourer: {labourer.id} has limit {limit:.2f}, running {running}, queue {queue_length}, "
+                    f"average duration {average_duration}. Invoking {result}.")
+        return result
+
+
+    def record_invocations(self, labourer: Labourer, count: int):
+
+        with self._lock:
+            state = self.state.setdefault(labourer.id, {})
+
+        state['invoked'] = state.get('invoked', 0) + count
+
+
+def get_invocation_controller(name: str, config: Optional[Dict] = None) -> InvocationController:
+    """
+    Initialize the InvocationController by `name`. The `name` is either a name of the class in this module,
+    or a dotted path to a custom class (e.g. ``'my_package.controllers.MyController'``).
+    """
+
+    if '.' in name:
+        module_name, class_name = name.rsplit('.', 1)
+        some_class = getattr(import_module(module_name), class_name)
+    else:
+        some_class = globals().get(name)
+
+    if not (isinstance(some_class, type) and issubclass(some_class, InvocationController)):
+        raise ValueError(f"Unknown InvocationController: {name}")
+
+    return some_class(config=config)
@@ -0,0 +1,182 @@
+"""
+..  hidden-code-block:: text
+    :label: View Licence Agreement <br>
+
+    sosw - Serverless Orchestrator of Serverless Workers
+
+    The MIT License (MIT)
+    Copyright (C) 2024  sosw core contributors <info@sosw.app>
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+
+__all__ = ['TokenBucket']
+__author__ = "Nikolay Grishchenko"
+__version__ = "1.0"
+
+try:
+    from aws_lambda_powertools import Logger
+
+    logger = Logger(child=True)
+
+except ImportError:
+    import logging
+
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+
+import threading
+import time
+
+from collections import defaultdict
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Token bucket to limit the rate of consuming some capacity, e.g. Write Capacity Units of a DynamoDB table.
+
+    The bucket is refilled continuously with `rate` tokens per second up to `burst` tokens. The caller should
+    ``wait()`` before the request for the estimated cost and ``consume()`` the actual cost after it. The actual cost
+    is usually known only from the response (e.g. ``ConsumedCapacity``), so the bucket may go into debt and
+    the following ``wait()`` will pay it back.
+
+    The effective rate adapts to throttling of the backend: ``throttled()`` decreases it multiplicatively
+    (down to ``min_rate_factor`` of `rate`) and ``succeeded()`` recovers it additively back to the full `rate`.
+
+    The bucket is thread safe, so it can be shared by several clients of the same container.
+
+    ..  code-block:: python
+
+        bucket = TokenBucket(rate=100)
+
+        bucket.wait(25)
+        response = dynamo_client.batch_write_item(..., ReturnConsumedCapacity='TOTAL')
+        bucket.consume(sum(x['CapacityUnits'] for x in response['ConsumedCapacity']))
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, min_rate_factor: float = 0.1,
+                 backoff_factor: float = 0.5, recovery_step: float = 0.05):
+        """
+        :param float rate:              Tokens per second.
+        :param float burst:             Maximum number of tokens in the bucket. Default: same as `rate`.
+        :param float min_rate_factor:   Effective rate never goes below this share of `rate` after throttling.
+        :param float backoff_factor:    Multiply effective rate by this factor on every throttling.
+        :param float recovery_step:     Recover this share of `rate` on every success after throttling.
+        """
+
+        assert rate > 0, f"Rate of TokenBucket should be positive, got: {rate}"
+
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.min_rate_factor = min_rate_factor
+        self.backoff_factor = backoff_factor
+        self.recovery_step = recovery_step
+
+        self.rate_factor = 1.0
+        self.tokens = self.burst
+        self.last_refill = time.monotonic()
+
+        self.stats = defaultdict(int)
+        self._lock = threading.Lock()
+
+
+    @property
+    def effective_rate(self) -> float:
+        """ Current rate of refilling after adaptation to throttling. """
+        return self.rate * self.rate_factor
+
+
+    def set_rate(self, rate: float, burst: Optional[float] = None):
+        """ Change the rate (e.g. if the capacity of the table changed). The adaptation state is preserved. """
+
+        assert rate > 0, f"Rate of TokenBucket should be positive, got: {rate}"
+
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+            self.burst = float(burst or rate)
+            self.tokens = min(self.tokens, self.burst)
+
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.effective_rate)
+        self.last_refill = now
+
+
+    def wait(self, units: float = 1.0) -> float:
+        """
+        Sleep until there are enough tokens for `units`. The tokens are not taken, call ``consume()`` for this.
+        Requests bigger than the `burst` wait only for the full bucket.
+
+        :return: Number of seconds slept.
+        """
+
+        with self._lock:
+            self._refill()
+            delay = (min(units, self.burst) - self.tokens) / self.effective_rate
+
+        if delay <= 0:
+            return 0.0
+
+        logger.debug("TokenBucket is waiting %.3fs for %s units", delay, units)
+        time.sleep(delay)
+        with self._lock:
+            self.stats['token_bucket_waits'] += 1
+            self.stats['token_bucket_wait_time'] += delay
+
+        return delay
+
+
+    def consume(self, units: float):
+        """ Take `units` tokens from the bucket. The bucket goes into debt if there are not enough of them. """
+
+        with self._lock:
+            self._refill()
+            self.tokens -= units
+            self.stats['token_bucket_consumed'] += units
+
+
+    def throttled(self):
+        """ Backoff after the backend reported throttling. Also drops the remaining tokens. """
+
+        with self._lock:
+            self._refill()
+            self.rate_factor = max(self.min_rate_factor, self.rate_factor * self.backoff_factor)
+            self.tokens = min(self.tokens, 0.0)
+            self.stats['token_bucket_throttled'] += 1
+
+        logger.info("TokenBucket throttled. Effective rate is decreased to %s", self.effective_rate)
+
+
+    def succeeded(self):
+        """ Recover the effective rate after successful request. """
+
+        if self.rate_factor < 1.0:
+            with self._lock:
+                self._refill()
+                self.rate_factor = min(1.0, self.rate_factor + self.recovery_step)
+
+
+    def reset_stats(self):
+        """ Reset the counters. The state of the bucket (tokens and the adapted rate) is preserved. """
+
+        with self._lock:
+            self.stats = defaultdict(int)
@@ -48,6 +48,8 @@ import os
 
 from math import ceil
 from sosw import Processor
+from sosw.components.ttl_cache import lambda_metadata_cache
+from typing import Dict, List
 
 
 class SiblingsManager(Processor):
@@ -79,7 +81,11 @@ class SiblingsManager(Processor):
 
     DEFAULT_CONFIG = {
         'init_clients':  ['lambda', 'events', 'cloudwatch'],
-        'auto_spawning': False
+        'auto_spawning': False,
+        # The result of checking the Events Rules is cached in the container for this number of seconds.
+        # Disabling the rules is the way to stop the chain of siblings, so the chain stops only after this lag.
+        # Set 0 to check the rules before every spawn.
+        'events_rules_cache_ttl': 60,
     }
 
     events_client: boto3.client = None
@@ -93,14 +99,33 @@ class SiblingsManager(Processor):
         It is very important to use this checker before launching siblings.
         Otherwise, you can create an infinite autorespawning loop and waste **A LOT** of money.
 
+        The result is cached in the container for ``config['events_rules_cache_ttl']`` seconds (60 by default).
+        Disabling the Rules is the kill-switch of siblings, so warm containers keep spawning siblings for up
+        to this number of seconds after the Rules are disabled. Set it to 0 to skip the cache and make the switch
+        immediate at the cost of two API calls per spawn.
+
         :param lambda_context:  Context object from your lambda_handler.
 
         :rtype: bool
         :raises ResourceNotFoundException: If Rule with the given `name` doesn't exist.
         """
 
+        arn = lambda_context.invoked_function_arn
+        ttl = self.config['events_rules_cache_ttl']
+
+        if ttl:
+            enabled = lambda_metadata_cache.get_or_set(('events_rules_enabled', arn),
+                                                       lambda: self._any_events_rules_enabled_for_arn(arn),
+                                                       ttl=ttl, stats=self.stats)
+        else:
+            enabled = self._any_events_rules_enabled_for_arn(arn)
+
+        return True if enabled else self.config['auto_spawning']
+
+
+    def _any_events_rules_enabled_for_arn(self, arn: str) -> bool:
         response = self.events_client.list_rules()
-        logger.debug(lambda_context.invoked_function_arn)
+        logger.debug(arn)
         logger.debug(response)
 
         for rule in response.get('Rules', []):
@@ -109,11 +134,11 @@ class SiblingsManager(Processor):
 
             targets = self.events_client.list_targets_by_rule(Rule=rule['Name']).get('Targets', [])
             logger.debug(targets)
-            if any(t['Arn'] == lambda_context.invoked_function_arn for t in targets):
-                logger.info("Function %s has at least one enabled rule: %s", lambda_context.invoked_function_arn, rule)
+            if any(t['Arn'] == arn for t in targets):
+                logger.info("Function %s has at least one enabled rule: %s", arn, rule)
                 return True
 
-        return self.config['auto_spawning']
+        return False
 
 
     def spawn_sibling(self, lambda_context, payload=None, force=False):
@@ -131,6 +156,10 @@ class SiblingsManager(Processor):
            Very dangerous to use `force=True`! This can create infinite loops.
            Use only if you are sure what you are doing!
 
+        .. :warning:
+           The check of Events Rules is cached, so disabling them stops the siblings only after
+           ``config['events_rules_cache_ttl']`` seconds. See ``any_events_rules_enabled()``.
+
         :param lambda_context:  Context object from your lambda_handler.
         :param dict payload:    The payload to be put to event.
         :param bool force:      If specified True it will ignore the checks of enabled Events Rules.
@@ -152,6 +181,33 @@ class SiblingsManager(Processor):
         self.lambda_client.invoke(FunctionName=name, InvocationType=invocation_type, Payload=payload)
 
 
+    def spawn_siblings(self, lambda_context, payloads: List[Dict], force=False) -> int:
+        """
+        Asynchronously invokes a copy of same function for every payload from `payloads`.
+        Useful to launch several concurrent consumers of some sharded work.
+
+        The check of enabled Events Rules is done once for the whole group.
+        Same warnings as for ``spawn_sibling()`` apply.
+
+        :param lambda_context:  Context object from your lambda_handler.
+        :param list payloads:   The payloads to be put to events. One sibling is called per payload.
+        :param bool force:      If specified True it will ignore the checks of enabled Events Rules.
+        :return:                Number of spawned siblings.
+        """
+
+        if not payloads:
+            return 0
+
+        if not force and not self.any_events_rules_enabled(lambda_context):
+            logger.error("Can't call siblings because I don't find any enabled CloudWatch Rules for me.")
+            return 0
+
+        for payload in payloads:
+            self.spawn_sibling(lambda_context, payload=payload, force=True)
+
+        return len(payloads)
+
+
     def get_approximate_concurrent_executions(self, minutes_back=5, name=None):
         """
         Get approximate concurrent executions from CloudWatch Metrics.
@@ -0,0 +1,100 @@
+import os
+import random
+import unittest
+
+
+os.environ["STAGE"] = "test"
+os.environ["autotest"] = "True"
+
+from sosw.components.duration_stats import DurationStats
+
+
+class DurationStats_UnitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.stats = DurationStats(relative_accuracy=0.02, halflife=100)
+        self.now = 1000000.0
+
+
+    def apply(self, record, duration, now):
+        """ Imitate the atomic update of DynamoDB. """
+
+        increments, to_remove = self.stats.get_increments(duration, now=now)
+        for k, v in increments.items():
+            record[k] = record.get(k, 0) + float(v)
+        for k in to_remove:
+            record.pop(k, None)
+
+
+    def test_bucket_value__relative_accuracy(self):
+        for value in [0.011, 0.5, 1, 42, 899.9, 123456]:
+            estimated = self.stats.bucket_value(self.stats.bucket_index(value))
+            self.assertLessEqual(abs(estimated - value) / value, 0.02)
+
+        self.assertEqual(self.stats.bucket_index(0), 0)
+
+
+    def test_get_increments(self):
+        increments, to_remove = self.stats.get_increments(42.5, now=self.now)
+        epoch = self.stats.get_epoch(self.now)
+
+        self.assertEqual(increments['count'], '1')
+        self.assertEqual(increments['total'], '42.500000')
+        self.assertEqual(increments[f"q_{self.stats.bucket_index(42.5)}"], '1')
+        self.assertIn(f"ews_{epoch}", increments)
+        self.assertEqual(to_remove, [f"ews_{epoch - 2}", f"eww_{epoch - 2}"])
+
+        # All values are plain numeric strings, never in scientific notation.
+        for value in increments.values():
+            self.assertNotIn('e', value)
+
+
+    def test_summarize(self):
+        random.seed(42)
+        values = [random.expovariate(1 / 30) for _ in range(2000)]
+
+        record = {}
+        for i, value in enumerate(values):
+            self.apply(record, value, now=self.now + i)
+
+        result = self.stats.summarize(record)
+        values.sort()
+
+        self.assertEqual(result['count'], 2000)
+        self.assertAlmostEqual(result['average'], sum(values) / len(values))
+        self.assertAlmostEqual(result['p50'], values[1000], delta=values[1000] * 0.03)
+        self.assertAlmostEqual(result['p95'], values[1900], delta=values[1900] * 0.03)
+
+
+    def test_summarize__empty(self):
+        self.assertEqual(self.stats.summarize(None),
+                         {'count': 0, 'average': None, 'ewma': None, 'p50': None, 'p95': None, 'p99': None})
+
+
+    def test_ewma__follows_recent_values(self):
+        record = {}
+        for i in range(1000):
+            self.apply(record, 10, now=self.now + i)
+        for i in range(1000, 2000):
+            self.apply(record, 100, now=self.now + i)
+
+        # Many halflives passed since the change, and old epochs are removed by writers.
+        self.assertAlmostEqual(self.stats.ewma(record), 100, delta=0.1)
+        self.assertLessEqual(len([k for k in record if k.startswith('ews_')]), 2)
+        self.assertAlmostEqual(self.stats.summarize(record)['average'], 55)
+
+
+    def test_records_are_mergeable(self):
+        a, b, merged = {}, {}, {}
+        for i in range(100):
+            self.apply(a if i % 2 else b, i, now=self.now + i)
+            self.apply(merged, i, now=self.now + i)
+
+        combined = {k: a.get(k, 0) + b.get(k, 0) for k in set(a) | set(b)}
+        expected = self.stats.summarize(merged)
+        for key, value in self.stats.summarize(combined).items():
+            self.assertAlmostEqual(value, expected[key])
+
+
+if __name__ == '__main__':
+    unittest.main()
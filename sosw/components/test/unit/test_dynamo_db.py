@@ -16,6 +16,7 @@ os.environ["STAGE"] = "test"
 os.environ["autotest"] = "True"
 
 from sosw.components.dynamo_db import DynamoDbClient
+from sosw.components.rate_limiter import TokenBucket
 
 
 class dynamodb_client_UnitTestCase(unittest.TestCase):
@@ -340,6 +341,99 @@ class dynamodb_client_UnitTestCase(unittest.TestCase):
         self.assertEqual(result, [{'hash_col': 'b', 'range_col': 10, 'unknown_col': 'not_strict'}])
 
 
+    def test_batch_write_items_one_table__chunks(self):
+        self.dynamo_client.dynamo_client.batch_write_item = Mock(return_value={'UnprocessedItems': {}})
+
+        rows = [{'hash_col': f"h{i}", 'range_col': i} for i in range(60)]
+        self.dynamo_client.batch_write_items_one_table(rows)
+
+        self.assertEqual(self.dynamo_client.dynamo_client.batch_write_item.call_count, 3)
+
+        _, call_kwargs = self.dynamo_client.dynamo_client.batch_write_item.call_args_list[0]
+        requests = call_kwargs['RequestItems'][self.table_name]
+        self.assertEqual(len(requests), 25)
+        self.assertEqual(requests[0], {'PutRequest': {'Item': {'hash_col': {'S': 'h0'}, 'range_col': {'N': '0'}}}})
+
+
+    @patch.object(time, 'sleep')
+    def test_batch_write_items_one_table__retries_unprocessed(self, mock_sleep):
+        unprocessed = [{'PutRequest': {'Item': {'hash_col': {'S': 'h1'}}}}]
+        self.dynamo_client.dynamo_client.batch_write_item = Mock(side_effect=[
+            {'UnprocessedItems': {self.table_name: unprocessed}},
+            {'UnprocessedItems': {}},
+        ])
+
+        self.dynamo_client.batch_write_items_one_table([{'hash_col': 'h0'}, {'hash_col': 'h1'}])
+
+        self.assertEqual(self.dynamo_client.dynamo_client.batch_write_item.call_count, 2)
+        _, call_kwargs = self.dynamo_client.dynamo_client.batch_write_item.call_args
+        self.assertEqual(call_kwargs['RequestItems'], {self.table_name: unprocessed})
+        mock_sleep.assert_called_once()
+
+
+    @patch.object(time, 'sleep')
+    def test_batch_write_items_one_table__raises_after_retries(self, mock_sleep):
+        unprocessed = [{'PutRequest': {'Item': {'hash_col': {'S': 'h1'}}}}]
+        self.dynamo_client.dynamo_client.batch_write_item = Mock(
+                return_value={'UnprocessedItems': {self.table_name: unprocessed}})
+
+        self.assertRaises(Exception, self.dynamo_client.batch_write_items_one_table, [{'hash_col': 'h1'}],
+                          max_retries=2)
+        self.assertEqual(self.dynamo_client.dynamo_client.batch_write_item.call_count, 3)
+
+
+    @patch.object(time, 'sleep')
+    def test_batch_write_items_one_table__rate_limiter(self, mock_sleep):
+        self.dynamo_client.dynamo_client.batch_write_item = Mock(return_value={
+            'UnprocessedItems': {}, 'ConsumedCapacity': [{'TableName': self.table_name, 'CapacityUnits': 50.0}]})
+        limiter = TokenBucket(rate=25)
+
+        self.dynamo_client.batch_write_items_one_table([{'hash_col': f"h{i}"} for i in range(50)],
+                                                       rate_limiter=limiter)
+
+        _, call_kwargs = self.dynamo_client.dynamo_client.batch_write_item.call_args
+        self.assertEqual(call_kwargs['ReturnConsumedCapacity'], 'TOTAL')
+        self.assertEqual(limiter.stats['token_bucket_consumed'], 100)
+
+        # The first chunk fits the full bucket, but consumes twice more. The second one has to wait for debt.
+        mock_sleep.assert_called_once()
+        self.assertAlmostEqual(mock_sleep.call_args[0][0], 2, places=1)
+
+
+    @patch.object(time, 'sleep')
+    def test_batch_write_items_one_table__rate_limiter_throttled(self, mock_sleep):
+
+        class ProvisionedThroughputExceededException(Exception):
+            pass
+
+        self.dynamo_client.dynamo_client.exceptions.ProvisionedThroughputExceededException = \
+            ProvisionedThroughputExceededException
+        self.dynamo_client.dynamo_client.batch_write_item = Mock(side_effect=[
+            ProvisionedThroughputExceededException(),
+            {'UnprocessedItems': {}},
+        ])
+        limiter = TokenBucket(rate=10)
+
+        self.dynamo_client.batch_write_items_one_table([{'hash_col': 'h0'}], rate_limiter=limiter)
+
+        self.assertEqual(self.dynamo_client.dynamo_client.batch_write_item.call_count, 2)
+        self.assertEqual(limiter.stats['token_bucket_throttled'], 1)
+        self.assertEqual(limiter.rate_factor, 0.55)
+
+
+    def test_batch_write_items_one_table__throttled_raises_without_rate_limiter(self):
+
+        class ProvisionedThroughputExceededException(Exception):
+            pass
+
+        self.dynamo_client.dynamo_client.exceptions.ProvisionedThroughputExceededException = \
+            ProvisionedThroughputExceededException
+        self.dynamo_client.dynamo_client.batch_write_item = Mock(side_effect=ProvisionedThroughputExceededException)
+
+        self.assertRaises(ProvisionedThroughputExceededException, self.dynamo_client.batch_write_items_one_table,
+                          [{'hash_col': 'h0'}])
+
+
     # @unittest.skip('Functionality deprecated')
     def test_get_by_query__max_items_and_count__raises(self):
         with self.assertRaises(Exception) as e:
@@ -349,6 +443,33 @@ class dynamodb_client_UnitTestCase(unittest.TestCase):
         self.assertEqual(e.exception.args[0], expected_msg)
 
 
+    def test_update__return_values(self):
+        self.dynamo_mock.update_item.return_value = {'Attributes': {'hash_col': {'S': 'a'}, 'cnt': {'N': '3'}}}
+
+        result = self.dynamo_client.update(keys={'hash_col': 'a'}, attributes_to_increment={'cnt': '1'},
+                                           return_values='ALL_NEW')
+
+        self.assertEqual(result, {'hash_col': 'a', 'cnt': 3})
+        self.assertEqual(self.dynamo_mock.update_item.call_args[1]['ReturnValues'], 'ALL_NEW')
+
+
+    def test_update__no_return_values(self):
+        self.assertIsNone(self.dynamo_client.update(keys={'hash_col': 'a'}, attributes_to_update={'some_col': 'b'}))
+        self.assertNotIn('ReturnValues', self.dynamo_mock.update_item.call_args[1])
+
+
+    def test_transact_write__chunks(self):
+        items = [self.dynamo_client.make_update_transaction_item({'hash_col': str(i)},
+                                                                 attributes_to_increment={'cnt': 1})
+                 for i in range(150)]
+
+        self.dynamo_client.transact_write(*items)
+
+        calls = self.dynamo_mock.transact_write_items.call_args_list
+        self.assertEqual([len(c[1]['TransactItems']) for c in calls], [100, 50])
+        self.assertEqual(self.dynamo_client.stats['dynamo_transact_write_operations'], 2)
+
+
     def test_patch__transfers_attrs_to_remove(self):
 
         keys = {'hash_col': 'a'}
@@ -0,0 +1,91 @@
+import io
+import os
+import unittest
+
+
+os.environ["STAGE"] = "test"
+os.environ["autotest"] = "True"
+
+from sosw.components import framed_file
+from sosw.components.framed_file import FramedFileWriter, get_compression, read_frames
+
+
+class FramedFile_UnitTestCase(unittest.TestCase):
+
+    FNAME = '/tmp/autotest_framed_file.txt.gz'
+    ROWS = [f'{{"row": {i}, "payload": "{"x" * 50}"}}\n' for i in range(25)]
+
+
+    def tearDown(self):
+        try:
+            os.remove(self.FNAME)
+        except FileNotFoundError:
+            pass
+
+
+    def write(self, compression='gzip', rows_per_frame=10):
+        with FramedFileWriter(self.FNAME, compression=compression, rows_per_frame=rows_per_frame) as f:
+            for row in self.ROWS:
+                f.write(row)
+
+
+    def test_get_compression(self):
+        self.assertEqual(get_compression('queue.txt.gz'), 'gzip')
+        self.assertEqual(get_compression('queue.txt.zst'), 'zstd')
+        self.assertIsNone(get_compression('queue.txt'))
+
+
+    def test_read_frames(self):
+        self.write()
+
+        with open(self.FNAME, 'rb') as f:
+            self.assertEqual(read_frames(f, compression='gzip', rows=1), self.ROWS[:10])
+            self.assertEqual(read_frames(f, compression='gzip', rows=11), self.ROWS[10:])
+            self.assertEqual(read_frames(f, compression='gzip', rows=1), [])
+
+
+    def test_read_frames__from_offset(self):
+        self.write()
+
+        with open(self.FNAME, 'rb') as f:
+            read_frames(f, compression='gzip', rows=10)
+            offset = f.tell()
+
+        # Simulate the ranged download of the remaining frames.
+        with open(self.FNAME, 'rb') as f:
+            f.seek(offset)
+            remaining = io.BytesIO(f.read())
+
+        self.assertEqual(read_frames(remaining, compression='gzip', rows=100), self.ROWS[10:])
+
+
+    def test_compresses(self):
+        self.write(rows_per_frame=25)
+        self.assertLess(os.path.getsize(self.FNAME), len(''.join(self.ROWS)) / 5)
+
+
+    def test_truncated_frame_raises(self):
+        self.write()
+
+        with open(self.FNAME, 'rb') as f:
+            data = f.read()
+
+        f = io.BytesIO(data[:-5])
+        f.name = self.FNAME
+        self.assertRaises(ValueError, read_frames, f, compression='gzip', rows=100)
+
+
+    def test_unsupported_compression_raises(self):
+        self.assertRaises(ValueError, FramedFileWriter, self.FNAME, compression='bz2')
+
+
+    @unittest.skipIf(framed_file.zstandard is None, "zstandard is not installed")
+    def test_zstd(self):
+        self.write(compression='zstd')
+
+        with open(self.FNAME, 'rb') as f:
+            self.assertEqual(read_frames(f, compression='zstd', rows=100), self.ROWS)
+
+
+if __name__ == '__main__':
+    unittest.main()
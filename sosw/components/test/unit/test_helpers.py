@@ -659,6 +659,25 @@ class helpers_UnitTestCase(unittest.TestCase):
             self.assertEqual(make_hash(test[0]) == make_hash(test[1]), expected, f"Failed specific test: {test}")
 
 
+    def test_make_stable_hash(self):
+
+        TESTS = [
+            (((1, 'a'), ('a', 1)), False),  # List
+            (({1, 'a'}, {'a', 1}), True),  # Set
+            (("olleh", "hello"), False),
+            (({'a': 1, 'b': 2}, {'b': 2, 'a': 1}), True),  # Unordered Dictionary
+            (({1: 'a', 'bar': {'2a': {'set', 42}}}, {'bar': {'2a': {42, 'set'}}, 1: 'a'}), True),  # Nested Dictionary
+        ]
+
+        for test, expected in TESTS:
+            self.assertEqual(make_stable_hash(test[0]) == make_stable_hash(test[1]), expected,
+                             f"Failed specific test: {test}")
+
+        # Must not depend on the process-seeded built-in hash()
+        self.assertEqual(make_stable_hash({'a': 'b'}),
+                         'db4a7ecb114bc66c623a06c4ff6fe8daa2f49cc270ebbf7a1f81e22ab061c837')
+
+
     def test_to_bool(self):
         self.assertEqual(True, to_bool(1))
         self.assertEqual(True, to_bool(1.0))
@@ -0,0 +1,148 @@
+import os
+import unittest
+
+from unittest.mock import MagicMock
+
+
+os.environ["STAGE"] = "test"
+os.environ["autotest"] = "True"
+
+from sosw.components.invocation_controller import *
+from sosw.labourer import Labourer
+
+
+class InvocationController_UnitTestCase(unittest.TestCase):
+    LABOURER = Labourer(id='some_function')
+
+
+    def setUp(self):
+        self.aimd = AIMDInvocationController()
+
+
+    def observe(self, health=4, max_invocations=10, running=0, queue_length=1000, average_duration=60):
+        return LabourerObservation(
+                health=lambda: health,
+                max_invocations=lambda: max_invocations,
+                running=lambda: running,
+                queue_length=lambda: queue_length,
+                average_duration=lambda: average_duration,
+        )
+
+
+    def test_labourer_observation__lazy(self):
+        getter = MagicMock(return_value=42)
+        observation = LabourerObservation(queue_length=getter)
+
+        getter.assert_not_called()
+        self.assertEqual(observation.get('queue_length'), 42)
+        self.assertEqual(observation.get('queue_length'), 42)
+        getter.assert_called_once()
+        self.assertRaises(KeyError, observation.get, 'health')
+
+
+    def test_coefficient__get_invocation_number(self):
+        controller = CoefficientInvocationController()
+
+        # Status - expected output for max invocations = 10
+        TESTS = {
+            0: 0,
+            1: 0,
+            2: 5,
+            3: 7,
+            4: 10
+        }
+
+        for health, expected in TESTS.items():
+            self.assertEqual(controller.get_invocation_number(self.LABOURER, self.observe(health=health)), expected)
+
+        self.assertEqual(controller.get_invocation_number(self.LABOURER, self.observe(running=8)), 2)
+        self.assertEqual(controller.get_invocation_number(self.LABOURER, self.observe(running=12)), 0)
+
+
+    def test_coefficient__does_not_query_queue(self):
+        controller = CoefficientInvocationController()
+        queue_length = MagicMock()
+        observation = LabourerObservation(health=lambda: 4, max_invocations=lambda: 10, running=lambda: 0,
+                                          queue_length=queue_length)
+
+        controller.get_invocation_number(self.LABOURER, observation)
+        queue_length.assert_not_called()
+
+
+    def test_aimd__initial_limit(self):
+        self.assertEqual(self.aimd.get_invocation_number(self.LABOURER, self.observe()), 5)
+
+
+    def test_aimd__increase_by_completions(self):
+        self.aimd.get_invocation_number(self.LABOURER, self.observe())
+        self.aimd.record_invocations(self.LABOURER, 5)
+
+        # 4 of 5 are completed. The limit grows by the number of completions.
+        self.assertEqual(self.aimd.get_invocation_number(self.LABOURER, self.observe(running=1)), 8)
+        self.assertEqual(self.aimd.state[self.LABOURER.id]['limit'], 9)
+        self.assertEqual(self.aimd.stats['invocation_controller_increases'], 1)
+
+
+    def test_aimd__no_increase_if_not_saturated(self):
+        self.aimd.get_invocation_number(self.LABOURER, self.observe(queue_length=2))
+        self.aimd.record_invocations(self.LABOURER, 2)
+
+        self.aimd.get_invocation_number(self.LABOURER, self.observe(running=0))
+        self.assertEqual(self.aimd.state[self.LABOURER.id]['limit'], 5)
+
+
+    def test_aimd__max_invocations(self):
+        for _ in range(10):
+            self.aimd.get_invocation_number(self.LABOURER, self.observe())
+            self.aimd.record_invocations(self.LABOURER, 10)
+
+        self.assertEqual(self.aimd.state[self.LABOURER.id]['limit'], 10)
+
+
+    def test_aimd__decrease_on_health_trend(self):
+        self.aimd.get_invocation_number(self.LABOURER, self.observe(health=4))
+
+        self.assertEqual(self.aimd.get_invocation_number(self.LABOURER, self.observe(health=3)), 2)
+        self.assertEqual(self.aimd.state[self.LABOURER.id]['limit'], 2.5)
+
+        # Poor health keeps decreasing down to `min_limit`.
+        for _ in range(5):
+            self.aimd.get_invocation_number(self.LABOURER, self.observe(health=1))
+        self.assertEqual(self.aimd.state[self.LABOURER.id]['limit'], 1)
+        self.assertEqual(self.aimd.stats['invocation_controller_decreases'], 6)
+
+        self.assertEqual(self.aimd.get_invocation_number(self.LABOURER, self.observe(health=0)), 0)
+
+
+    def test_aimd__limited_by_queue(self):
+        self.assertEqual(self.aimd.get_invocation_number(self.LABOURER, self.observe(queue_length=0)), 0)
+        self.assertEqual(self.aimd.get_invocation_number(self.LABOURER, self.observe(queue_length=3)), 3)
+
+
+    def test_aimd__limited_by_drain_time(self):
+        # 6 tasks of 20 seconds can be drained in a minute by 2 workers.
+        observation = self.observe(queue_length=6, average_duration=20)
+        self.assertEqual(self.aimd.get_invocation_number(self.LABOURER, observation), 2)
+
+        # Unknown duration.
+        observation = self.observe(queue_length=6, average_duration=None)
+        self.assertEqual(self.aimd.get_invocation_number(self.LABOURER, observation), 5)
+
+
+    def test_get_invocation_controller(self):
+        self.assertIsInstance(get_invocation_controller('AIMDInvocationController', config={'min_limit': 2}),
+                              AIMDInvocationController)
+        self.assertIsInstance(get_invocation_controller(
+                'sosw.components.invocation_controller.CoefficientInvocationController'),
+                CoefficientInvocationController)
+
+        controller = get_invocation_controller('AIMDInvocationController', config={'min_limit': 2})
+        self.assertEqual(controller.config['min_limit'], 2)
+        self.assertEqual(controller.config['decrease_factor'], 0.5)
+
+        self.assertRaises(ValueError, get_invocation_controller, 'LabourerObservation')
+        self.assertRaises(ValueError, get_invocation_controller, 'Unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
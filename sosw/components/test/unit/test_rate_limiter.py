@@ -0,0 +1,93 @@
+import os
+import time
+import unittest
+
+from unittest.mock import patch
+
+
+os.environ["STAGE"] = "test"
+os.environ["autotest"] = "True"
+
+from sosw.components.rate_limiter import TokenBucket
+
+
+class TokenBucket_UnitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.patcher = patch.object(time, 'monotonic', side_effect=lambda: self.now)
+        self.patcher.start()
+
+        self.bucket = TokenBucket(rate=10)
+
+
+    def tearDown(self):
+        self.patcher.stop()
+
+
+    @patch.object(time, 'sleep')
+    def test_wait__full_bucket(self, mock_sleep):
+        self.assertEqual(self.bucket.wait(10), 0)
+        mock_sleep.assert_not_called()
+
+
+    @patch.object(time, 'sleep')
+    def test_wait__pays_debt(self, mock_sleep):
+        self.bucket.consume(25)
+
+        self.assertEqual(self.bucket.wait(5), 2.0)
+        mock_sleep.assert_called_once_with(2.0)
+
+
+    @patch.object(time, 'sleep')
+    def test_wait__more_than_burst(self, mock_sleep):
+        self.bucket.consume(10)
+
+        # Never waits for more than a full bucket.
+        self.assertEqual(self.bucket.wait(100), 1.0)
+
+
+    def test_refill(self):
+        self.bucket.consume(10)
+        self.now += 0.5
+        self.bucket.consume(0)
+        self.assertEqual(self.bucket.tokens, 5)
+
+        self.now += 100
+        self.bucket.consume(0)
+        self.assertEqual(self.bucket.tokens, self.bucket.burst)
+
+
+    def test_throttled_and_succeeded(self):
+        self.bucket.throttled()
+        self.assertEqual(self.bucket.effective_rate, 5)
+        self.assertEqual(self.bucket.tokens, 0)
+
+        for _ in range(10):
+            self.bucket.throttled()
+        self.assertEqual(self.bucket.rate_factor, self.bucket.min_rate_factor)
+
+        for _ in range(100):
+            self.bucket.succeeded()
+        self.assertEqual(self.bucket.rate_factor, 1.0)
+
+
+    def test_set_rate(self):
+        self.bucket.throttled()
+        self.bucket.set_rate(100)
+
+        self.assertEqual(self.bucket.burst, 100)
+        self.assertEqual(self.bucket.effective_rate, 50)
+
+
+    def test_reset_stats(self):
+        self.bucket.consume(5)
+        self.bucket.throttled()
+        self.bucket.reset_stats()
+
+        self.assertEqual(self.bucket.stats, {})
+        self.assertEqual(self.bucket.effective_rate, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,6 +15,12 @@ class siblings_TestCase(unittest.TestCase):
         "test": True
     }
 
+
+    def setUp(self):
+        from sosw.components.ttl_cache import lambda_metadata_cache
+        lambda_metadata_cache.invalidate()
+
+
     @mock.patch("boto3.client")
     def test_get_approximate_concurrent_executions(self, mock_boto_client):
         mock_get_metric_statistics_responses = [
@@ -170,5 +176,73 @@ class siblings_TestCase(unittest.TestCase):
         # Test here that sibling is spawned only if rule enabled.
 
 
+    @mock.patch("boto3.client")
+    def test_spawn_siblings(self, mock_boto_client):
+        from sosw.components.siblings import SiblingsManager
+
+        manager = SiblingsManager(custom_config=self.CUSTOM_CONFIG)
+        manager.any_events_rules_enabled = MagicMock(return_value=True)
+        manager.lambda_client = MagicMock()
+
+        r = manager.spawn_siblings(lambda_context=MagicMock(), payloads=[{'a': 1}, {'a': 2}, {'a': 3}])
+
+        self.assertEqual(r, 3)
+        manager.any_events_rules_enabled.assert_called_once()
+        self.assertEqual(manager.lambda_client.invoke.call_count, 3)
+
+
+    @mock.patch("boto3.client")
+    def test_spawn_siblings__rules_disabled(self, mock_boto_client):
+        from sosw.components.siblings import SiblingsManager
+
+        manager = SiblingsManager(custom_config=self.CUSTOM_CONFIG)
+        manager.any_events_rules_enabled = MagicMock(return_value=False)
+        manager.lambda_client = MagicMock()
+
+        r = manager.spawn_siblings(lambda_context=MagicMock(), payloads=[{'a': 1}, {'a': 2}])
+
+        self.assertEqual(r, 0)
+        manager.lambda_client.invoke.assert_not_called()
+
+
+    @mock.patch("boto3.client")
+    def test_any_events_rules_enabled__cached(self, mock_boto_client):
+        client = MagicMock()
+        client.list_rules.return_value = {'Rules': [{'Name': 'rule', 'State': 'ENABLED'}]}
+        client.list_targets_by_rule.return_value = {'Targets': [{'Arn': 'arn:aws:lambda:us-west-2:123:function:f'}]}
+        mock_boto_client.return_value = client
+
+        from sosw.components.siblings import SiblingsManager
+
+        context = type('lambda_context', (object,), {'invoked_function_arn': 'arn:aws:lambda:us-west-2:123:function:f'})
+
+        manager = SiblingsManager(custom_config=self.CUSTOM_CONFIG)
+        self.assertTrue(manager.any_events_rules_enabled(context))
+        self.assertTrue(SiblingsManager(custom_config=self.CUSTOM_CONFIG).any_events_rules_enabled(context))
+
+        client.list_rules.assert_called_once()
+        self.assertEqual(manager.get_stats()['lambda_metadata_cache_misses'], 1)
+
+
+    @mock.patch("boto3.client")
+    def test_any_events_rules_enabled__no_cache(self, mock_boto_client):
+        client = MagicMock()
+        client.list_rules.return_value = {'Rules': [{'Name': 'rule', 'State': 'ENABLED'}]}
+        client.list_targets_by_rule.return_value = {'Targets': [{'Arn': 'arn:aws:lambda:us-west-2:123:function:f'}]}
+        mock_boto_client.return_value = client
+
+        from sosw.components.siblings import SiblingsManager
+
+        context = type('lambda_context', (object,), {'invoked_function_arn': 'arn:aws:lambda:us-west-2:123:function:f'})
+
+        manager = SiblingsManager(custom_config={'auto_spawning': False, 'events_rules_cache_ttl': 0})
+        self.assertTrue(manager.any_events_rules_enabled(context))
+
+        # The rule is disabled. The kill-switch works immediately.
+        client.list_rules.return_value = {'Rules': [{'Name': 'rule', 'State': 'DISABLED'}]}
+        self.assertFalse(manager.any_events_rules_enabled(context))
+        self.assertEqual(client.list_rules.call_count, 2)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,79 @@
+import os
+import time
+import unittest
+
+from unittest.mock import patch
+
+
+os.environ["STAGE"] = "test"
+os.environ["autotest"] = "True"
+
+from sosw.components.ttl_cache import TTLCache
+
+
+class TTLCache_UnitTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.patcher = patch.object(time, 'time', side_effect=lambda: self.now)
+        self.patcher.start()
+
+        self.cache = TTLCache(name='test_cache', ttl=10, max_size=3)
+
+
+    def tearDown(self):
+        self.patcher.stop()
+
+
+    def test_get__expires(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2, ttl=20)
+        self.assertEqual(self.cache.get('a'), 1)
+
+        self.now += 10
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('a', default=42), 42)
+        self.assertEqual(self.cache.get('b'), 2)
+
+
+    def test_get_or_set(self):
+        calls = []
+        stats = {'test_cache_hits': 0, 'test_cache_misses': 0}
+
+
+        def getter():
+            calls.append(1)
+            return False
+
+
+        for _ in range(3):
+            self.assertFalse(self.cache.get_or_set('a', getter, stats=stats))
+
+        # Falsy values are cached as well.
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(stats, {'test_cache_hits': 2, 'test_cache_misses': 1})
+        self.assertEqual(self.cache.stats, stats)
+
+        self.now += 11
+        self.cache.get_or_set('a', getter)
+        self.assertEqual(len(calls), 2)
+
+
+    def test_set__evicts_oldest(self):
+        for key in 'abcd':
+            self.cache.set(key, key)
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual([self.cache.get(x) for x in 'bcd'], ['b', 'c', 'd'])
+
+
+    def test_invalidate(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+
+        self.cache.invalidate('a')
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('b'), 2)
+
+        self.cache.invalidate()
+        self.assertIsNone(self.cache.get('b'))
@@ -0,0 +1,156 @@
+"""
+..  hidden-code-block:: text
+    :label: View Licence Agreement <br>
+
+    sosw - Serverless Orchestrator of Serverless Workers
+
+    The MIT License (MIT)
+    Copyright (C) 2024  sosw core contributors <info@sosw.app>
+
+    Permission is hereby granted, free of charge, to any person obtaining a copy
+    of this software and associated documentation files (the "Software"), to deal
+    in the Software without restriction, including without limitation the rights
+    to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+    copies of the Software, and to permit persons to whom the Software is
+    furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included in all
+    copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+    AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+    OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+    SOFTWARE.
+"""
+
+__all__ = ['TTLCache', 'lambda_metadata_cache']
+__author__ = "Nikolay Grishchenko"
+__version__ = "1.0"
+
+try:
+    from aws_lambda_powertools import Logger
+
+    logger = Logger(child=True)
+
+except ImportError:
+    import logging
+
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+
+import threading
+import time
+
+from collections import defaultdict
+from typing import Any, Callable, Hashable, MutableMapping, Optional
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread safe in-memory cache with expiration of values.
+
+    The instances of it on the module level live as long as the Lambda container, so they are shared by all
+    the warm invocations and all the Processors of the container. This is useful for the results of control plane
+    calls (e.g. configurations of functions) that almost never change.
+
+    ..  code-block:: python
+
+        config = lambda_metadata_cache.get_or_set(('get_function_configuration', arn),
+                                                  lambda: lambda_client.get_function_configuration(FunctionName=arn),
+                                                  ttl=3600, stats=self.stats)
+    """
+
+    def __init__(self, name: str, ttl: float = 300, max_size: int = 1024):
+        """
+        :param str name:        Name of the cache. Used as a prefix of stats: `{name}_hits` and `{name}_misses`.
+        :param float ttl:       Default time to live of values in seconds.
+        :param int max_size:    Maximum number of values. The oldest ones are evicted first.
+        """
+
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._data = {}
+        self._lock = threading.Lock()
+
+        self.stats = defaultdict(int)
+
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """ Get the value of `key` if it is not expired yet. """
+
+        with self._lock:
+            value, expires_at = self._data.get(key, (_MISSING, 0))
+            if value is _MISSING or expires_at <= time.time():
+                return default
+
+        return value
+
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """ Set the `value` of `key` for `ttl` seconds (or the default `ttl` of the cache). """
+
+        with self._lock:
+            self._data.pop(key, None)
+            if len(self._data) >= self.max_size:
+                self._evict()
+
+            self._data[key] = value, time.time() + (self.ttl if ttl is None else ttl)
+
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """ Remove the `key` or everything if `key` is not specified. """
+
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+
+    def get_or_set(self, key: Hashable, getter: Callable[[], Any], ttl: Optional[float] = None,
+                   stats: Optional[MutableMapping[str, int]] = None) -> Any:
+        """
+        Get the value of `key` from the cache or call the `getter` and cache the result.
+
+        :param key:         Key of the value.
+        :param getter:      Function without arguments to call in case of the miss.
+        :param float ttl:   Time to live of the new value. Default: `ttl` of the cache.
+        :param stats:       Optional counter of the caller (e.g. `self.stats` of a Processor) to count hits and misses
+                            additionally to the stats of the cache itself.
+        """
+
+        value = self.get(key, default=_MISSING)
+        result = 'hits' if value is not _MISSING else 'misses'
+
+        self.stats[f"{self.name}_{result}"] += 1
+        if stats is not None:
+            stats[f"{self.name}_{result}"] += 1
+
+        if value is _MISSING:
+            value = getter()
+            self.set(key, value, ttl=ttl)
+
+        return value
+
+
+    def _evict(self):
+        """ Remove expired values and the oldest ones if still full. Must be called under lock. """
+
+        now = time.time()
+        for key in [k for k, (_, expires_at) in self._data.items() if expires_at <= now]:
+            del self._data[key]
+
+        while len(self._data) >= self.max_size:
+            del self._data[next(iter(self._data))]
+
+
+# The cache of Lambda and Events metadata (function configurations, schedule rules) shared in the container.
+lambda_metadata_cache = TTLCache(name='lambda_metadata_cache', ttl=900)
@@ -45,11 +45,14 @@ except ImportError:
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
 
+from typing import Any, Callable
+
 
 class Labourer:
     ATTRIBUTES = ('id', 'arn')
     CUSTOM_ATTRIBUTES = ('arn', 'start', 'invoked', 'expired', 'health', 'health_metrics', 'average_duration',
-                         'max_duration', 'max_attempts', 'max_simultaneous_invocations')
+                         'max_duration', 'max_attempts', 'max_simultaneous_invocations', 'queue_high_watermark',
+                         'queue_low_watermark')
     id = None
     arn = None
 
@@ -93,6 +96,36 @@ class Labourer:
                              f"Supported attributes are: {', '.join(self.CUSTOM_ATTRIBUTES)}.")
         logger.debug(f"Labourer {self.id} set custom attribute {name} with {value}")
         setattr(self, name, value)
+        self.__dict__.get('_lazy_attributes', {}).pop(name, None)
+
+
+    def set_lazy_attribute(self, name: str, getter: Callable[[], Any]):
+        """
+        Set the custom attribute that is calculated by the `getter` only when accessed for the first time.
+        Normally TaskManager is supposed to call me for the attributes that require some remote calls.
+        """
+
+        if name not in self.CUSTOM_ATTRIBUTES:
+            raise ValueError(f"Failed to set lazy attribute {name} for Labourer {self.id}. "
+                             f"Supported attributes are: {', '.join(self.CUSTOM_ATTRIBUTES)}.")
+
+        self.__dict__.pop(name, None)
+        self.__dict__.setdefault('_lazy_attributes', {})[name] = getter
+
+
+    def __getattr__(self, name: str):
+        # Called only if the attribute is not found the regular way, so resolved lazy attributes are never here.
+        # There is no lock: a race of two threads may call the getter twice, but the getters are idempotent.
+        lazy_attributes = self.__dict__.get('_lazy_attributes', {})
+        if name not in lazy_attributes:
+            raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
+
+        value = lazy_attributes[name]()
+        logger.debug(f"Labourer {self.id} resolved lazy attribute {name} with {value}")
+        setattr(self, name, value)
+        lazy_attributes.pop(name, None)
+
+        return value
 
 
     def get_attr(self, name: str):
@@ -47,6 +47,7 @@ import json
 import operator
 import os
 import random
+import threading
 import time
 
 from collections import defaultdict
@@ -57,7 +58,8 @@ from typing import Dict, List, Optional, Union
 from sosw.app import Processor
 from sosw.labourer import Labourer
 from sosw.components.benchmark import benchmark
-from sosw.components.helpers import make_hash
+from sosw.components.helpers import chunks, first_or_none, make_hash
+from sosw.components.ttl_cache import TTLCache, lambda_metadata_cache
 from sosw.managers.task import TaskManager
 
 
@@ -69,6 +71,15 @@ ECO_STATUSES = (
     (4, 'High'),
 )
 
+COMPARATORS = {
+    'Average': mean,
+    'Maximum': max,
+    'Minimum': min,
+}
+
+# Values of health metrics shared by the warm invocations of the container. TTL is the `Period` of the metric.
+health_metrics_cache = TTLCache(name='health_metrics_cache', ttl=60)
+
 
 class EcologyManager(Processor):
     DEFAULT_CONFIG = {
@@ -78,11 +89,34 @@ class EcologyManager(Processor):
                             'Period':                     60,
                             'Statistics':                 ['Average'],
                             'MetricAggregationTimeSlice': 300
-                        }
+                        },
+        # Configurations of Lambda functions are cached in the container for this number of seconds.
+        'function_configuration_ttl': 3600,
+        # Fetch health metrics of all the registered Labourers with batched `GetMetricData` requests instead of
+        # `GetMetricStatistics` per metric. The values are cached in the container for the `Period` of metric.
+        'batch_health_metrics':       False,
+
+        # Shared snapshot of ecology of Labourers (health, running and queued tasks) in a DynamoDB item.
+        # The 'producer' (usually Orchestrator) publishes it with `publish_snapshot()`. A 'consumer' (e.g. Scheduler)
+        # reads the values from it and computes them live only if the snapshot is older than `max_age` seconds.
+        # `None` always computes everything locally.
+        'ecology_snapshot_mode':      None,
+        'ecology_snapshot_config':    {
+            # Own table with the hash key `labourer_id`. If the table is not configured (None) or not available,
+            # the values are computed live.
+            'table_name': 'sosw_ecology_snapshot',
+            'key':        '__ecology_snapshot__',
+            'max_age':    120,
+            # Consumers read the snapshot from DynamoDB not more often than this number of seconds.
+            'read_ttl':   15,
+        },
     }
 
+    GET_METRIC_DATA_MAX_QUERIES = 500
+
     running_tasks = defaultdict(int)
     health_metrics: Dict = None
+    health_metrics_reset_at: float = 0
     task_client: TaskManager = None  # Will be Circular import! Careful!
     cloudwatch_client: boto3.client = None
 
@@ -90,6 +124,14 @@ class EcologyManager(Processor):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+        self._health_metrics_lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._snapshot = None
+        self._snapshot_read_at = 0
+
+        # Orchestrator observes Labourers in a pool of threads that share `self.stats`.
+        self._stats_lock = threading.Lock()
+
 
     def __call__(self, event):
         raise NotImplementedError
@@ -112,6 +154,21 @@ class EcologyManager(Processor):
 
         logger.info("Reset cache of health_metrics in EcologyManager")
         self.health_metrics = dict()
+        self.health_metrics_reset_at = time.time()
+
+
+    def expire_health_metrics(self, ttl: float):
+        """
+        Reset the cache of health_metrics if it is older than `ttl` seconds. Long running processes (e.g.
+        the dispatch loop of Orchestrator) call this between the cycles, because the cache is otherwise reset only
+        in ``register_task_manager()``.
+        """
+
+        if time.time() - self.health_metrics_reset_at >= ttl:
+            logger.info("Expired cache of health_metrics in EcologyManager")
+            self.health_metrics = dict()
+            self.health_metrics_reset_at = time.time()
+            self.stats['health_metrics_expired'] += 1
 
 
     @property
@@ -130,21 +187,7 @@ class EcologyManager(Processor):
         If some fields are missing in the metric, the defaults come from ``config['default_metric_values']``
         """
 
-        _cfg = self.config.get
-
-        COMPARATORS = {
-            'Average': mean,
-            'Maximum': max,
-            'Minimum': min,
-        }
-
-        params = metric.copy()
-
-        # Setting up default metric parameters if unspecified for current metric.
-        for k, v in _cfg('default_metric_values', {}).items():
-            if k not in metric:
-                params[k] = v
-                logger.debug(f"Set the default {v} for {k} in metric query {metric}.")
+        params = self.get_metric_params(metric)
 
         assert len(params['Statistics']) == 1, "Complex statistics aggregation is not yet supported"
 
@@ -162,6 +205,134 @@ class EcologyManager(Processor):
         return comparator(x[comparator_name] for x in result.get('Datapoints', list()))
 
 
+    def get_metric_params(self, metric: Dict) -> Dict:
+        """ Copy of `metric` with the missing fields set from ``config['default_metric_values']``. """
+
+        params = metric.copy()
+
+        # Setting up default metric parameters if unspecified for current metric.
+        for k, v in self.config.get('default_metric_values', {}).items():
+            if k not in metric:
+                params[k] = v
+                logger.debug(f"Set the default {v} for {k} in metric query {metric}.")
+
+        return params
+
+
+    def fetch_metric_data(self, metrics: List[Dict]) -> Dict[str, float]:
+        """
+        Fetches from CloudWatch the aggregated values of `metrics` with batched get_metric_data_ requests.
+        Up to ``GET_METRIC_DATA_MAX_QUERIES`` metrics are fetched in one request. The metrics are grouped by their
+        ``MetricAggregationTimeSlice``, because the time range is common for the request.
+
+        .. _get_metric_data: https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/cloudwatch.html#CloudWatch.Client.get_metric_data
+
+        The `metrics` are in the same format as for ``fetch_metric_stats()``.
+        Metrics without datapoints are missing in the result.
+
+        :return: Mapping of ``make_hash(metric)`` to the aggregated value.
+        """
+
+        groups = defaultdict(list)
+        for metric in metrics:
+            params = self.get_metric_params(metric)
+            assert len(params['Statistics']) == 1, "Complex statistics aggregation is not yet supported"
+            groups[int(params['MetricAggregationTimeSlice'])].append((make_hash(metric), params))
+
+        result = {}
+        for duration, group in groups.items():
+            end_time = datetime.datetime.now()
+            start_time = end_time - datetime.timedelta(seconds=duration)
+
+            for chunk in chunks(group, self.GET_METRIC_DATA_MAX_QUERIES):
+                queries, statistics = [], {}
+                for i, (metric_hash, params) in enumerate(chunk):
+                    metric = {
+                        'Namespace':  params['Namespace'],
+                        'MetricName': params.get('MetricName') or params['Name'],
+                    }
+                    if params.get('Dimensions'):
+                        metric['Dimensions'] = params['Dimensions']
+
+                    query_id = f"m{i}"
+                    statistics[query_id] = metric_hash, params['Statistics'][0]
+                    queries.append({
+                        'Id':         query_id,
+                        'MetricStat': {'Metric': metric, 'Period': params['Period'], 'Stat': params['Statistics'][0]},
+                        'ReturnData': True,
+                    })
+
+                values = defaultdict(list)
+                request = dict(MetricDataQueries=queries, StartTime=start_time, EndTime=end_time)
+                while True:
+                    logger.debug(f"Query to CloudWatch `get_metric_data`: {request}")
+                    response = self.cloudwatch_client.get_metric_data(**request)
+                    self.stats['get_metric_data_calls'] += 1
+
+                    for data in response.get('MetricDataResults', []):
+                        values[data['Id']].extend(data.get('Values', []))
+
+                    if not response.get('NextToken'):
+                        break
+                    request['NextToken'] = response['NextToken']
+
+                for query_id, (metric_hash, statistic) in statistics.items():
+                    if values[query_id]:
+                        result[metric_hash] = COMPARATORS[statistic](values[query_id])
+                    else:
+                        logger.warning(f"No datapoints in CloudWatch for metric {metric_hash}")
+
+        return result
+
+
+    def prefetch_health_metrics(self, labourers: List[Labourer]):
+        """
+        Fetch with ``fetch_metric_data()`` the health metrics of `labourers` missing in the ``health_metrics_cache``
+        and cache them for the `Period` of every metric.
+        """
+
+        missing = {}
+        for labourer in labourers:
+            for health_metric in (getattr(labourer, 'health_metrics', {}) or {}).values():
+                metric_hash = make_hash(health_metric['details'])
+                if health_metrics_cache.get(metric_hash) is None:
+                    missing[metric_hash] = health_metric['details']
+
+        if not missing:
+            return
+
+        logger.info(f"Fetching {len(missing)} health metrics for {len(labourers)} Labourers from CloudWatch")
+        for metric_hash, value in self.fetch_metric_data(list(missing.values())).items():
+            ttl = self.get_metric_params(missing[metric_hash])['Period']
+            health_metrics_cache.set(metric_hash, value, ttl=ttl)
+
+
+    def get_health_metric_value(self, labourer: Labourer, health_metric: Dict) -> float:
+        """
+        Value of the `health_metric` of `labourer` from the ``health_metrics_cache``. In case of cache miss
+        the missing health metrics of all the registered Labourers are fetched at once.
+        Metrics without datapoints fall back to ``fetch_metric_stats()``.
+        """
+
+        metric_hash = make_hash(health_metric['details'])
+
+        value = health_metrics_cache.get(metric_hash)
+        if value is None:
+            # Only one thread fetches the metrics. The others wait for the cache.
+            with self._health_metrics_lock:
+                value = health_metrics_cache.get(metric_hash)
+                if value is None:
+                    self.stats['health_metrics_cache_misses'] += 1
+                    others = [x for x in self.task_client.get_labourers() or [] if x.id != labourer.id]
+                    self.prefetch_health_metrics([labourer, *others])
+                    value = health_metrics_cache.get(metric_hash)
+
+        if value is None:
+            value = self.fetch_metric_stats(metric=health_metric['details'])
+
+        return value
+
+
     def get_labourer_status(self, labourer: Labourer) -> int:
         """
         Get the worst (lowest) health status according to preconfigured health metrics of the Labourer.
@@ -179,11 +350,20 @@ class EcologyManager(Processor):
 
         _cfg = self.config.get
 
+        health = self.get_snapshot_value(labourer, 'health')
+        if health is not None:
+            return health
+
         health = max(map(lambda x: int(x[0]), ECO_STATUSES))
 
         metrics = getattr(labourer, 'health_metrics', {}) or {}
         for health_metric in metrics.values():
 
+            if _cfg('batch_health_metrics'):
+                health = min(health, self.get_health(self.get_health_metric_value(labourer, health_metric),
+                                                     metric=health_metric))
+                continue
+
             metric_hash = make_hash(health_metric['details'])
             if metric_hash not in self.health_metrics:
                 self.health_metrics[metric_hash] = self.fetch_metric_stats(metric=health_metric['details'])
@@ -239,7 +419,10 @@ class EcologyManager(Processor):
                                "to your TaskManager instance.")
 
         if labourer.id not in self.running_tasks.keys():
-            self.running_tasks[labourer.id] = self.task_client.get_count_of_running_tasks_for_labourer(labourer)
+            running = self.get_snapshot_value(labourer, 'running')
+            if running is None:
+                running = self.task_client.get_count_of_running_tasks_for_labourer(labourer)
+            self.running_tasks[labourer.id] = running
             logger.debug(f"EcologyManager.count_running_tasks_for_labourer() recalculated cache for Labourer "
                          f"{labourer}")
 
@@ -256,12 +439,25 @@ class EcologyManager(Processor):
         self.running_tasks[labourer.id] = self.count_running_tasks_for_labourer(labourer) + count
 
 
+    def reset_running_tasks(self, labourer: Optional[Labourer] = None):
+        """
+        Drop the cached counter of running tasks for the `labourer` (or for all Labourers if not specified).
+        The next call of ``count_running_tasks_for_labourer()`` will fetch the fresh value from TaskManager.
+        """
+
+        if labourer is None:
+            self.running_tasks = defaultdict(int)
+        else:
+            self.running_tasks.pop(labourer.id, None)
+
+
     def get_labourer_average_duration(self, labourer: Labourer) -> int:
         """
         Calculates the average duration of `labourer` executions.
 
-        The operation consumes DynamoDB RCU . Normally this method is called for each labourer only once during
-        registration of Labourers. If you want to learn this value, you should ask Labourer object.
+        The operation consumes DynamoDB RCU . Normally this method is called by TaskManager only when the attribute
+        of registered Labourer is accessed for the first time. If you want to learn this value, you should ask
+        Labourer object.
 
         .. code-block::python
 
@@ -279,12 +475,116 @@ class EcologyManager(Processor):
     def get_max_labourer_duration(self, labourer: Labourer) -> int:
         """
         Maximum duration of `labourer` executions.
+        The configuration of the function is cached in the container (see ``config['function_configuration_ttl']``).
         """
 
-        resp = self.task_client.lambda_client.get_function_configuration(FunctionName=labourer.arn)
+        resp = lambda_metadata_cache.get_or_set(
+                ('get_function_configuration', labourer.arn),
+                lambda: self.task_client.lambda_client.get_function_configuration(FunctionName=labourer.arn),
+                ttl=self.config['function_configuration_ttl'], stats=self.stats)
+
         return resp['Timeout']
 
 
+    def publish_snapshot(self, labourers: List[Labourer]):
+        """
+        Publish the snapshot of ecology of `labourers` for the consumers. The snapshot is a single DynamoDB item
+        with a compact JSON of ``{labourer_id: {'health': int, 'running': int, 'queued': int}}`` and a timestamp.
+
+        The values come from the same methods (and caches) as the local decisions of the producer,
+        so publishing costs a single write and the queries of the queue lengths.
+        Nothing is published if ``table_name`` of ``config['ecology_snapshot_config']`` is not configured.
+        """
+
+        _cfg = self.config['ecology_snapshot_config']
+
+        if not _cfg.get('table_name'):
+            logger.warning("Table of the ecology snapshot is not configured. Not publishing the snapshot.")
+            return
+
+        snapshot = {}
+        for labourer in labourers:
+            try:
+                snapshot[labourer.id] = {
+                    'health':  self.get_labourer_status(labourer),
+                    'running': self.count_running_tasks_for_labourer(labourer),
+                    'queued':  self.task_client.get_length_of_queue_for_labourer(labourer),
+                }
+            except Exception as err:
+                logger.exception(f"Failed to get ecology of Labourer {labourer.id} for the snapshot: {err}")
+
+        self.task_client.dynamo_db_client.update(
+                keys={'labourer_id': _cfg['key']},
+                attributes_to_update={
+                    'snapshot':    json.dumps(snapshot, separators=(',', ':')),
+                    'snapshot_at': round(time.time(), 3),
+                },
+                table_name=_cfg['table_name'],
+        )
+        self.stats['ecology_snapshots_published'] += 1
+        logger.info(f"Published the ecology snapshot of {len(snapshot)} Labourers")
+
+
+    def get_snapshot(self) -> Optional[Dict[str, Dict]]:
+        """
+        Read the shared snapshot of ecology published by the producer.
+        The snapshot is read from DynamoDB not more often than ``read_ttl`` seconds.
+
+        :return:    Mapping of `labourer_id` to the values of ecology, or None if the snapshot is missing,
+                    older than ``max_age`` seconds or its table is not configured.
+        """
+
+        _cfg = self.config['ecology_snapshot_config']
+
+        if not _cfg.get('table_name'):
+            return None
+
+        with self._snapshot_lock:
+            if time.time() - self._snapshot_read_at > _cfg['read_ttl']:
+                try:
+                    self._snapshot = first_or_none(self.task_client.dynamo_db_client.get_by_query(
+                            keys={'labourer_id': _cfg['key']}, table_name=_cfg['table_name'], fetch_all_fields=True))
+                except Exception as err:
+                    logger.exception(f"Failed to read the ecology snapshot: {err}")
+                    self._snapshot = None
+                self._snapshot_read_at = time.time()
+                self.stats['ecology_snapshot_reads'] += 1
+
+            record = self._snapshot
+
+        if not record or not record.get('snapshot_at'):
+            return None
+
+        if time.time() - float(record['snapshot_at']) > _cfg['max_age']:
+            logger.warning(f"Ecology snapshot is stale: published at {record['snapshot_at']}")
+            with self._stats_lock:
+                self.stats['ecology_snapshot_stale'] += 1
+            return None
+
+        return json.loads(record['snapshot'])
+
+
+    def get_snapshot_value(self, labourer: Labourer, name: str) -> Optional[int]:
+        """
+        Value `name` of `labourer` from the shared snapshot if EcologyManager is a consumer of it
+        and the snapshot is fresh. Otherwise returns None and the caller should compute the value live.
+        """
+
+        if self.config['ecology_snapshot_mode'] != 'consumer':
+            return None
+
+        try:
+            value = self.get_snapshot()[labourer.id][name]
+        except (TypeError, KeyError):
+            with self._stats_lock:
+                self.stats['ecology_snapshot_misses'] += 1
+            return None
+
+        with self._stats_lock:
+            self.stats['ecology_snapshot_hits'] += 1
+        return value
+
+
     # The task_client of EcologyManager is just a pointer. We skip recursive stats to avoid infinite loop.
     def get_stats(self, recursive=False):
         return super().get_stats(recursive=False)
@@ -43,17 +43,23 @@ except ImportError:
 
 import boto3
 import json
+import threading
 import time
 import uuid
 
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from json.decoder import JSONDecodeError
-from typing import Dict, List, Optional, Union
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 from sosw.app import Processor
 from sosw.components.benchmark import benchmark
+from sosw.components.duration_stats import DurationStats
 from sosw.components.dynamo_db import DynamoDbClient
-from sosw.components.helpers import first_or_none
+from sosw.components.helpers import chunks, first_or_none, make_stable_hash
+from sosw.components.rate_limiter import TokenBucket
 from sosw.labourer import Labourer
 
 
@@ -85,9 +91,11 @@ class TaskManager(Processor):
                 'closed_at':           'N',
                 'desired_launch_time': 'N',
                 'arn':                 'S',
-                'payload':             'S'
+                'payload':             'S',
+                'duration_recorded':   'N',
             },
             'required_fields':  ['task_id', 'labourer_id', 'created_at', 'greenfield'],
+            'hash_key':         'task_id',
 
             # You can overwrite field names to match your DB schema. But the types should be the same.
             # By default takes the key itself.
@@ -99,8 +107,34 @@ class TaskManager(Processor):
         'sosw_closed_tasks_labourer_status_index': 'labourer_task_status_with_time',
         'sosw_retry_tasks_table':                  'sosw_retry_tasks',
         'sosw_retry_tasks_greenfield_index':       'labourer_id_greenfield',
+
+        # Opt-in: running statistics of durations of completed tasks per Labourer (hash key: `labourer_id`).
+        # Updated atomically by WorkerAssistant (or Scavenger) on completion. See `DurationStats`.
+        # If disabled or unavailable, the average duration is calculated from the latest closed tasks.
+        'labourer_duration_stats':                 False,
+        'sosw_labourer_stats_table':               'sosw_labourer_stats',
+        'duration_stats_halflife':                 3600,
+        'duration_stats_relative_accuracy':        0.02,
+
+        # Opt-in: materialized counters of `queued`, `running` and `completed` tasks per Labourer (hash key:
+        # `labourer_id`). They are updated in the same transactions as the state changes of tasks, so the queue
+        # length and the number of running tasks are read with a single request instead of counting the index.
+        # The `expired` counter is the cumulative number of expired tasks handled by Scavenger.
+        # The drift (e.g. after failed bulk writes) is fixed by `reconcile_labourer_counters()` once per interval.
+        'labourer_counters':                       False,
+        'sosw_labourer_counters_table':            'sosw_labourer_counters',
+        'labourer_counters_reconcile_interval':    3600,
+        'labourer_counters_conflict_retries':      3,
         'greenfield_invocation_delta':             31557600,  # 1 year.
         'greenfield_task_step':                    1000,
+        'greenfield_block_size':                   10000,
+        'greenfield_block_ttl':                    60,
+
+        # Opt-in: task_id becomes a stable content hash of `labourer_id` and the normalized `payload`,
+        # and tasks are written only if such task_id does not exist yet. This makes re-driven Scheduler jobs
+        # idempotent: duplicate tasks are rejected by DynamoDB and never invoked. Requires `hash_key` in
+        # `dynamo_db_config`.
+        'deterministic_task_ids':                  False,
         'labourers':                               {
             # 'some_function': {
             #     'arn':                          'arn:aws:lambda:us-west-2:0000000000:function:some_function',
@@ -138,6 +172,28 @@ class TaskManager(Processor):
         'max_attempts':                            3,
         'max_closed_to_analyse_for_duration':      10,
         'max_simultaneous_invocations':            1,
+
+        # The attributes of Labourers that require remote calls are calculated lazily (only when accessed)
+        # for all the registered Labourers at once in a pool of threads. The values are cached for this number
+        # of seconds between the calls of `register_labourers()`.
+        'labourer_attributes_ttl':                 {
+            'health':           60,
+            'max_duration':     3600,
+            'average_duration': 600,
+        },
+        'labourer_attributes_workers':             10,
+
+        # Number of threads to invoke tasks concurrently in `invoke_tasks()`. All of them share the same clients,
+        # so the connection pool of `lambda` client (``botocore.config.Config``) should be not smaller than this.
+        'invocation_concurrency':                  10,
+        'lambda_config':                           {
+            'max_pool_connections': 10,
+        },
+
+        # Opt-in: `invoke_tasks()` claims the whole batch of tasks with transactions of up to 100 tasks
+        # (see `claim_tasks()`) instead of a conditional update per task. Fewer round trips, but transactional
+        # writes consume twice the WCU.
+        'claim_tasks_in_batch':                    False,
     }
 
     __labourers = None
@@ -149,6 +205,23 @@ class TaskManager(Processor):
     lambda_client: boto3.client = None
 
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Blocks of greenfields reserved for new tasks per Labourer. See `reserve_greenfields_for_labourer()`.
+        self._greenfield_blocks = {}
+
+        # Cache of lazy Labourer attributes. See `get_lazy_labourer_attribute()`.
+        self._labourer_attributes = {}
+        self._labourer_attributes_locks = defaultdict(threading.Lock)
+
+        # Tasks are invoked in pools of threads (see `invoke_tasks()`) that share `self.stats`.
+        self._stats_lock = threading.Lock()
+
+        self.duration_stats = DurationStats(relative_accuracy=self.config['duration_stats_relative_accuracy'],
+                                            halflife=self.config['duration_stats_halflife'])
+
+
     def get_oldest_greenfield_for_labourer(self, labourer: Labourer, reverse: bool = False) -> int:
         """
         Return value of oldest greenfield in queue.
@@ -188,15 +261,71 @@ class TaskManager(Processor):
         return self.get_oldest_greenfield_for_labourer(labourer, reverse=True)
 
 
+    def reserve_greenfields_for_labourer(self, labourer: Labourer, count: int = 1) -> List[int]:
+        """
+        Return `count` next greenfields for new tasks in the end of the queue of the `labourer`.
+
+        The values are handed out locally from a block reserved after the newest greenfield in the queue.
+        The DynamoDB is queried again only when the block is exhausted (``config['greenfield_block_size']`` values)
+        or expired (``config['greenfield_block_ttl']`` seconds). The latter makes sure that the long living TaskManager
+        catches up with the tasks queued meanwhile by someone else.
+
+        ..  note:: The block is not locked in the DB, so concurrent Schedulers may hand out the same greenfields.
+                   This is not harmful: such tasks are just mixed in the queue.
+        """
+
+        _cfg = self.config.get
+        step = int(_cfg('greenfield_task_step'))
+
+        block = self._greenfield_blocks.get(labourer.id)
+        if not block or block['next'] + step * (count - 1) > block['last'] or time.time() > block['expires_at']:
+            newest = self.get_newest_greenfield_for_labourer(labourer)
+
+            # Never go back from the values already handed out.
+            first = max(newest + step, block['next'] if block else 0)
+            size = max(count, int(_cfg('greenfield_block_size')))
+
+            block = {
+                'next':       first,
+                'last':       first + step * (size - 1),
+                'expires_at': time.time() + _cfg('greenfield_block_ttl'),
+            }
+            self._greenfield_blocks[labourer.id] = block
+            self.stats['greenfield_blocks_reserved'] += 1
+            logger.debug(f"Reserved a block of greenfields for {labourer.id}: {block}")
+
+        result = list(range(block['next'], block['next'] + step * count, step))
+        block['next'] += step * count
+
+        return result
+
+
     def get_length_of_queue_for_labourer(self, labourer: Labourer) -> int:
         """
         Approximate count of tasks still in queue for `labourer`.
         Tasks with greenfield <= now()
 
+        If ``labourer_counters`` are enabled, the materialized counter is returned.
+        If EcologyManager is a consumer of the shared ecology snapshot, the value from a fresh snapshot is returned.
+
         :param labourer:
         :return:
         """
 
+        if self.ecology_client.config.get('ecology_snapshot_mode') == 'consumer':
+            queued = self.ecology_client.get_snapshot_value(labourer, 'queued')
+            if queued is not None:
+                return queued
+
+        if self.config['labourer_counters']:
+            return max(0, self.get_labourer_counters(labourer)['queued'])
+
+        return self.count_queued_tasks_for_labourer(labourer)
+
+
+    def count_queued_tasks_for_labourer(self, labourer: Labourer) -> int:
+        """ Count the tasks with greenfield <= now() in the index. The cost grows with the length of the queue. """
+
         _ = self.get_db_field_name
 
         queue_count = self.dynamo_db_client.get_by_query(
@@ -223,14 +352,9 @@ class TaskManager(Processor):
 
         # WARNING! This must be something ordered, because these methods depend on one another.
         custom_attributes = (
-            ('start', lambda x: int(time.time())),
-            ('invoked', lambda x: x.get_attr('start') + self.config['greenfield_invocation_delta']),
-            ('expired', lambda x: x.get_attr('invoked') - (x.duration + x.cooldown)),
-            ('health', lambda x: self.ecology_client.get_labourer_status(x)),
+            *self.time_labourer_attributes,
             ('health_metrics', lambda x: _cfg('labourers')[x.id].get('health_metrics')) or {},
             ('max_attempts', lambda x: self.config.get(f'max_attempts_{x.id}') or self.config['max_attempts']),
-            ('max_duration', lambda x: self.ecology_client.get_max_labourer_duration(x)),
-            ('average_duration', lambda x: self.ecology_client.get_labourer_average_duration(x)),
             ('max_simultaneous_invocations', lambda x: _cfg('labourers')[x.id].get('max_simultaneous_invocations')
                                                        or _cfg('max_simultaneous_invocations')),
         )
@@ -242,8 +366,13 @@ class TaskManager(Processor):
         result = []
         for labourer in labourers:
             for k, method in [x for x in custom_attributes]:
-                labourer.set_custom_attribute(k, method(labourer))
-                logger.debug(f"SET for {labourer}: {k} = {method(labourer)}")
+                value = method(labourer)
+                labourer.set_custom_attribute(k, value)
+                logger.debug(f"SET for {labourer}: {k} = {value}")
+
+            for k in self.lazy_labourer_attributes:
+                labourer.set_lazy_attribute(k, partial(self.get_lazy_labourer_attribute, labourer, k))
+
             result.append(labourer)
 
             for attr, val in _cfg('labourers')[labourer.id].items():
@@ -254,6 +383,116 @@ class TaskManager(Processor):
         return result
 
 
+    @property
+    def time_labourer_attributes(self) -> Tuple[Tuple[str, Callable[[Labourer], int]], ...]:
+        """ Ordered getters of the custom attributes of Labourers that depend on the current time. """
+
+        return (
+            ('start', lambda x: int(time.time())),
+            ('invoked', lambda x: x.get_attr('start') + self.config['greenfield_invocation_delta']),
+            ('expired', lambda x: x.get_attr('invoked') - (x.duration + x.cooldown)),
+        )
+
+
+    def refresh_labourers(self) -> List[Labourer]:
+        """
+        Refresh the registered Labourers for the next dispatch cycle in the same invocation without registering
+        them again. The timestamps (``start``, ``invoked``, ``expired``) and the cached numbers of running tasks
+        in EcologyManager are reset. The lazy attributes (health, durations) are set again, so they are reused
+        from cache or recalculated according to ``config['labourer_attributes_ttl']``. The cache of health metrics
+        in EcologyManager expires with the same TTL as `health`.
+
+        If Labourers are not registered yet, falls back to ``register_labourers()``.
+        """
+
+        if self.__labourers is None:
+            return self.register_labourers()
+
+        self.ecology_client.expire_health_metrics(ttl=self.config['labourer_attributes_ttl'].get('health', 0))
+
+        for labourer in self.__labourers:
+            for k, method in self.time_labourer_attributes:
+                labourer.set_custom_attribute(k, method(labourer))
+
+            for k in self.lazy_labourer_attributes:
+                labourer.set_lazy_attribute(k, partial(self.get_lazy_labourer_attribute, labourer, k))
+
+            self.ecology_client.reset_running_tasks(labourer)
+
+        return self.__labourers
+
+
+    @property
+    def lazy_labourer_attributes(self) -> Dict[str, Callable[[Labourer], Any]]:
+        """ Getters of the custom attributes of Labourers that require remote calls. """
+
+        return {
+            'health':           self.ecology_client.get_labourer_status,
+            'max_duration':     self.ecology_client.get_max_labourer_duration,
+            'average_duration': self.ecology_client.get_labourer_average_duration,
+        }
+
+
+    def get_lazy_labourer_attribute(self, labourer: Labourer, name: str):
+        """
+        Get the value of the lazy attribute `name` for the `labourer` from cache or calculate it.
+
+        If the cache is missing or expired (see ``config['labourer_attributes_ttl']``), the attribute is calculated
+        for all the registered Labourers that miss it concurrently in a pool of threads. The loops over Labourers
+        pay the latency of remote calls once instead of once per Labourer.
+        """
+
+        # Only one pool per attribute. The others wait and take the value from cache.
+        with self._labourer_attributes_locks[name]:
+            try:
+                return self._get_cached_labourer_attribute(labourer.id, name)
+            except KeyError:
+                pass
+
+            pending = [x for x in self.__labourers or [] if self._is_labourer_attribute_expired(x.id, name)]
+            if labourer not in pending:
+                pending.append(labourer)
+
+            getter = self.lazy_labourer_attributes[name]
+
+
+            def resolve(lab: Labourer):
+                try:
+                    return getter(lab), None
+                except Exception as err:
+                    return None, err
+
+
+            with ThreadPoolExecutor(max_workers=min(self.config['labourer_attributes_workers'], len(pending))) as pool:
+                results = list(pool.map(resolve, pending))
+
+            expires_at = time.time() + self.config['labourer_attributes_ttl'].get(name, 0)
+            for lab, (value, err) in zip(pending, results):
+                if err is None:
+                    self._labourer_attributes[(lab.id, name)] = value, expires_at
+                elif lab is labourer:
+                    raise err
+                else:
+                    logger.warning(f"Failed to resolve {name} for Labourer {lab.id}: {err}")
+
+            with self._stats_lock:
+                self.stats['labourer_attributes_resolved'] += len(pending)
+            return self._labourer_attributes[(labourer.id, name)][0]
+
+
+    def _is_labourer_attribute_expired(self, labourer_id: str, name: str) -> bool:
+        return self._labourer_attributes.get((labourer_id, name), (None, 0))[1] <= time.time()
+
+
+    def _get_cached_labourer_attribute(self, labourer_id: str, name: str):
+        if self._is_labourer_attribute_expired(labourer_id, name):
+            raise KeyError(f"{name} of {labourer_id} is not cached")
+
+        with self._stats_lock:
+            self.stats['labourer_attributes_cache_hits'] += 1
+        return self._labourer_attributes[(labourer_id, name)][0]
+
+
     def get_labourers(self) -> List[Labourer]:
         """
         Return configured Labourers.
@@ -283,6 +522,119 @@ class TaskManager(Processor):
         :param bool strict: By default (True) prohibits specifying in the task (kwargs) the fields that are supposed
                             to be autogenerated. Only if they match with autogen - then pass. You can override this
                             and pass custom task properties setting strict = False
+        :return:            The created task. If ``deterministic_task_ids`` is enabled and the same task already
+                            exists - returns None.
+        """
+
+        new_task = self.construct_task(labourer=labourer, strict=strict, **kwargs)
+
+        # Saving to DynamoDB.
+        if self.config['deterministic_task_ids']:
+            return new_task if self.put_task_if_not_exists(new_task) else None
+
+        if self.config['labourer_counters']:
+            self.transact_write_with_counters(labourer.id, self.dynamo_db_client.make_put_transaction_item(new_task),
+                                              queued=1)
+        else:
+            self.dynamo_db_client.put(new_task)
+        logger.debug(f"Created a task: {new_task}")
+
+        return new_task
+
+
+    def create_tasks(self, labourer: Labourer, rows: Iterable[Dict], strict: bool = True,
+                     rate_limiter: Optional[TokenBucket] = None) -> List[Dict]:
+        """
+        Schedule a bulk of new tasks for the `labourer`. Each row is the same as kwargs of ``create_task()``.
+        Tasks are saved to DynamoDB with ``batch_write_item`` (25 per request) and appended to the end of the queue
+        keeping the order of `rows`.
+
+        If ``deterministic_task_ids`` is enabled, ``batch_write_item`` can not be used as it does not support
+        conditions. Every task is written with a conditional ``put_item`` instead and the duplicates are skipped.
+
+        :param labourer:        Labourer object of Lambda to execute the tasks.
+        :param rows:            Iterable of task rows.
+        :param bool strict:     See ``create_task()``.
+        :param rate_limiter:    Optional TokenBucket of WCU to pace the writes.
+        :return:                List of created tasks. Duplicates rejected in deterministic mode are not included.
+
+        ..  note::  ``batch_write_item`` is not transactional, so if ``labourer_counters`` are enabled, the `queued`
+                    counter is incremented once after the whole batch is written.
+        """
+
+        new_tasks = [self.construct_task(labourer=labourer, strict=strict, **row) for row in rows]
+
+        if self.config['deterministic_task_ids']:
+            created = []
+            for task in new_tasks:
+                if rate_limiter:
+                    rate_limiter.wait(1)
+                if self.put_task_if_not_exists(task):
+                    created.append(task)
+                if rate_limiter:
+                    rate_limiter.consume(1)
+
+            logger.debug(f"Created {len(created)} of {len(new_tasks)} tasks for {labourer.id}")
+            self.stats['created_tasks_in_bulk'] += len(created)
+            return created
+
+        self.dynamo_db_client.batch_write_items_one_table(new_tasks, rate_limiter=rate_limiter)
+        logger.debug(f"Created {len(new_tasks)} tasks for {labourer.id}")
+
+        if self.config['labourer_counters'] and new_tasks:
+            self.update_labourer_counters(labourer.id, queued=len(new_tasks))
+
+        self.stats['created_tasks_in_bulk'] += len(new_tasks)
+
+        return new_tasks
+
+
+    def put_task_if_not_exists(self, task: Dict) -> bool:
+        """
+        Save the `task` only if there is no task with the same ``task_id`` yet.
+
+        :return:    True if the task was created, False if it is a duplicate.
+        """
+
+        try:
+            if self.config['labourer_counters']:
+                self.transact_write_with_counters(
+                        task[self.get_db_field_name('labourer_id')],
+                        self.dynamo_db_client.make_put_transaction_item(task, overwrite_existing=False),
+                        queued=1)
+            else:
+                self.dynamo_db_client.put(task, overwrite_existing=False)
+        except Exception as err:
+            if self._is_conditional_check_failed(err):
+                logger.info(f"Task {task[self.get_db_field_name('task_id')]} already exists. Skipping duplicate.")
+                self.stats['duplicate_tasks_skipped'] += 1
+                return False
+            raise
+
+        logger.debug(f"Created a task: {task}")
+        return True
+
+
+    def make_task_id(self, labourer_id: str, payload: Union[str, Dict]) -> str:
+        """
+        Deterministic ``task_id`` for the ``deterministic_task_ids`` mode.
+        The `payload` is normalized, so the order of keys does not affect the result.
+        """
+
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+
+        return make_stable_hash({'labourer_id': str(labourer_id), 'payload': payload})
+
+
+    def construct_task(self, labourer: Labourer, strict: bool = True, autogenerators: Optional[Dict] = None,
+                       **kwargs) -> Dict:
+        """
+        Construct a new task ready to be saved. The fields that are not provided in kwargs are autogenerated.
+
+        :param labourer:        Labourer object of Lambda to execute the task.
+        :param bool strict:     See ``create_task()``.
+        :param autogenerators:  Optional custom generators of values for some fields to overwrite the default ones.
         """
 
         _ = self.get_db_field_name
@@ -290,14 +642,18 @@ class TaskManager(Processor):
         # Save a copy of kwargs, because we are going to play with them.
         kw = deepcopy(kwargs)
 
+        # Deterministic task_id depends on the payload, so it is generated after the payload is constructed.
+        deterministic = self.config['deterministic_task_ids'] and _('task_id') not in (autogenerators or {})
+        suggested_task_id = kw.pop(_('task_id'), None) if deterministic else None
+
         # Some common function we may need to generate default values.
         autogenerators = {
-            _('task_id'):     lambda: str(uuid.uuid1().hex),
+            _('task_id'):     (lambda: None) if deterministic else (lambda: str(uuid.uuid1().hex)),
             _('labourer_id'): lambda: str(labourer.id),
             _('created_at'):  lambda: str(time.time()),
-            _('greenfield'):  lambda: str(self.get_newest_greenfield_for_labourer(labourer)
-                                          + int(self.config['greenfield_task_step'])),
+            _('greenfield'):  lambda: str(self.reserve_greenfields_for_labourer(labourer)[0]),
             _('attempts'):    lambda: '0',
+            **(autogenerators or {}),
         }
 
         new_task = {}
@@ -314,7 +670,7 @@ class TaskManager(Processor):
                     suggested = gen()
 
             else:
-                suggested = str(kw.pop(key, gen()))
+                suggested = str(kw.pop(key)) if key in kw else gen()
             new_task[key] = suggested
 
         if not all(key in new_task for key in self.config['dynamo_db_config'].get('required_fields', [])):
@@ -326,9 +682,14 @@ class TaskManager(Processor):
         except Exception:
             raise ValueError(f"Unexpected `payload` or custom attrs for task '{kwargs}'. Should be dict() or JSON.")
 
-        # Saving to DynamoDB.
-        self.dynamo_db_client.put(new_task)
-        logger.debug(f"Created a task: {new_task}")
+        if deterministic:
+            task_id = self.make_task_id(labourer_id=new_task[_('labourer_id')], payload=new_task['payload'])
+            if suggested_task_id and str(suggested_task_id) != task_id:
+                if strict:
+                    raise ValueError(f"Value of {_('task_id')} passed to `create_task` doesnot match autogenerated. "
+                                     f"Use strict = False if you really have to create a task like this.")
+                task_id = str(suggested_task_id)
+            new_task[_('task_id')] = task_id
 
         return new_task
 
@@ -372,7 +733,8 @@ class TaskManager(Processor):
         return all(field in task.keys() for field in [_('task_id'), _('labourer_id'), _('created_at')])
 
 
-    def invoke_task(self, labourer: Labourer, task_id: Optional[str] = None, task: Optional[Dict] = None):
+    def invoke_task(self, labourer: Labourer, task_id: Optional[str] = None, task: Optional[Dict] = None,
+                    claimed: bool = False):
         """
         Invoke the Lambda Function execution for `task`.
         Providing the ID is more expensive, but safer from "task injection" attacks method that prefetches Task
@@ -380,6 +742,9 @@ class TaskManager(Processor):
 
         Skips already running tasks with no exception, thus concurrent Orchestrators (or whoever else)
         should not duplicate invocations.
+
+        :param claimed:     The task is already marked as invoked by ``claim_tasks()``.
+        :return:            True if the task was invoked, False if it was skipped.
         """
 
         if not any([task, task_id]) or all([task, task_id]):
@@ -392,13 +757,15 @@ class TaskManager(Processor):
             raise ValueError(f"Task to invoke is invalid: {task}")
 
         try:
-            self.mark_task_invoked(labourer, task)
+            if not claimed:
+                self.mark_task_invoked(labourer, task)
         except Exception as err:
-            if err.__class__.__name__ == 'ConditionalCheckFailedException':
+            if self._is_conditional_check_failed(err):
                 logger.warning(f"Update failed due to already running task {task}. "
                                f"Probably concurrent Orchestrator already invoked.")
-                self.stats['concurrent_task_invocations_skipped'] += 1
-                return
+                with self._stats_lock:
+                    self.stats['concurrent_task_invocations_skipped'] += 1
+                return False
             else:
                 logger.exception(err)
                 raise RuntimeError(err)
@@ -410,7 +777,8 @@ class TaskManager(Processor):
                 call_payload = json.loads(call_payload)
             except JSONDecodeError as err:
                 logger.exception(f"Failed to decode payload: {call_payload}. Probably invalid task.")
-                self.stats['invalid_tasks_skipped'] += 1
+                with self._stats_lock:
+                    self.stats['invalid_tasks_skipped'] += 1
 
         call_payload.update(task)
 
@@ -426,7 +794,168 @@ class TaskManager(Processor):
         )
         logger.debug(lambda_response)
 
-        self.stats['invoked_tasks'] += 1
+        with self._stats_lock:
+            self.stats['invoked_tasks'] += 1
+
+        return True
+
+
+    def invoke_tasks(self, labourer: Labourer, tasks: List[Dict], on_invoked: Optional[Callable[[Dict], Any]] = None,
+                     stop_event: Optional[threading.Event] = None) -> Dict[str, str]:
+        """
+        Invoke the `tasks` of the `labourer` concurrently in a pool of ``invocation_concurrency`` threads.
+        Every task is marked as invoked and the Lambda is invoked the same way as in ``invoke_task()``, so the tasks
+        already invoked by concurrent Orchestrators are skipped.
+
+        Failure of a single task does not stop the others. The exceptions are logged.
+
+        :param labourer:    Labourer of the tasks.
+        :param tasks:       List of tasks to invoke.
+        :param on_invoked:  Optional callback called in the same thread with the task after it is invoked.
+        :param stop_event:  Optional Event. Once it is set, the tasks not yet started are skipped.
+        :return:            Result per task_id: `invoked`, `skipped` or `failed`.
+        """
+
+        _ = self.get_db_field_name
+
+        result = {}
+        claimed = False
+
+        if stop_event is not None and stop_event.is_set():
+            self.stats['cancelled_task_invocations'] += len(tasks)
+            return {task.get(_('task_id')): 'skipped' for task in tasks}
+
+        if self.config['claim_tasks_in_batch']:
+            claimed = True
+            valid_tasks = []
+            for task in tasks:
+                if self.is_valid_task(task):
+                    valid_tasks.append(task)
+                else:
+                    logger.error(f"Task to invoke is invalid: {task}")
+                    result[task.get(_('task_id'))] = 'failed'
+
+            claimed_tasks = self.claim_tasks(labourer, valid_tasks)
+            claimed_ids = {task[_('task_id')] for task in claimed_tasks}
+            result.update({task[_('task_id')]: 'skipped' for task in valid_tasks
+                           if task[_('task_id')] not in claimed_ids})
+            tasks = claimed_tasks
+
+        def invoke(task: Dict) -> str:
+            # The claimed tasks are not invoked either. They expire and are retried by Scavenger.
+            if stop_event is not None and stop_event.is_set():
+                with self._stats_lock:
+                    self.stats['cancelled_task_invocations'] += 1
+                return 'skipped'
+
+            # `invoke_task()` modifies the task, but the callback expects the original one.
+            original = deepcopy(task)
+            try:
+                if not self.invoke_task(labourer=labourer, task=task, claimed=claimed):
+                    return 'skipped'
+                if on_invoked:
+                    on_invoked(original)
+                return 'invoked'
+            except Exception:
+                logger.exception(f"Failed to invoke task {original.get(_('task_id'))}")
+                return 'failed'
+
+        task_ids = [task[_('task_id')] for task in tasks]
+
+        workers = max(1, min(self.config['invocation_concurrency'], len(tasks)))
+        if workers == 1:
+            statuses = [invoke(task) for task in tasks]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                statuses = list(pool.map(invoke, tasks))
+
+        result.update(zip(task_ids, statuses))
+        statuses = list(result.values())
+
+        with self._stats_lock:
+            self.stats['failed_task_invocations'] += statuses.count('failed')
+        logger.info(f"Invoked {statuses.count('invoked')}, skipped {statuses.count('skipped')} and failed "
+                    f"{statuses.count('failed')} tasks of {labourer.id} in {workers} threads")
+
+        return result
+
+
+    def claim_tasks(self, labourer: Labourer, tasks: List[Dict]) -> List[Dict]:
+        """
+        Mark the `tasks` as invoked the same way as ``mark_task_invoked()``, but with transactions
+        of up to 100 tasks (``TransactWriteItems``). The whole batch is usually claimed with one or two calls.
+
+        If a transaction is cancelled, none of its tasks is claimed. The tasks that failed the condition are already
+        invoked by a concurrent Orchestrator and are skipped. The others (e.g. conflicting with a concurrent
+        transaction) are retried individually.
+
+        :return:    List of the claimed tasks. They must be invoked with ``invoke_task(claimed=True)``.
+        """
+
+        _ = self.get_db_field_name
+
+        counters = self.config['labourer_counters']
+        chunk_size = DynamoDbClient.TRANSACT_WRITE_MAX_ITEMS - (1 if counters else 0)
+
+        claimed, to_retry = [], []
+        for chunk in chunks(tasks, chunk_size):
+            items = []
+            for task in chunk:
+                keys, update_kwargs = self._make_invoked_task_update(labourer, task)
+                items.append(self.dynamo_db_client.make_update_transaction_item(keys, **update_kwargs))
+
+            try:
+                if counters:
+                    self.transact_write_with_counters(labourer.id, *items, queued=-len(chunk), running=len(chunk))
+                else:
+                    self.dynamo_db_client.transact_write(*items)
+                claimed.extend(chunk)
+
+            except Exception as err:
+                if err.__class__.__name__ != 'TransactionCanceledException':
+                    raise
+
+                reasons = [r.get('Code') for r in getattr(err, 'response', {}).get('CancellationReasons', [])]
+                for task, reason in zip(chunk, reasons + [None] * len(chunk)):
+                    if reason == 'ConditionalCheckFailed':
+                        logger.warning(f"Task {task[_('task_id')]} is already invoked by a concurrent Orchestrator.")
+                        with self._stats_lock:
+                            self.stats['concurrent_task_invocations_skipped'] += 1
+                    else:
+                        to_retry.append(task)
+
+        for task in to_retry:
+            try:
+                self.mark_task_invoked(labourer, task)
+                claimed.append(task)
+            except Exception as err:
+                if not self._is_conditional_check_failed(err):
+                    raise
+                with self._stats_lock:
+                    self.stats['concurrent_task_invocations_skipped'] += 1
+
+        with self._stats_lock:
+            self.stats['claimed_tasks'] += len(claimed)
+            self.stats['claimed_tasks_retried_individually'] += len(to_retry)
+
+        return claimed
+
+
+    def _make_invoked_task_update(self, labourer: Labourer, task: Dict) -> Tuple[Dict, Dict]:
+        """ Keys and kwargs for ``DynamoDbClient.update()`` to mark the `task` as invoked. """
+
+        _ = self.get_db_field_name
+
+        assert labourer.id == task[_('labourer_id')], f"Task doesn't belong to the Labourer {labourer}: {task}"
+
+        keys = {_('task_id'): task[_('task_id')]}
+        update_kwargs = dict(
+                attributes_to_update={_('greenfield'): int(time.time()) + self.config['greenfield_invocation_delta']},
+                attributes_to_increment={_('attempts'): 1},
+                condition_expression=f"{_('greenfield')} < {labourer.get_attr('start')}"
+        )
+
+        return keys, update_kwargs
 
 
     def mark_task_invoked(self, labourer: Labourer, task: Dict, check_running: Optional[bool] = True):
@@ -446,16 +975,14 @@ class TaskManager(Processor):
 
         """
 
-        _ = self.get_db_field_name
-
-        assert labourer.id == task[_('labourer_id')], f"Task doesn't belong to the Labourer {labourer}: {task}"
+        keys, update_kwargs = self._make_invoked_task_update(labourer, task)
 
-        self.dynamo_db_client.update(
-                {_('task_id'): task[_('task_id')]},
-                attributes_to_update={_('greenfield'): int(time.time()) + self.config['greenfield_invocation_delta']},
-                attributes_to_increment={_('attempts'): 1},
-                condition_expression=f"{_('greenfield')} < {labourer.get_attr('start')}"
-        )
+        if self.config['labourer_counters']:
+            self.transact_write_with_counters(labourer.id,
+                                              self.dynamo_db_client.make_update_transaction_item(keys, **update_kwargs),
+                                              queued=-1, running=1)
+        else:
+            self.dynamo_db_client.update(keys, **update_kwargs)
 
 
     # Deprecated
@@ -479,12 +1006,24 @@ class TaskManager(Processor):
         task[_('labourer_id_task_status')] = f"{labourer_id}_{is_completed}"
         task[_('closed_at')] = int(time.time())
 
-        # Add it to completed tasks table:
-        self.dynamo_db_client.put(task, table_name=self.config.get('sosw_closed_tasks_table'))
-
-        # Delete it from tasks_table
         keys = {_('task_id'): task[_('task_id')]}
-        self.dynamo_db_client.delete(keys)
+
+        if self.config['labourer_counters']:
+            counters = {'completed': -1} if is_completed else {'running': -1, 'expired': 1}
+            self.transact_write_with_counters(
+                    labourer_id,
+                    self.dynamo_db_client.make_put_transaction_item(
+                            task, table_name=self.config.get('sosw_closed_tasks_table')),
+                    self.dynamo_db_client.make_delete_transaction_item(
+                            keys, table_name=self.config['dynamo_db_config']['table_name']),
+                    **counters)
+
+        else:
+            # Add it to completed tasks table:
+            self.dynamo_db_client.put(task, table_name=self.config.get('sosw_closed_tasks_table'))
+
+            # Delete it from tasks_table
+            self.dynamo_db_client.delete(keys)
 
         self.stats['archived_tasks'] += 1
 
@@ -593,8 +1132,14 @@ class TaskManager(Processor):
         """
         Returns a number of tasks we assume to be still running.
         Theoretically they can be dead with Exception, but not yet expired.
+
+        If ``labourer_counters`` are enabled, the materialized counter is returned. Note that it also includes
+        the expired tasks until Scavenger handles them.
         """
 
+        if self.config['labourer_counters']:
+            return max(0, self.get_labourer_counters(labourer)['running'])
+
         return self.get_running_tasks_for_labourer(labourer=labourer, count=True)
 
 
@@ -666,11 +1211,22 @@ class TaskManager(Processor):
         retry_row[_('desired_launch_time')] = int(time.time()) + wanted_delay
         retry_row = self._jsonify_payload_of_task(retry_row)
 
-        self.dynamo_db_client.put(retry_row, table_name=self.config.get('sosw_retry_tasks_table'))
-
-        # Delete task from tasks table
         delete_keys = {_('task_id'): task[_('task_id')]}
-        self.dynamo_db_client.delete(delete_keys)
+
+        if self.config['labourer_counters']:
+            self.transact_write_with_counters(
+                    task[_('labourer_id')],
+                    self.dynamo_db_client.make_put_transaction_item(
+                            retry_row, table_name=self.config.get('sosw_retry_tasks_table')),
+                    self.dynamo_db_client.make_delete_transaction_item(
+                            delete_keys, table_name=self.config['dynamo_db_config']['table_name']),
+                    running=-1, expired=1)
+
+        else:
+            self.dynamo_db_client.put(retry_row, table_name=self.config.get('sosw_retry_tasks_table'))
+
+            # Delete task from tasks table
+            self.dynamo_db_client.delete(delete_keys)
 
         self.stats['scheduled_for_retry_later_tasks'] += 1
 
@@ -712,15 +1268,184 @@ class TaskManager(Processor):
         put_query = self.dynamo_db_client.make_put_transaction_item(task)
         delete_query = self.dynamo_db_client.make_delete_transaction_item(
                 delete_keys, table_name=self.config.get('sosw_retry_tasks_table'))
-        self.dynamo_db_client.transact_write(put_query, delete_query)
+
+        if self.config['labourer_counters']:
+            self.transact_write_with_counters(labourer_id, put_query, delete_query, queued=1)
+        else:
+            self.dynamo_db_client.transact_write(put_query, delete_query)
 
         self.stats['due_for_retry_tasks'] += 1
 
 
+    @staticmethod
+    def _is_conditional_check_failed(err: Exception) -> bool:
+        """ Check if the write (or the transaction with it) was rejected by the condition. """
+
+        if err.__class__.__name__ == 'ConditionalCheckFailedException':
+            return True
+
+        if err.__class__.__name__ == 'TransactionCanceledException':
+            reasons = getattr(err, 'response', {}).get('CancellationReasons', [])
+            return any(reason.get('Code') == 'ConditionalCheckFailed' for reason in reasons)
+
+        return False
+
+
+    def make_labourer_counters_transaction_item(self, labourer_id: str, **increments: int) -> Dict:
+        """ Transaction item to increment the counters of tasks of the Labourer, e.g. ``queued=-1, running=1``. """
+
+        return self.dynamo_db_client.make_update_transaction_item(
+                keys={'labourer_id': labourer_id},
+                attributes_to_increment=increments,
+                table_name=self.config['sosw_labourer_counters_table'])
+
+
+    def transact_write_with_counters(self, labourer_id: str, *transactions: Dict, **increments: int):
+        """
+        Execute the write `transactions` of task(s) together with the increments of the Labourer counters
+        in a single DynamoDB transaction.
+
+        The counters item is hot, so the transaction is retried a few times if it conflicts with a concurrent one.
+        The failed conditions of tasks are never retried and the exception is raised.
+        """
+
+        counters = self.make_labourer_counters_transaction_item(labourer_id, **increments)
+        retries = self.config['labourer_counters_conflict_retries']
+
+        for attempt in range(retries + 1):
+            try:
+                self.dynamo_db_client.transact_write(*transactions, counters)
+                break
+            except Exception as err:
+                reasons = [r.get('Code') for r in getattr(err, 'response', {}).get('CancellationReasons', [])]
+                if attempt == retries or 'TransactionConflict' not in reasons or self._is_conditional_check_failed(err):
+                    raise
+
+                logger.info(f"Transaction with counters of {labourer_id} conflicted. Retry #{attempt + 1}")
+                self.stats['labourer_counters_conflicts'] += 1
+                time.sleep(0.05 * 2 ** attempt)
+
+
+    def update_labourer_counters(self, labourer_id: str, **increments: int):
+        """ Increment the counters of tasks of the Labourer outside of transactions. """
+
+        self.dynamo_db_client.update(keys={'labourer_id': labourer_id}, attributes_to_increment=increments,
+                                     table_name=self.config['sosw_labourer_counters_table'])
+
+
+    def get_labourer_counters(self, labourer: Labourer) -> Dict[str, int]:
+        """
+        Read the materialized counters of tasks of the Labourer with a single request.
+
+        :return:    Dictionary with `queued`, `running`, `completed`, `expired` and `reconciled_at`.
+        """
+
+        records = self.dynamo_db_client.get_by_query(keys={'labourer_id': labourer.id},
+                                                     table_name=self.config['sosw_labourer_counters_table'],
+                                                     fetch_all_fields=True)
+        record = first_or_none(records) or {}
+
+        return {k: int(record.get(k, 0)) for k in ('queued', 'running', 'completed', 'expired', 'reconciled_at')}
+
+
+    def reconcile_labourer_counters(self, labourer: Labourer, force: bool = False) -> bool:
+        """
+        Recount the `queued`, `running` and `completed` tasks of the Labourer in the index and overwrite the counters.
+        This is expensive, so by default it is done at most once per ``labourer_counters_reconcile_interval``.
+        Scavenger calls it for every Labourer.
+
+        The increments made concurrently with the recount may be lost, but this drift is fixed by the next run.
+
+        :param labourer:    Labourer to reconcile counters of.
+        :param force:       Reconcile even if the interval has not passed yet.
+        :return:            True if the counters were reconciled.
+        """
+
+        if not self.config['labourer_counters']:
+            return False
+
+        now = int(time.time())
+        if not force:
+            reconciled_at = self.get_labourer_counters(labourer)['reconciled_at']
+            if now - reconciled_at < self.config['labourer_counters_reconcile_interval']:
+                return False
+
+        _ = self.get_db_field_name
+
+        def count_invoked(filter_expression: str) -> int:
+            return self.dynamo_db_client.get_by_query(
+                    keys={_('labourer_id'): labourer.id, _('greenfield'): str(now)},
+                    comparisons={_('greenfield'): '>'},
+                    index_name=self.config['dynamo_db_config']['index_greenfield'],
+                    filter_expression=filter_expression,
+                    return_count=True)
+
+        counters = {
+            'queued':        self.count_queued_tasks_for_labourer(labourer),
+            'running':       count_invoked(f"attribute_not_exists {_('completed_at')}"),
+            'completed':     count_invoked(f"attribute_exists {_('completed_at')}"),
+            'reconciled_at': now,
+        }
+
+        self.dynamo_db_client.update(keys={'labourer_id': labourer.id}, attributes_to_update=counters,
+                                     table_name=self.config['sosw_labourer_counters_table'])
+
+        logger.info(f"Reconciled counters of {labourer.id}: {counters}")
+        self.stats['labourer_counters_reconciled'] += 1
+
+        return True
+
+
+    def get_task_duration(self, task: Dict) -> Optional[float]:
+        """ Duration of the last invocation of the completed `task` or None if it is not completed. """
+
+        _ = self.get_db_field_name
+
+        if not task.get(_('completed_at')) or not task.get(_('greenfield')):
+            return None
+
+        return max(0, task[_('completed_at')] - task[_('greenfield')] + self.config['greenfield_invocation_delta'])
+
+
+    def record_labourer_duration(self, labourer_id: str, duration: float):
+        """
+        Add the `duration` to the running statistics of the Labourer with a single atomic UpdateItem.
+        No read is required, so any number of concurrent writers is safe.
+        """
+
+        increments, to_remove = self.duration_stats.get_increments(duration)
+
+        self.dynamo_db_client.update(
+                keys={'labourer_id': labourer_id},
+                attributes_to_increment=increments,
+                attributes_to_remove=to_remove,
+                table_name=self.config['sosw_labourer_stats_table'],
+        )
+        self.stats['durations_recorded'] += 1
+
+
+    def get_labourer_duration_stats(self, labourer: Labourer) -> Dict:
+        """
+        Read the running statistics of durations of the Labourer with a single request.
+
+        :return:    Dictionary with `count`, `average`, `ewma`, `p50`, `p95` and `p99` durations in seconds.
+                    The values are None if nothing is recorded yet.
+        """
+
+        records = self.dynamo_db_client.get_by_query(keys={'labourer_id': labourer.id},
+                                                     table_name=self.config['sosw_labourer_stats_table'],
+                                                     fetch_all_fields=True)
+
+        return self.duration_stats.summarize(first_or_none(records))
+
+
     @benchmark
     def get_average_labourer_duration(self, labourer: Labourer) -> int:
         """
-        Analyse latest tasks of Labourer and calculate average runtime duration.
+        Return the average runtime duration of the Labourer.
+
+        If ``labourer_duration_stats`` are enabled, uses the EWMA of the running statistics if there are any.
+        Otherwise analyses latest closed tasks of Labourer.
 
         .. warning:: This method doesn't know the exact duration of failed attempts.
                      Thus if the task is completely failed, we assume that all attempts failed at maximum duration.
@@ -728,6 +1453,15 @@ class TaskManager(Processor):
         :return:    Average duration in seconds.
         """
 
+        if self.config['labourer_duration_stats']:
+            try:
+                duration_stats = self.get_labourer_duration_stats(labourer)
+                if duration_stats['ewma'] is not None:
+                    return round(duration_stats['ewma'])
+            except Exception:
+                logger.exception(f"Failed to read duration stats of {labourer.id}. Analysing closed tasks instead.")
+                self.stats['failed_duration_stats_lookups'] += 1
+
         _ = self.get_db_field_name
         _cfg = self.config.get
 
@@ -760,8 +1494,7 @@ class TaskManager(Processor):
                 durations.extend([labourer.get_attr('max_duration') for _ in range(int(task[_('attempts')]))])
             else:
                 # Duration of completed tasks we calculate based on the value of last `greenfield` and `completed_at`
-                durations.append(
-                        task[_('completed_at')] - task[_('greenfield')] + _cfg('greenfield_invocation_delta'))
+                durations.append(self.get_task_duration(task))
 
         # Return the average
         try:
@@ -21,7 +21,8 @@ from sosw.test.variables import TEST_TASK_CLIENT_CONFIG, RETRY_TASKS, TASKS
 from sosw.components.dynamo_db import DynamoDbClient, clean_dynamo_table
 from sosw.components.helpers import first_or_none
 from sosw.test.helpers_test_dynamo_db import AutotestDdbManager, autotest_dynamo_db_tasks_setup, \
-    autotest_dynamo_db_closed_tasks_setup, autotest_dynamo_db_retry_tasks_setup, safe_put_to_ddb
+    autotest_dynamo_db_closed_tasks_setup, autotest_dynamo_db_retry_tasks_setup, \
+    autotest_dynamo_db_labourer_stats_setup, safe_put_to_ddb
 
 
 class TaskManager_IntegrationTestCase(unittest.TestCase):
@@ -39,7 +40,7 @@ class TaskManager_IntegrationTestCase(unittest.TestCase):
         cls.TEST_CONFIG['init_clients'] = ['DynamoDb']
 
         tables = [autotest_dynamo_db_tasks_setup, autotest_dynamo_db_closed_tasks_setup,
-                  autotest_dynamo_db_retry_tasks_setup]
+                  autotest_dynamo_db_retry_tasks_setup, autotest_dynamo_db_labourer_stats_setup]
         cls.autotest_ddbm = AutotestDdbManager(tables)
 
 
@@ -1,5 +1,6 @@
 import boto3
 import datetime
+import json
 import logging
 import time
 import unittest
@@ -10,6 +11,7 @@ from dateutil.tz import tzlocal
 from unittest.mock import MagicMock, patch
 
 from sosw.components.helpers import make_hash
+from sosw.components.ttl_cache import lambda_metadata_cache
 
 
 logging.getLogger('botocore').setLevel(logging.WARNING)
@@ -18,7 +20,7 @@ os.environ["STAGE"] = "test"
 os.environ["autotest"] = "True"
 
 from sosw.labourer import Labourer
-from sosw.managers.ecology import EcologyManager
+from sosw.managers.ecology import EcologyManager, health_metrics_cache
 from sosw.test.variables import TEST_ECOLOGY_CLIENT_CONFIG
 
 
@@ -69,6 +71,9 @@ class ecology_manager_UnitTestCase(unittest.TestCase):
         with patch('boto3.client'):
             self.manager = EcologyManager(custom_config=self.config)
 
+        lambda_metadata_cache.invalidate()
+        health_metrics_cache.invalidate()
+
 
     def tearDown(self):
         self.patcher.stop()
@@ -115,6 +120,39 @@ class ecology_manager_UnitTestCase(unittest.TestCase):
         self.assertEqual(self.manager.running_tasks['foo'], 0, "Did not reset cache of running_tasks")
 
 
+    def test_reset_running_tasks(self):
+        tm = MagicMock()
+        tm.get_count_of_running_tasks_for_labourer.return_value = 3
+        self.manager.register_task_manager(tm)
+
+        self.manager.running_tasks[self.LABOURER.id] = 5
+        self.manager.running_tasks['other'] = 7
+
+        self.manager.reset_running_tasks(self.LABOURER)
+        self.assertNotIn(self.LABOURER.id, self.manager.running_tasks)
+        self.assertEqual(self.manager.running_tasks['other'], 7)
+        self.assertEqual(self.manager.count_running_tasks_for_labourer(self.LABOURER), 3)
+
+        self.manager.reset_running_tasks()
+        self.assertNotIn('other', self.manager.running_tasks)
+
+
+    def test_expire_health_metrics(self):
+        self.manager.register_task_manager(MagicMock())
+        self.manager.health_metrics['foo'] = 42
+
+        self.manager.expire_health_metrics(ttl=60)
+        self.assertEqual(self.manager.health_metrics, {'foo': 42})
+
+        later = time.time() + 61
+        with patch('time.time') as t:
+            t.return_value = later
+            self.manager.expire_health_metrics(ttl=60)
+
+        self.assertEqual(self.manager.health_metrics, {})
+        self.assertEqual(self.manager.stats['health_metrics_expired'], 1)
+
+
     def test_add_running_tasks_for_labourer(self):
         tm = MagicMock()
         tm.get_count_of_running_tasks_for_labourer.return_value = 12
@@ -151,6 +189,18 @@ class ecology_manager_UnitTestCase(unittest.TestCase):
         self.assertEqual(self.manager.get_max_labourer_duration(self.LABOURER), 300)
 
 
+    def test_get_max_labourer_duration__cached(self):
+        self.manager.task_client = MagicMock()
+        self.manager.task_client.lambda_client.get_function_configuration.return_value = {'Timeout': 300}
+
+        for _ in range(3):
+            self.assertEqual(self.manager.get_max_labourer_duration(self.LABOURER), 300)
+
+        self.manager.task_client.lambda_client.get_function_configuration.assert_called_once()
+        self.assertEqual(self.manager.get_stats()['lambda_metadata_cache_misses'], 1)
+        self.assertEqual(self.manager.get_stats()['lambda_metadata_cache_hits'], 2)
+
+
     def test_get_health(self):
         METRIC = {
             'details':                     {},
@@ -232,6 +282,207 @@ class ecology_manager_UnitTestCase(unittest.TestCase):
                          f"Fetcher was supposed to be called only for 2 metrics. One is in cache.")
 
 
+    def get_metric_data_response(self, ids, values=(40.0, 20.0), next_token=None):
+        response = {'MetricDataResults': [{'Id': x, 'Values': list(values)} for x in ids]}
+        if next_token:
+            response['NextToken'] = next_token
+        return response
+
+
+    def test_fetch_metric_data(self):
+        self.manager.cloudwatch_client = MagicMock()
+        self.manager.cloudwatch_client.get_metric_data.return_value = self.get_metric_data_response(['m0', 'm1'])
+
+        metrics = [x['details'] for x in self.SAMPLE_HEALTH_METRICS.values()]
+        metrics[1] = {**metrics[1], 'Statistics': ['Maximum']}
+        result = self.manager.fetch_metric_data(metrics)
+
+        self.manager.cloudwatch_client.get_metric_data.assert_called_once()
+        _, kwargs = self.manager.cloudwatch_client.get_metric_data.call_args
+        queries = kwargs['MetricDataQueries']
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(queries[0]['MetricStat']['Metric'], {'Namespace': 'AWS/RDS', 'MetricName': 'CPUUtilization'})
+        self.assertEqual(queries[0]['MetricStat']['Period'], 60)
+        self.assertEqual(queries[1]['MetricStat']['Stat'], 'Maximum')
+        self.assertEqual(kwargs['EndTime'] - kwargs['StartTime'], datetime.timedelta(seconds=300))
+
+        # The third metric has no datapoints.
+        self.assertEqual(result, {make_hash(metrics[0]): 30.0, make_hash(metrics[1]): 40.0})
+
+
+    def test_fetch_metric_data__chunks_and_pagination(self):
+        metrics = [{'Name': f"Metric{i}", 'Namespace': 'AWS/RDS'} for i in range(501)]
+        responses = {
+            None: self.get_metric_data_response([f"m{i}" for i in range(500)], values=[1.0], next_token='t'),
+            't':  self.get_metric_data_response([f"m{i}" for i in range(500)], values=[3.0]),
+        }
+
+        def get_metric_data(**kwargs):
+            if len(kwargs['MetricDataQueries']) == 1:
+                return self.get_metric_data_response(['m0'], values=[5.0])
+            return responses[kwargs.get('NextToken')]
+
+        self.manager.cloudwatch_client = MagicMock()
+        self.manager.cloudwatch_client.get_metric_data.side_effect = get_metric_data
+
+        result = self.manager.fetch_metric_data(metrics)
+
+        self.assertEqual(self.manager.cloudwatch_client.get_metric_data.call_count, 3)
+        self.assertEqual(len(result), 501)
+        self.assertEqual(result[make_hash(metrics[0])], 2.0)
+        self.assertEqual(result[make_hash(metrics[500])], 5.0)
+
+
+    def test_get_labourer_status__batch_health_metrics(self):
+        self.manager.config['batch_health_metrics'] = True
+        self.manager.get_health = MagicMock(return_value=3)
+        self.manager.cloudwatch_client = MagicMock()
+        self.manager.cloudwatch_client.get_metric_data.return_value = self.get_metric_data_response(
+                [f"m{i}" for i in range(6)])
+
+        labourers = []
+        for i in range(2):
+            labourer = Labourer(id=f"lab_{i}")
+            setattr(labourer, 'health_metrics', {
+                k: {'details': {**v['details'], 'Dimensions': [{'Name': 'Lab', 'Value': labourer.id}]}}
+                for k, v in self.SAMPLE_HEALTH_METRICS.items()})
+            labourers.append(labourer)
+
+        tm = MagicMock()
+        tm.get_labourers.return_value = labourers
+        self.manager.register_task_manager(tm)
+
+        for labourer in labourers:
+            self.assertEqual(self.manager.get_labourer_status(labourer), 3)
+
+        # A single request for all the metrics of all the Labourers.
+        self.manager.cloudwatch_client.get_metric_data.assert_called_once()
+        _, kwargs = self.manager.cloudwatch_client.get_metric_data.call_args
+        self.assertEqual(len(kwargs['MetricDataQueries']), 6)
+        self.manager.get_health.assert_called_with(30.0, metric=labourers[1].health_metrics['test3'])
+
+        # The cache survives the next registration.
+        self.manager.register_task_manager(tm)
+        self.manager.get_labourer_status(labourers[0])
+        self.manager.cloudwatch_client.get_metric_data.assert_called_once()
+
+        # Expires after the Period of the metric.
+        later = time.time() + 61
+        with patch('time.time') as t:
+            t.return_value = later
+            self.manager.get_labourer_status(labourers[0])
+        self.assertEqual(self.manager.cloudwatch_client.get_metric_data.call_count, 2)
+
+
+    def test_get_health_metric_value__falls_back_to_metric_stats(self):
+        self.manager.register_task_manager(MagicMock())
+        self.manager.cloudwatch_client = MagicMock()
+        self.manager.cloudwatch_client.get_metric_data.return_value = {'MetricDataResults': []}
+        self.manager.fetch_metric_stats = MagicMock(return_value=42)
+
+        health_metric = self.SAMPLE_HEALTH_METRICS['test1']
+        self.assertEqual(self.manager.get_health_metric_value(self.LABOURER, health_metric), 42)
+        self.manager.fetch_metric_stats.assert_called_once_with(metric=health_metric['details'])
+
+
+    def set_snapshot(self, snapshot, age=0):
+        tm = MagicMock()
+        tm.dynamo_db_client.get_by_query.return_value = [{
+            'labourer_id': '__ecology_snapshot__',
+            'snapshot':    json.dumps(snapshot),
+            'snapshot_at': time.time() - age,
+        }]
+        self.manager.register_task_manager(tm)
+        self.manager.config['ecology_snapshot_mode'] = 'consumer'
+        return tm
+
+
+    def test_publish_snapshot(self):
+        tm = MagicMock()
+        tm.get_length_of_queue_for_labourer.return_value = 100
+        tm.get_count_of_running_tasks_for_labourer.return_value = 3
+        self.manager.register_task_manager(tm)
+        self.manager.get_labourer_status = MagicMock(return_value=4)
+
+        self.manager.publish_snapshot([self.LABOURER])
+
+        tm.dynamo_db_client.update.assert_called_once()
+        _, kwargs = tm.dynamo_db_client.update.call_args
+        self.assertEqual(kwargs['keys'], {'labourer_id': '__ecology_snapshot__'})
+        self.assertEqual(kwargs['table_name'], 'sosw_ecology_snapshot')
+        self.assertEqual(json.loads(kwargs['attributes_to_update']['snapshot']),
+                         {self.LABOURER.id: {'health': 4, 'running': 3, 'queued': 100}})
+        self.assertAlmostEqual(kwargs['attributes_to_update']['snapshot_at'], time.time(), delta=5)
+
+
+    def test_get_snapshot_value(self):
+        tm = self.set_snapshot({self.LABOURER.id: {'health': 3, 'running': 5, 'queued': 42}})
+
+        self.assertEqual(self.manager.get_snapshot_value(self.LABOURER, 'queued'), 42)
+        self.assertEqual(self.manager.get_snapshot_value(self.LABOURER, 'health'), 3)
+        self.assertIsNone(self.manager.get_snapshot_value(Labourer(id='other'), 'health'))
+
+        # The snapshot is read once per `read_ttl`.
+        tm.dynamo_db_client.get_by_query.assert_called_once()
+        self.assertEqual(self.manager.stats['ecology_snapshot_hits'], 2)
+        self.assertEqual(self.manager.stats['ecology_snapshot_misses'], 1)
+
+
+    def test_get_snapshot_value__not_consumer(self):
+        tm = self.set_snapshot({self.LABOURER.id: {'health': 3, 'running': 5, 'queued': 42}})
+        self.manager.config['ecology_snapshot_mode'] = None
+
+        self.assertIsNone(self.manager.get_snapshot_value(self.LABOURER, 'queued'))
+        tm.dynamo_db_client.get_by_query.assert_not_called()
+
+
+    def test_get_snapshot_value__stale(self):
+        self.set_snapshot({self.LABOURER.id: {'health': 3, 'running': 5, 'queued': 42}}, age=121)
+
+        self.assertIsNone(self.manager.get_snapshot_value(self.LABOURER, 'queued'))
+        self.assertEqual(self.manager.stats['ecology_snapshot_stale'], 1)
+
+
+    def test_get_snapshot_value__read_failure(self):
+        tm = self.set_snapshot({})
+        tm.dynamo_db_client.get_by_query.side_effect = Exception("Boom")
+
+        self.assertIsNone(self.manager.get_snapshot_value(self.LABOURER, 'queued'))
+
+
+    def test_snapshot__table_not_configured(self):
+        tm = self.set_snapshot({self.LABOURER.id: {'health': 3, 'running': 5, 'queued': 42}})
+        self.manager.config['ecology_snapshot_config'] = {**self.manager.config['ecology_snapshot_config'],
+                                                          'table_name': None}
+
+        self.assertIsNone(self.manager.get_snapshot_value(self.LABOURER, 'queued'))
+        tm.dynamo_db_client.get_by_query.assert_not_called()
+
+        self.manager.publish_snapshot([self.LABOURER])
+        tm.dynamo_db_client.update.assert_not_called()
+
+
+    def test_consumer__uses_snapshot(self):
+        tm = self.set_snapshot({self.LABOURER.id: {'health': 1, 'running': 5, 'queued': 42}})
+        self.manager.fetch_metric_stats = MagicMock()
+
+        labourer = deepcopy(self.LABOURER)
+        setattr(labourer, 'health_metrics', self.SAMPLE_HEALTH_METRICS)
+
+        self.assertEqual(self.manager.get_labourer_status(labourer), 1)
+        self.assertEqual(self.manager.count_running_tasks_for_labourer(labourer), 5)
+
+        self.manager.fetch_metric_stats.assert_not_called()
+        tm.get_count_of_running_tasks_for_labourer.assert_not_called()
+
+
+    def test_consumer__falls_back_to_live(self):
+        tm = self.set_snapshot({self.LABOURER.id: {'health': 1, 'running': 5, 'queued': 42}}, age=600)
+        tm.get_count_of_running_tasks_for_labourer.return_value = 7
+
+        self.assertEqual(self.manager.count_running_tasks_for_labourer(self.LABOURER), 7)
+
+
     def test_fetch_metric_stats__calls_boto(self):
         self.manager.cloudwatch_client = MagicMock()
         self.manager.cloudwatch_client.get_metric_statistics.return_value = self.SAMPLE_GET_METRICS_STATISTICS_RESPONSE
@@ -3,6 +3,8 @@ import json
 import logging
 import os
 import random
+import sys
+import threading
 import time
 import unittest
 import uuid
@@ -112,6 +114,127 @@ class task_manager_UnitTestCase(unittest.TestCase):
         self.manager.mark_task_invoked.assert_called_once()
 
 
+    def test_invoke_tasks(self):
+        class ConditionalCheckFailedException(Exception):
+            pass
+
+        def mark_task_invoked(labourer, task):
+            if task['task_id'] == 'running':
+                raise ConditionalCheckFailedException
+            if task['task_id'] == 'broken':
+                raise ValueError("Boom")
+
+        self.manager.config['invocation_concurrency'] = 3
+        self.manager.mark_task_invoked = MagicMock(side_effect=mark_task_invoked)
+        self.manager.is_valid_task = MagicMock(return_value=True)
+        on_invoked = MagicMock()
+
+        tasks = [{'task_id': x, 'labourer_id': self.labourer.id, 'payload': {'foo': x}}
+                 for x in ['t1', 'running', 'broken', 't2']]
+
+        result = self.manager.invoke_tasks(self.labourer, tasks, on_invoked=on_invoked)
+
+        self.assertEqual(result, {'t1': 'invoked', 'running': 'skipped', 'broken': 'failed', 't2': 'invoked'})
+        self.assertEqual(self.manager.lambda_client.invoke.call_count, 2)
+        self.assertEqual(self.manager.stats['concurrent_task_invocations_skipped'], 1)
+        self.assertEqual(self.manager.stats['failed_task_invocations'], 1)
+
+        # The callback receives the original tasks.
+        self.assertCountEqual([c[0][0] for c in on_invoked.call_args_list],
+                              [{'task_id': x, 'labourer_id': self.labourer.id, 'payload': {'foo': x}}
+                               for x in ['t1', 't2']])
+
+
+    def test_claim_tasks(self):
+        class TransactionCanceledException(Exception):
+            pass
+
+        self.manager.get_labourers = MagicMock(return_value=[self.labourer])
+        self.manager.register_labourers()
+
+        tasks = [{'task_id': str(i), 'labourer_id': self.labourer.id, 'greenfield': 1000} for i in range(150)]
+
+        # The second transaction conflicts: one task is already invoked, another one conflicts.
+        reasons = [{'Code': 'None'}] * 50
+        reasons[3] = {'Code': 'ConditionalCheckFailed'}
+        reasons[7] = {'Code': 'TransactionConflict'}
+        TransactionCanceledException.response = {'CancellationReasons': reasons}
+        self.manager.dynamo_db_client.transact_write.side_effect = [None, TransactionCanceledException]
+        self.manager.mark_task_invoked = MagicMock()
+
+        result = self.manager.claim_tasks(self.labourer, tasks)
+
+        self.assertEqual(self.manager.dynamo_db_client.transact_write.call_count, 2)
+        self.assertEqual(len(self.manager.dynamo_db_client.transact_write.call_args_list[0][0]), 100)
+        self.assertEqual(len(self.manager.dynamo_db_client.transact_write.call_args_list[1][0]), 50)
+
+        # All the tasks of the cancelled transaction except the invoked one are retried individually.
+        self.assertEqual(self.manager.mark_task_invoked.call_count, 49)
+        self.assertEqual(len(result), 149)
+        self.assertNotIn(tasks[103], result)
+        self.assertEqual(self.manager.stats['concurrent_task_invocations_skipped'], 1)
+
+
+    def test_invoke_tasks__stats_from_threads(self):
+        self.manager.config['invocation_concurrency'] = 8
+        self.manager.mark_task_invoked = MagicMock()
+        self.manager.is_valid_task = MagicMock(return_value=True)
+
+        tasks = [{'task_id': str(i), 'labourer_id': self.labourer.id} for i in range(500)]
+
+        # Switch threads as often as possible to expose lost updates of the shared stats.
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            self.manager.invoke_tasks(self.labourer, tasks)
+        finally:
+            sys.setswitchinterval(interval)
+
+        self.assertEqual(self.manager.stats['invoked_tasks'], 500)
+
+
+    def test_invoke_tasks__claim_in_batch(self):
+        self.manager.config['claim_tasks_in_batch'] = True
+        self.manager.is_valid_task = MagicMock(side_effect=lambda t: t['task_id'] != 'invalid')
+        self.manager.mark_task_invoked = MagicMock()
+
+        tasks = [{'task_id': x, 'labourer_id': self.labourer.id} for x in ['t1', 'running', 'invalid']]
+        self.manager.claim_tasks = MagicMock(return_value=[tasks[0]])
+
+        result = self.manager.invoke_tasks(self.labourer, tasks)
+
+        self.assertEqual(result, {'invalid': 'failed', 'running': 'skipped', 't1': 'invoked'})
+        self.manager.claim_tasks.assert_called_once_with(self.labourer, tasks[:2])
+        self.manager.mark_task_invoked.assert_not_called()
+        self.manager.lambda_client.invoke.assert_called_once()
+
+
+    def test_invoke_tasks__stop_event(self):
+        self.manager.config['invocation_concurrency'] = 1
+        self.manager.mark_task_invoked = MagicMock()
+        self.manager.is_valid_task = MagicMock(return_value=True)
+        stop_event = threading.Event()
+
+        tasks = [{'task_id': x, 'labourer_id': self.labourer.id} for x in ['t1', 't2', 't3']]
+
+        # The time budget is over right after the first invocation.
+        result = self.manager.invoke_tasks(self.labourer, tasks, on_invoked=lambda task: stop_event.set(),
+                                           stop_event=stop_event)
+
+        self.assertEqual(result, {'t1': 'invoked', 't2': 'skipped', 't3': 'skipped'})
+        self.manager.lambda_client.invoke.assert_called_once()
+        self.assertEqual(self.manager.stats['cancelled_task_invocations'], 2)
+
+        # Nothing is started with the event already set.
+        self.assertEqual(self.manager.invoke_tasks(self.labourer, tasks, stop_event=stop_event),
+                         {'t1': 'skipped', 't2': 'skipped', 't3': 'skipped'})
+        self.manager.lambda_client.invoke.assert_called_once()
+
+
+    def test_invoke_tasks__empty(self):
+        self.assertEqual(self.manager.invoke_tasks(self.labourer, []), {})
+
+
     def test_invoke_task__calls__get_task_by_id(self):
         self.manager.is_valid_task = MagicMock(return_value=True)
         self.manager.mark_task_invoked = MagicMock()
@@ -196,12 +319,85 @@ class task_manager_UnitTestCase(unittest.TestCase):
         self.assertEqual(lab.get_attr('max_attempts'), 3)
 
 
+    def test_register_labourers__lazy_attributes(self):
+        eco = self.manager.ecology_client
+        eco.get_max_labourer_duration.return_value = 900
+
+        labourers = self.manager.register_labourers()
+
+        eco.get_labourer_status.assert_not_called()
+        eco.get_max_labourer_duration.assert_not_called()
+        eco.get_labourer_average_duration.assert_not_called()
+
+        # The first access resolves the attribute for all the registered Labourers.
+        self.assertEqual(labourers[0].get_attr('max_duration'), 900)
+        self.assertEqual(eco.get_max_labourer_duration.call_count, len(labourers))
+        self.assertEqual(labourers[1].get_attr('max_duration'), 900)
+        self.assertEqual(eco.get_max_labourer_duration.call_count, len(labourers))
+
+        # Cached for the next registration.
+        labourers = self.manager.register_labourers()
+        self.assertEqual(labourers[1].get_attr('max_duration'), 900)
+        self.assertEqual(eco.get_max_labourer_duration.call_count, len(labourers))
+        eco.get_labourer_average_duration.assert_not_called()
+
+        # Expired.
+        later = time.time() + self.manager.config['labourer_attributes_ttl']['max_duration'] + 1
+        with patch('time.time') as t:
+            t.return_value = later
+            labourers = self.manager.register_labourers()
+            labourers[0].get_attr('max_duration')
+        self.assertEqual(eco.get_max_labourer_duration.call_count, 2 * len(labourers))
+
+
+    def test_register_labourers__lazy_attribute_failure_of_other_labourer(self):
+        eco = self.manager.ecology_client
+        eco.get_labourer_status.side_effect = lambda x: 4 if x.id == self.LABOURER.id else 1 / 0
+
+        labourers = self.manager.register_labourers()
+        some, other = sorted(labourers, key=lambda x: x.id != self.LABOURER.id)
+
+        self.assertEqual(some.get_attr('health'), 4)
+        self.assertRaises(ZeroDivisionError, other.get_attr, 'health')
+
+
     def test_register_labourers__calls_register_task_manager(self):
 
         self.manager.register_labourers()
         self.manager.ecology_client.register_task_manager.assert_called_once_with(self.manager)
 
 
+    def test_refresh_labourers(self):
+        eco = self.manager.ecology_client
+        eco.get_max_labourer_duration.return_value = 900
+
+        with patch('time.time') as t:
+            t.return_value = 123
+            labourers = self.manager.register_labourers()
+            labourers[0].get_attr('max_duration')
+
+        with patch('time.time') as t:
+            t.return_value = 150
+            refreshed = self.manager.refresh_labourers()
+            max_duration = refreshed[0].get_attr('max_duration')
+
+        self.assertEqual([x.id for x in refreshed], [x.id for x in labourers])
+        lab = refreshed[0]
+        invoke_time = 150 + self.manager.config['greenfield_invocation_delta']
+        self.assertEqual(lab.get_attr('start'), 150)
+        self.assertEqual(lab.get_attr('invoked'), invoke_time)
+        self.assertEqual(lab.get_attr('expired'), invoke_time - lab.duration - lab.cooldown)
+
+        # Lazy attributes are reused, the counters of running tasks are reset, ecology is not registered again.
+        self.assertEqual(max_duration, 900)
+        self.assertEqual(eco.get_max_labourer_duration.call_count, len(labourers))
+        self.assertEqual(eco.reset_running_tasks.call_count, len(labourers))
+        eco.register_task_manager.assert_called_once()
+
+        # The cache of health metrics expires with the TTL of `health`.
+        eco.expire_health_metrics.assert_called_once_with(ttl=self.manager.config['labourer_attributes_ttl']['health'])
+
+
     def test_get_count_of_running_tasks_for_labourer(self):
 
         labourer = self.manager.register_labourers()[0]
@@ -406,6 +602,141 @@ class task_manager_UnitTestCase(unittest.TestCase):
         self.assertEqual(payload['lloyd'], 'green ninja')
 
 
+    def test_create_tasks(self):
+        ROWS = [{'payload': {'foo': 42}}, {'bar': 'baz'}, {'labourer_id': self.LABOURER.id, 'foo': 7}]
+        self.manager.get_newest_greenfield_for_labourer = MagicMock(return_value=5000)
+
+        r = self.manager.create_tasks(labourer=self.LABOURER, rows=ROWS)
+
+        self.manager.get_newest_greenfield_for_labourer.assert_called_once()
+        self.manager.dynamo_db_client.put.assert_not_called()
+        self.manager.dynamo_db_client.batch_write_items_one_table.assert_called_once()
+
+        call_args, call_kwargs = self.manager.dynamo_db_client.batch_write_items_one_table.call_args
+        tasks = call_args[0]
+        self.assertEqual(tasks, r)
+        self.assertEqual(len(tasks), 3)
+
+        # Greenfields are incremented locally to keep the order of rows in queue.
+        self.assertEqual([int(x['greenfield']) for x in tasks], [6000, 7000, 8000])
+        self.assertEqual(json.loads(tasks[1]['payload']), {'bar': 'baz'})
+        self.assertEqual(len(set(x['task_id'] for x in tasks)), 3)
+
+        for task in tasks:
+            self.assertEqual(task['labourer_id'], self.LABOURER.id)
+            for field in self.manager.config['dynamo_db_config']['required_fields']:
+                self.assertIn(field, task.keys())
+
+
+    def test_create_task__reuses_reserved_greenfields(self):
+        self.manager.get_newest_greenfield_for_labourer = MagicMock(return_value=5000)
+
+        for _ in range(3):
+            self.manager.create_task(labourer=self.LABOURER, payload={'foo': 42})
+
+        self.manager.get_newest_greenfield_for_labourer.assert_called_once()
+        greenfields = [int(c[0][0]['greenfield']) for c in self.manager.dynamo_db_client.put.call_args_list]
+        self.assertEqual(greenfields, [6000, 7000, 8000])
+
+
+    def test_reserve_greenfields_for_labourer(self):
+        self.manager.config['greenfield_block_size'] = 3
+        self.manager.get_newest_greenfield_for_labourer = MagicMock(return_value=5000)
+
+        self.assertEqual(self.manager.reserve_greenfields_for_labourer(self.LABOURER, count=2), [6000, 7000])
+        self.assertEqual(self.manager.reserve_greenfields_for_labourer(self.LABOURER), [8000])
+        self.manager.get_newest_greenfield_for_labourer.assert_called_once()
+
+        # The block is exhausted. Should query again, but never go back from the already handed out values.
+        self.assertEqual(self.manager.reserve_greenfields_for_labourer(self.LABOURER), [9000])
+        self.assertEqual(self.manager.get_newest_greenfield_for_labourer.call_count, 2)
+
+        # Some other process queued more tasks meanwhile.
+        self.manager.get_newest_greenfield_for_labourer.return_value = 50000
+        self.assertEqual(self.manager.reserve_greenfields_for_labourer(self.LABOURER, count=5),
+                         [51000, 52000, 53000, 54000, 55000])
+        self.assertEqual(self.manager.get_newest_greenfield_for_labourer.call_count, 3)
+
+
+    def test_reserve_greenfields_for_labourer__expires(self):
+        self.manager.get_newest_greenfield_for_labourer = MagicMock(return_value=5000)
+
+        with patch('time.time') as t:
+            t.return_value = 1000
+            self.manager.reserve_greenfields_for_labourer(self.LABOURER)
+            self.manager.reserve_greenfields_for_labourer(self.LABOURER)
+            self.manager.get_newest_greenfield_for_labourer.assert_called_once()
+
+            t.return_value = 1001 + self.manager.config['greenfield_block_ttl']
+            self.manager.reserve_greenfields_for_labourer(self.LABOURER)
+            self.assertEqual(self.manager.get_newest_greenfield_for_labourer.call_count, 2)
+
+
+    def test_create_tasks__strict_validates(self):
+        self.manager.get_newest_greenfield_for_labourer = MagicMock(return_value=5000)
+
+        self.assertRaises(ValueError, self.manager.create_tasks, labourer=self.LABOURER,
+                          rows=[{'labourer_id': 'some_other_function'}])
+        self.manager.dynamo_db_client.batch_write_items_one_table.assert_not_called()
+
+
+    def test_construct_task__deterministic_task_id(self):
+        self.manager.config['deterministic_task_ids'] = True
+        self.manager.get_newest_greenfield_for_labourer = MagicMock(return_value=5000)
+
+        a = self.manager.construct_task(labourer=self.LABOURER, payload={'foo': 42, 'bar': [1, 2]})
+        b = self.manager.construct_task(labourer=self.LABOURER, payload={'bar': [1, 2]}, foo=42)
+        c = self.manager.construct_task(labourer=self.LABOURER, payload={'foo': 43, 'bar': [1, 2]})
+
+        self.assertEqual(a['task_id'], b['task_id'])
+        self.assertNotEqual(a['task_id'], c['task_id'])
+        self.assertEqual(a['task_id'], self.manager.make_task_id(self.LABOURER.id, a['payload']))
+
+        # Suggested task_id must match in strict mode.
+        self.assertRaises(ValueError, self.manager.construct_task, labourer=self.LABOURER, task_id='x', foo=42)
+        self.assertEqual(self.manager.construct_task(labourer=self.LABOURER, strict=False, task_id='x')['task_id'], 'x')
+
+
+    def test_create_task__deterministic_skips_duplicate(self):
+        self.manager.config['deterministic_task_ids'] = True
+        self.manager.get_newest_greenfield_for_labourer = MagicMock(return_value=5000)
+
+        class ConditionalCheckFailedException(Exception):
+            pass
+
+        self.assertIsNotNone(self.manager.create_task(labourer=self.LABOURER, payload={'foo': 42}))
+        self.manager.dynamo_db_client.put.assert_called_once()
+        self.assertEqual(self.manager.dynamo_db_client.put.call_args[1], {'overwrite_existing': False})
+
+        self.manager.dynamo_db_client.put.side_effect = ConditionalCheckFailedException
+        self.assertIsNone(self.manager.create_task(labourer=self.LABOURER, payload={'foo': 42}))
+        self.assertEqual(self.manager.stats['duplicate_tasks_skipped'], 1)
+
+        # Other errors are not swallowed.
+        self.manager.dynamo_db_client.put.side_effect = RuntimeError
+        self.assertRaises(RuntimeError, self.manager.create_task, labourer=self.LABOURER, payload={'foo': 42})
+
+
+    def test_create_tasks__deterministic_returns_only_created(self):
+        self.manager.config['deterministic_task_ids'] = True
+        self.manager.get_newest_greenfield_for_labourer = MagicMock(return_value=5000)
+
+        class ConditionalCheckFailedException(Exception):
+            pass
+
+        self.manager.dynamo_db_client.put.side_effect = [None, ConditionalCheckFailedException, None]
+        limiter = MagicMock()
+
+        r = self.manager.create_tasks(labourer=self.LABOURER, rows=[{'a': 1}, {'a': 2}, {'a': 3}],
+                                      rate_limiter=limiter)
+
+        self.manager.dynamo_db_client.batch_write_items_one_table.assert_not_called()
+        self.assertEqual(self.manager.dynamo_db_client.put.call_count, 3)
+        self.assertEqual([json.loads(x['payload']) for x in r], [{'a': 1}, {'a': 3}])
+        self.assertEqual(self.manager.stats['duplicate_tasks_skipped'], 1)
+        self.assertEqual(limiter.wait.call_count, 3)
+
+
     def test_construct_payload_for_task(self):
         TESTS = [
             (dict(payload={'foo': 42}), {'foo': 42}),  # Dictionary
@@ -432,6 +763,162 @@ class task_manager_UnitTestCase(unittest.TestCase):
         self.assertEqual(self.manager.dynamo_db_client.get_by_query.call_count, 2)
 
 
+    def test_get_average_labourer_duration__from_running_stats(self):
+        self.manager.config['labourer_duration_stats'] = True
+        some_labourer = self.manager.register_labourers()[0]
+
+        increments, _ = self.manager.duration_stats.get_increments(42)
+        self.manager.dynamo_db_client.get_by_query.return_value = [{'labourer_id': 'some_function', **increments}]
+
+        self.assertEqual(self.manager.get_average_labourer_duration(some_labourer), 42)
+        self.manager.dynamo_db_client.get_by_query.assert_called_once_with(
+                keys={'labourer_id': 'some_function'}, table_name=self.manager.config['sosw_labourer_stats_table'],
+                fetch_all_fields=True)
+
+
+    def test_get_average_labourer_duration__running_stats_fail(self):
+        self.manager.config['labourer_duration_stats'] = True
+        some_labourer = self.manager.register_labourers()[0]
+
+        self.manager.dynamo_db_client.get_by_query.side_effect = [Exception("ResourceNotFound"), [], []]
+
+        self.assertEqual(self.manager.get_average_labourer_duration(some_labourer), 0)
+        self.assertEqual(self.manager.dynamo_db_client.get_by_query.call_count, 3)
+        self.assertEqual(self.manager.stats['failed_duration_stats_lookups'], 1)
+
+
+    def test_record_labourer_duration(self):
+        self.manager.record_labourer_duration('some_function', 30)
+
+        call_kwargs = self.manager.dynamo_db_client.update.call_args[1]
+        self.assertEqual(call_kwargs['keys'], {'labourer_id': 'some_function'})
+        self.assertEqual(call_kwargs['table_name'], self.manager.config['sosw_labourer_stats_table'])
+        self.assertEqual(call_kwargs['attributes_to_increment']['count'], '1')
+        self.assertEqual(len(call_kwargs['attributes_to_remove']), 2)
+        self.assertEqual(self.manager.stats['durations_recorded'], 1)
+
+
+    def test_get_task_duration(self):
+        delta = self.manager.config['greenfield_invocation_delta']
+
+        self.assertEqual(self.manager.get_task_duration({'greenfield': 1000 + delta, 'completed_at': 1030}), 30)
+        self.assertIsNone(self.manager.get_task_duration({'greenfield': 1000 + delta}))
+
+
+    def test_mark_task_invoked__with_counters(self):
+        self.manager.config['labourer_counters'] = True
+        self.manager.get_labourers = MagicMock(return_value=[self.labourer])
+        self.manager.register_labourers()
+        task = {'task_id': '123', 'labourer_id': self.labourer.id, 'greenfield': 1000}
+
+        self.manager.mark_task_invoked(self.labourer, task)
+
+        self.manager.dynamo_db_client.update.assert_not_called()
+        self.manager.dynamo_db_client.transact_write.assert_called_once()
+        self.assertEqual(len(self.manager.dynamo_db_client.transact_write.call_args[0]), 2)
+
+        task_update, counters_update = self.manager.dynamo_db_client.make_update_transaction_item.call_args_list
+        self.assertEqual(task_update[0][0], {'task_id': '123'})
+        self.assertIn('condition_expression', task_update[1])
+        self.assertEqual(counters_update[1]['keys'], {'labourer_id': self.labourer.id})
+        self.assertEqual(counters_update[1]['attributes_to_increment'], {'queued': -1, 'running': 1})
+        self.assertEqual(counters_update[1]['table_name'], self.config['sosw_labourer_counters_table'])
+
+
+    def test_invoke_task__transaction_condition_failed__skips(self):
+        class TransactionCanceledException(Exception):
+            response = {'CancellationReasons': [{'Code': 'ConditionalCheckFailed'}, {'Code': 'None'}]}
+
+        self.manager.config['labourer_counters'] = True
+        self.manager.get_labourers = MagicMock(return_value=[self.labourer])
+        self.manager.register_labourers()
+        self.manager.dynamo_db_client.transact_write.side_effect = TransactionCanceledException
+
+        self.manager.invoke_task(self.labourer, task={'task_id': '123', 'labourer_id': self.labourer.id,
+                                                      'created_at': 1000, 'greenfield': 1000})
+
+        self.manager.lambda_client.invoke.assert_not_called()
+        self.assertEqual(self.manager.stats['concurrent_task_invocations_skipped'], 1)
+
+
+    @patch('time.sleep')
+    def test_transact_write_with_counters__retries_conflicts(self, mock_sleep):
+        class TransactionCanceledException(Exception):
+            response = {'CancellationReasons': [{'Code': 'None'}, {'Code': 'TransactionConflict'}]}
+
+        self.manager.dynamo_db_client.transact_write.side_effect = [TransactionCanceledException, None]
+        self.manager.transact_write_with_counters('some_function', {'Put': {}}, queued=1)
+
+        self.assertEqual(self.manager.dynamo_db_client.transact_write.call_count, 2)
+        self.assertEqual(self.manager.stats['labourer_counters_conflicts'], 1)
+
+        # Never more than configured retries.
+        self.manager.dynamo_db_client.transact_write.side_effect = TransactionCanceledException
+        self.assertRaises(TransactionCanceledException, self.manager.transact_write_with_counters, 'some_function',
+                          {'Put': {}}, queued=1)
+
+
+    def test_archive_task__with_counters(self):
+        self.manager.config['labourer_counters'] = True
+        self.manager.make_labourer_counters_transaction_item = MagicMock()
+
+        for task, counters in [({'completed_at': 1000}, {'completed': -1}), ({}, {'running': -1, 'expired': 1})]:
+            self.manager.get_task_by_id = Mock(return_value={'task_id': '123', 'labourer_id': 'lab', **task})
+            self.manager.archive_task('123')
+
+            self.manager.make_labourer_counters_transaction_item.assert_called_with('lab', **counters)
+
+        self.assertEqual(self.manager.dynamo_db_client.transact_write.call_count, 2)
+        self.manager.dynamo_db_client.put.assert_not_called()
+        self.manager.dynamo_db_client.delete.assert_not_called()
+
+
+    def test_get_length_of_queue_for_labourer__ecology_snapshot(self):
+        self.manager.ecology_client.config = {'ecology_snapshot_mode': 'consumer'}
+        self.manager.ecology_client.get_snapshot_value.return_value = 42
+
+        self.assertEqual(self.manager.get_length_of_queue_for_labourer(self.LABOURER), 42)
+        self.manager.ecology_client.get_snapshot_value.assert_called_once_with(self.LABOURER, 'queued')
+        self.manager.dynamo_db_client.get_by_query.assert_not_called()
+
+        # Fallback to live if the snapshot is missing or stale.
+        self.manager.ecology_client.get_snapshot_value.return_value = None
+        self.manager.dynamo_db_client.get_by_query.return_value = 7
+        self.assertEqual(self.manager.get_length_of_queue_for_labourer(self.LABOURER), 7)
+
+
+    def test_get_length_of_queue_for_labourer__counters(self):
+        self.manager.config['labourer_counters'] = True
+        self.manager.dynamo_db_client.get_by_query.return_value = [{'labourer_id': 'some_function', 'queued': 42,
+                                                                    'running': -1}]
+
+        self.assertEqual(self.manager.get_length_of_queue_for_labourer(self.labourer), 42)
+        self.assertEqual(self.manager.get_count_of_running_tasks_for_labourer(self.labourer), 0)
+        self.manager.dynamo_db_client.get_by_query.assert_called_with(
+                keys={'labourer_id': 'some_function'}, table_name=self.config['sosw_labourer_counters_table'],
+                fetch_all_fields=True)
+
+
+    @patch('time.time', MagicMock(return_value=10000))
+    def test_reconcile_labourer_counters(self):
+        self.assertFalse(self.manager.reconcile_labourer_counters(self.labourer), "Counters are disabled")
+
+        self.manager.config['labourer_counters'] = True
+        self.manager.register_labourers()
+        self.manager.dynamo_db_client.get_by_query.return_value = [{'labourer_id': 'some_function',
+                                                                    'reconciled_at': 9000}]
+        self.assertFalse(self.manager.reconcile_labourer_counters(self.labourer), "Interval has not passed")
+        self.manager.dynamo_db_client.update.assert_not_called()
+
+        self.manager.dynamo_db_client.get_by_query.side_effect = [5, 2, 1]
+        self.assertTrue(self.manager.reconcile_labourer_counters(self.labourer, force=True))
+
+        self.manager.dynamo_db_client.update.assert_called_once_with(
+                keys={'labourer_id': 'some_function'},
+                attributes_to_update={'queued': 5, 'running': 2, 'completed': 1, 'reconciled_at': 10000},
+                table_name=self.config['sosw_labourer_counters_table'])
+
+
     def test_get_average_labourer_duration__calculates_average(self):
 
         NOW = 10000
@@ -42,9 +42,15 @@ except ImportError:
     logger.setLevel(logging.INFO)
 
 import math
+import threading
+import time
 
-from typing import List
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Optional
 
+from sosw.app import LambdaGlobals
+from sosw.components.invocation_controller import InvocationController, LabourerObservation
+from sosw.components.invocation_controller import get_invocation_controller
 from sosw.essential import Essential
 from sosw.labourer import Labourer
 from sosw.managers.task import TaskManager
@@ -54,6 +60,24 @@ class Orchestrator(Essential):
     """
     | Orchestrator class.
     | Iterates the pre-configured Labourers and invokes appropriate number of Tasks for each one.
+
+    Labourers are processed concurrently in a pool of ``labourers_concurrency`` threads, so a slow Labourer
+    (e.g. slow CloudWatch metrics or a big batch of invocations) does not delay the others. Every Labourer gets
+    its share of the time budget of the invocation. A Labourer that has used its share skips the invocation of
+    tasks till the next run. The duration of every Labourer is reported in stats as
+    ``orchestration_seconds_{labourer_id}``, the failures and time outs are isolated and counted.
+
+    By default the Orchestrator runs a single dispatch cycle per invocation (i.e. per tick of the scheduled rule).
+    If ``dispatch_loop_interval`` is configured, it runs repeated dispatch cycles in the same invocation starting
+    every ``dispatch_loop_interval`` seconds while the remaining time allows. Labourers are registered only once
+    per invocation. Between the cycles only their timestamps and counts of running tasks are refreshed,
+    the other attributes (e.g. health from ecology) are reused according to their TTL.
+    This keeps the slots of short Labourers busy instead of idling till the next tick.
+
+    The number of tasks to invoke for a Labourer is decided by the pluggable InvocationController
+    (``config['invocation_controller']``). The default one uses the fixed ``invocation_number_coefficient``
+    per eco status. The ``AIMDInvocationController`` adapts the concurrency to the queue length, throughput,
+    average duration and health trend of the Labourer.
     """
 
     DEFAULT_CONFIG = {
@@ -65,23 +89,169 @@ class Orchestrator(Essential):
             3: 0.75,
             4: 1
         },
-        'default_simultaneous_invocations': 2
+        'default_simultaneous_invocations': 2,
+        'labourers_concurrency':            5,
+
+        # Seconds reserved in the end of the Lambda invocation. The rest is the time budget shared by Labourers.
+        'shutdown_period':                  5,
+        # Time budget if there is no Lambda context (e.g. local run).
+        'default_time_budget':              55,
+
+        # Seconds between the starts of dispatch cycles in the same invocation. `None` runs a single cycle.
+        'dispatch_loop_interval':           None,
+        # Do not start a new dispatch cycle if less than this number of seconds is left in the time budget.
+        'dispatch_loop_min_cycle_seconds':  5,
+
+        # Name of the class in `sosw.components.invocation_controller` or a dotted path to a custom subclass
+        # of InvocationController. It decides the number of invocations for Labourers.
+        'invocation_controller':            'CoefficientInvocationController',
+        # Custom config for the InvocationController. The `invocation_number_coefficient` is passed by default.
+        'invocation_controller_config':     {},
     }
 
     task_client: TaskManager = None
+    invocation_controller: InvocationController = None
+
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Labourers are processed in a pool of threads that share `self.stats`.
+        self._stats_lock = threading.Lock()
+
+        controller_config = {
+            'invocation_number_coefficient': self.config['invocation_number_coefficient'],
+            **self.config['invocation_controller_config'],
+        }
+        self.invocation_controller = get_invocation_controller(self.config['invocation_controller'],
+                                                               config=controller_config)
 
 
     def __call__(self, event):
 
         labourers = self.task_client.register_labourers()
 
-        for labourer in labourers:
-            self.invoke_for_labourer(labourer)
+        if self.config['dispatch_loop_interval']:
+            self.dispatch_loop(labourers)
+        else:
+            self.process_labourers(labourers)
+            self.publish_ecology_snapshot(labourers)
+
+
+    def dispatch_loop(self, labourers: List[Labourer]):
+        """
+        Run dispatch cycles for `labourers` every ``config['dispatch_loop_interval']`` seconds until the time budget
+        of the invocation is over. A new cycle is not started if less than ``dispatch_loop_min_cycle_seconds``
+        would remain for it. A cycle that takes longer than the interval just delays the next one.
+        """
+
+        interval = self.config['dispatch_loop_interval']
+        ends_at = time.monotonic() + self.get_time_budget()
+
+        while True:
+            cycle_started = time.monotonic()
+            self.process_labourers(labourers, budget=ends_at - cycle_started)
+            self.publish_ecology_snapshot(labourers)
+            self.stats['dispatch_cycles'] += 1
 
+            next_cycle = max(cycle_started + interval, time.monotonic())
+            if ends_at - next_cycle < self.config['dispatch_loop_min_cycle_seconds']:
+                break
 
-    def invoke_for_labourer(self, labourer: Labourer):
+            time.sleep(max(0.0, next_cycle - time.monotonic()))
+            labourers = self.task_client.refresh_labourers()
+
+
+    def process_labourers(self, labourers: List[Labourer], budget: Optional[float] = None):
+        """
+        Call ``invoke_for_labourer()`` for `labourers` concurrently. Every Labourer has its share of the time budget
+        depending on the number of Labourers per thread.
+        The exceptions of Labourers are logged and do not affect the others.
+
+        :param labourers:   Labourers to process.
+        :param budget:      Optional time budget in seconds. By default is calculated by ``get_time_budget()``.
+        """
+
+        if not labourers:
+            return
+
+        workers = max(1, min(self.config['labourers_concurrency'], len(labourers)))
+        budget = budget if budget is not None else self.get_time_budget()
+        labourer_budget = budget / math.ceil(len(labourers) / workers)
+
+        stop_event = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = {pool.submit(self.process_labourer, labourer, labourer_budget, stop_event): labourer
+                   for labourer in labourers}
+        done, not_done = wait(futures, timeout=budget)
+
+        # The threads still running are not waited for, but they stop before the next invocation of a task.
+        stop_event.set()
+
+        # Python 3.8 has no `cancel_futures`, so cancel the ones not yet started one by one.
+        for future in not_done:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+        for future, labourer in futures.items():
+            if future in not_done:
+                logger.error(f"Labourer {labourer.id} did not finish in the time budget of the Orchestrator")
+                self.stats['timed_out_labourers'] += 1
+            elif future.exception():
+                logger.error(f"Failed to process Labourer {labourer.id}: {future.exception()}")
+                self.stats['failed_labourers'] += 1
+            else:
+                self.stats['processed_labourers'] += 1
+
+
+    def process_labourer(self, labourer: Labourer, budget: float, stop_event: Optional[threading.Event] = None):
+        """ Invoke tasks for `labourer` within the `budget` (seconds) and record the duration in stats. """
+
+        started_at = time.monotonic()
+        try:
+            self.invoke_for_labourer(labourer, deadline=started_at + budget, stop_event=stop_event)
+        finally:
+            with self._stats_lock:
+                self.stats[f"orchestration_seconds_{labourer.id}"] = round(time.monotonic() - started_at, 3)
+
+
+    def publish_ecology_snapshot(self, labourers: List[Labourer]):
+        """
+        If the EcologyManager is configured as a producer of the shared ecology snapshot, publish it for `labourers`
+        after the dispatch cycle. Failures are logged and do not affect the Orchestrator.
+        """
+
+        ecology = self.task_client.ecology_client
+        if ecology.config.get('ecology_snapshot_mode') != 'producer':
+            return
+
+        try:
+            ecology.publish_snapshot(labourers)
+        except Exception as err:
+            logger.exception(f"Failed to publish the ecology snapshot: {err}")
+            self.stats['failed_ecology_snapshots'] += 1
+
+
+    def get_time_budget(self) -> float:
+        """ Seconds available for processing Labourers in this invocation. """
+
+        if global_vars.lambda_context:
+            seconds = global_vars.lambda_context.get_remaining_time_in_millis() / 1000 - self.config['shutdown_period']
+        else:
+            seconds = self.config['default_time_budget']
+
+        return max(seconds, 1)
+
+
+    def invoke_for_labourer(self, labourer: Labourer, deadline: Optional[float] = None,
+                            stop_event: Optional[threading.Event] = None):
         """
         Invokes required queued tasks for `labourer`.
+
+        :param labourer:    Labourer to invoke tasks for.
+        :param deadline:    Optional ``time.monotonic()`` after which the Labourer should not start invocations.
+        :param stop_event:  Optional Event set by the Orchestrator when its time budget is over. Once it is set,
+                            no more tasks are invoked.
         """
 
         _ = self.get_db_field_name
@@ -93,36 +263,67 @@ class Orchestrator(Essential):
 
         tasks_to_process = self.task_client.get_next_for_labourer(labourer=labourer, cnt=number_of_tasks)
 
+        if (deadline is not None and time.monotonic() > deadline) or (stop_event is not None and stop_event.is_set()):
+            logger.warning(f"Labourer {labourer.id} has used its time budget. Skipping invocations till the next run.")
+            with self._stats_lock:
+                self.stats['labourers_over_time_budget'] += 1
+            return
+
         if tasks_to_process:
             logger.info(f"Decided to invoke the following tasks for {labourer.id}: {tasks_to_process}")
 
-            for task in tasks_to_process:
-                self.task_client.invoke_task(task=task, labourer=labourer)
+            def post_meta(task):
                 self.meta_handler.post(task_id=task[_('task_id')], labourer_id=task[_('labourer_id')], action='invoked')
 
+            result = self.task_client.invoke_tasks(labourer=labourer, tasks=tasks_to_process, on_invoked=post_meta,
+                                                   stop_event=stop_event)
+            invoked = list(result.values()).count('invoked')
+            self.invocation_controller.record_invocations(labourer, invoked)
+
+            # Keep the cached number of running tasks up to date for the snapshot of ecology.
+            if invoked:
+                self.task_client.ecology_client.add_running_tasks_for_labourer(labourer, count=invoked)
+
 
     def get_desired_invocation_number_for_labourer(self, labourer: Labourer) -> int:
         """
-        Decides the desired maximum number of simultaneous invocations for a specific Labourer.
-        The decision is based on the ecology status of the Labourer and the configs.
+        Decides the desired number of invocations for a specific Labourer now.
+        The decision is delegated to the InvocationController based on the observation of the Labourer.
 
         :return: Number of invocations
         """
 
-        labourer_status = self.task_client.ecology_client.get_labourer_status(labourer=labourer)
+        return self.invocation_controller.get_invocation_number(labourer, self.observe_labourer(labourer))
 
-        coefficient = next(v for k, v in self.config['invocation_number_coefficient'].items() if labourer_status == k)
 
-        labourer_max = labourer.get_attr('max_simultaneous_invocations')
+    def observe_labourer(self, labourer: Labourer) -> LabourerObservation:
+        """
+        Lazy observation of the `labourer` for the InvocationController.
+        The values requiring remote calls are fetched only if the controller asks for them.
+        """
+
+        ecology = self.task_client.ecology_client
 
-        max_invocations = labourer_max if labourer_max is not None else self.config['max_simultaneous_invocations']
 
-        desired = int(math.floor(max_invocations * coefficient))
-        currently_running = self.task_client.ecology_client.count_running_tasks_for_labourer(labourer)
+        def get_max_invocations():
+            labourer_max = labourer.get_attr('max_simultaneous_invocations')
+            return labourer_max if labourer_max is not None else self.config['max_simultaneous_invocations']
 
-        logger.info(f"Labourer: {labourer.id} has currently running {currently_running} tasks and desired {desired} "
-                    f"with respect to status {labourer_status}.")
-        return max(desired - currently_running, 0)
+
+        return LabourerObservation(
+                health=lambda: ecology.get_labourer_status(labourer=labourer),
+                max_invocations=get_max_invocations,
+                running=lambda: ecology.count_running_tasks_for_labourer(labourer),
+                queue_length=lambda: self.task_client.get_length_of_queue_for_labourer(labourer),
+                average_duration=lambda: labourer.get_attr('average_duration'),
+        )
+
+
+    def get_stats(self, recursive: bool = True):
+        if recursive:
+            self.stats.update(self.invocation_controller.stats)
+
+        return super().get_stats(recursive=recursive)
 
 
     def get_labourers(self) -> List[Labourer]:
@@ -137,3 +338,6 @@ class Orchestrator(Essential):
     def get_db_field_name(self, key: str) -> str:
         """ Could be useful if you overwrite field names with your own ones (e.g. for tests). """
         return self.task_client.get_db_field_name(key)
+
+
+global_vars = LambdaGlobals()
@@ -55,6 +55,7 @@ class Scavenger(Essential):
     - archive_tasks(labourer)
     - handle_expired_tasks(labourer)
     - retry_tasks(labourer)
+    - reconcile counters of tasks of the labourer (see ``TaskManager.reconcile_labourer_counters()``)
     """
 
     DEFAULT_CONFIG = {
@@ -81,6 +82,9 @@ class Scavenger(Essential):
             self.handle_expired_tasks(labourer)
             self.retry_tasks(labourer)
 
+            # Fixes the drift of materialized counters if they are enabled. Does nothing most of the time.
+            self.task_client.reconcile_labourer_counters(labourer)
+
 
     def handle_expired_tasks(self, labourer: Labourer):
         logger.debug(f"Called Scavenger.handle_expired_tasks with labourer={labourer}")
@@ -155,15 +159,28 @@ class Scavenger(Essential):
     def archive_tasks(self, labourer: Labourer):
         """
         Read from `sosw_tasks` the ones successfully marked as completed by Workers and archive them.
+
+        If ``labourer_duration_stats`` are enabled in TaskManager and the duration of the task was not yet added
+        to the running statistics of the Labourer (e.g. WorkerAssistant failed to do it), it is recorded here
+        before archiving.
         """
 
         _ = self.get_db_field_name
+        record_durations = self.task_client.config.get('labourer_duration_stats')
 
         logger.debug(f"Running Scavenger.archive_tasks for {labourer.id}")
 
         tasks = self.task_client.get_completed_tasks_for_labourer(labourer)
 
         for task in tasks:
+            if record_durations and not task.get(_('duration_recorded')):
+                duration = self.task_client.get_task_duration(task)
+                if duration is not None:
+                    try:
+                        self.task_client.record_labourer_duration(labourer.id, duration)
+                    except Exception:
+                        logger.exception(f"Failed to record duration of task {task[_('task_id')]}")
+
             logger.info(f"Archiving completed_task: {task}")
             self.task_client.archive_task(task[_('task_id')])
             self.meta_handler.post(task_id=task[_('task_id')], labourer_id=task[_('labourer_id')], action='archived')
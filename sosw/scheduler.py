@@ -43,17 +43,23 @@ except ImportError:
 
 import datetime
 import json
+import math
 import os
 import re
 import time
 
+from collections import defaultdict
+from contextlib import ExitStack
+from itertools import chain, islice
 from typing import Iterable
-from copy import deepcopy
-from typing import List, Set, Tuple, Union, Optional, Dict
+from typing import Iterator, List, Set, Tuple, Union, Optional, Dict
 
 from sosw.essential import Essential
 from sosw.app import LambdaGlobals
 from sosw.components.helpers import get_list_of_multiple_or_one_or_empty_from_dict, trim_arn_to_name, chunks
+from sosw.components.helpers import is_event_from_sqs, unwrap_event_recursively
+from sosw.components.framed_file import COMPRESSION_EXTENSIONS, FramedFileWriter, get_compression, read_frames
+from sosw.components.rate_limiter import TokenBucket
 from sosw.components.siblings import SiblingsManager
 from sosw.managers.task import TaskManager
 
@@ -72,6 +78,86 @@ class InvalidJob(ValueError):
     pass
 
 
+class ChunkingPlan:
+    """
+    Compiled representation of the `chunkable_attrs` from the `job_schema`.
+
+    The order of attributes, their singular / plural variants, links to the next attribute and names
+    of the isolation settings are calculated once per attribute, so the recursive chunking is a walk over
+    dictionary lookups instead of rebuilding lists and running regular expressions on every level.
+    """
+
+    ISOLATE_PATTERN = re.compile(r'isolate_[\w]*|max_[\w]*_per_batch')
+    ISOLATE_PREFIXES = ('isolate_', 'max_')
+
+
+    def __init__(self, attrs: Iterable[str]):
+        self.attrs = list(attrs)
+        self._index = {a: i for i, a in enumerate(self.attrs)}
+
+        self._variants = {}
+        self._plurals = {}
+        self._next_attrs = {}
+        self._isolate_keys = {}
+
+
+    def variants(self, attr: str) -> List[str]:
+        """ Cached ``single_or_plural()`` of the `attr`. """
+
+        try:
+            return self._variants[attr]
+        except KeyError:
+            return self._variants.setdefault(attr, single_or_plural(attr))
+
+
+    def plural(self, attr: str) -> str:
+        """ Cached ``plural()`` of the `attr`. """
+
+        try:
+            return self._plurals[attr]
+        except KeyError:
+            return self._plurals.setdefault(attr, plural(attr))
+
+
+    def next_attr(self, attr: str) -> Optional[str]:
+        """ The next by order chunkable attribute after `attr` or None if `attr` is the last or unknown. """
+
+        try:
+            return self._next_attrs[attr]
+        except KeyError:
+            pass
+
+        result = None
+        for a in self.variants(attr):
+            if a in self._index:
+                try:
+                    result = self.attrs[self._index[a] + 1]
+                except IndexError:
+                    pass
+                break
+
+        self._next_attrs[attr] = result
+        return result
+
+
+    def isolate_keys(self, attr: str) -> Tuple[str, ...]:
+        """ Names of the job settings that require isolation (or batching) of the `attr`. """
+
+        try:
+            return self._isolate_keys[attr]
+        except KeyError:
+            variants = self.variants(attr)
+            keys = tuple([f"isolate_{a}" for a in variants] + [f"max_{a}_per_batch" for a in variants])
+            return self._isolate_keys.setdefault(attr, keys)
+
+
+    @classmethod
+    def is_isolate_key(cls, key: str) -> bool:
+        """ Check if the `key` of the job is one of the isolation settings. """
+
+        return key.startswith(cls.ISOLATE_PREFIXES) and cls.ISOLATE_PATTERN.match(key) is not None
+
+
 class Scheduler(Essential):
     """
     Scheduler is converting business jobs to one or multiple Worker tasks.
@@ -100,6 +186,7 @@ class Scheduler(Essential):
         },
         's3_prefix':       'sosw/scheduler',
         'queue_file':      'tasks_queue.txt',
+        'queue_file_compression': None,
         'queue_bucket':    'autotest-bucket',
         'shutdown_period': 60,
         'rows_to_process': 50,
@@ -113,7 +200,36 @@ class Scheduler(Essential):
                 ]
             }
         },
-        'task_operational_overhead_for_ddb': 0.03,
+        'write_capacity_utilization': 0.95,
+        'checkpoint_every_rows': 500,
+        'checkpoint_every_seconds': 30,
+        'stale_lock_seconds': 300,
+        # Queue files over 5 GB are copied by S3 in multiple parts, so they are checkpointed less often.
+        # Keep it well below `stale_lock_seconds`, so that the processor does not lose the lock.
+        'large_queue_file_checkpoint_seconds': 120,
+        'in_memory_tasks_threshold': 100,
+
+        # Backpressure. The rows of a Labourer are paused while its queue of tasks in DynamoDB is above the high
+        # watermark and resumed once it drains to the low one. The marks can also be set per Labourer
+        # in `task_config['labourers']`. None means no limit.
+        'queue_high_watermark': None,
+        'queue_low_watermark': None,
+        'queue_depth_ttl': 60,
+        'backpressure_wait_seconds': 30,
+        # Total seconds an invocation waits for the queues to drain before handing the file over to a sibling,
+        # and the max number of such siblings in a row. After that the file is left unlocked in S3 with its offset.
+        'backpressure_max_wait_seconds': 120,
+        'backpressure_max_continuations': 5,
+        # SQS queue of this Scheduler to re-drive the file with a delay after `backpressure_max_continuations`.
+        # The delay of SQS is up to 900 seconds. If the queue is not set, the file is left stalled in S3.
+        'backpressure_redrive_queue_url': None,
+        'backpressure_redrive_delay_seconds': 900,
+        # Rows of the paused Labourers are deferred to a separate queue file, while the rows of the others are
+        # processed. Above this number of deferred rows the whole batch waits for the queues to drain instead.
+        'backpressure_max_deferred_rows': 10000,
+        'queue_shards':    1,
+        'max_queue_shards': 10,
+        'wcu_per_queue_shard': 25,
     }
 
     # these clients will be initialized by Processor constructor
@@ -121,13 +237,29 @@ class Scheduler(Essential):
     siblings_client: SiblingsManager = None
     s3_client = None
     sns_client = None
+    sqs_client = None
     base_query = ...
 
+    # Approximate size in DynamoDB of the autogenerated fields of a task (names and values) except `payload`.
+    TASK_ITEM_OVERHEAD_BYTES = 120
+
+    # S3 refuses to copy larger objects with a single `copy_object` request.
+    S3_COPY_OBJECT_MAX_SIZE = 5 * 1024 ** 3
+
 
     def __init__(self, *args, **kwargs):
 
         super().__init__(*args, **kwargs)
 
+        if self.config['backpressure_redrive_queue_url'] and not self.sqs_client:
+            self.register_clients(['sqs'])
+
+        self._queue_shards_count = 1
+        self._write_limiter = None
+        self._queue_depths = {}
+        self._paused_labourers = set()
+        self._backpressure_waited = 0
+        self._backpressure_continuations = 0
         self.set_queue_file()
 
         self.initialize_from_job_schema()
@@ -137,25 +269,115 @@ class Scheduler(Essential):
         """
         Process an event.
 
+        The event is either a single job or a batch of jobs (see ``extract_jobs_from_event()``).
+        For the batch the failed jobs are returned in the format of partial batch response of SQS.
+
         :param dict event: event data
         """
 
+        failed = []
+        batch = self.extract_jobs_from_event(event, failed=failed)
+
+        # A delayed continuation of the queue file (see ``redrive_queue_file()``) is processed as a sibling.
+        if batch and len(batch) == 1 and isinstance(batch[0][1], dict) and 'file_name' in batch[0][1]:
+            event, batch = batch[0][1], None
+
+        if batch is not None:
+            result = self.process_batch_of_jobs(batch, failed=failed)
+            super().__call__(event)
+            return result
+
         job = self.extract_job_from_payload(event)
         self.apply_job_schema(name=job.get('job_schema_name'))
 
+        # Estimate the job without creating anything.
+        if job.pop('dry_run', False):
+            plan = self.plan_job(job)
+            logger.info("Plan of the job: %s", plan)
+            super().__call__(event)
+            return plan
+
         # If called as sibling
         if 'file_name' in job:
             self.set_queue_file(job['file_name'])
+            self._queue_shards_count = int(job.get('queue_shards', 1))
+            self._backpressure_continuations = int(job.get('backpressure_continuations', 0))
 
-        # else construct new data file
+        # else chunk the job.
         else:
-            self.parse_job_to_file(job)
+            self.schedule_tasks(self.iter_tasks_from_job(job))
 
-        self.process_file()
+        if os.path.isfile(self.local_queue_file) or 'file_name' in job or self._queue_file_locked:
+            self.process_file()
 
         super().__call__(event)
 
 
+    def process_batch_of_jobs(self, batch: List[Tuple[str, Union[str, Dict]]],
+                              failed: Optional[List[str]] = None) -> Dict:
+        """
+        Chunk all the jobs of the `batch` to a single combined stream of tasks and process it the same way
+        as the tasks of a single job. A failure of some job does not abort the others.
+
+        The tasks of a job that failed in the middle of chunking may be already queued. Enable
+        ``deterministic_task_ids`` of the TaskManager to make the retries of such jobs idempotent.
+        The same applies to the redelivered batches: every delivery has a new queue file, so the `locked_` file of
+        a killed invocation is never resumed. Expire such files with a lifecycle rule of the bucket.
+
+        :param batch:   List of tuples: (identifier, job).
+        :param failed:  Identifiers of the jobs that already failed to be extracted from the event.
+        :return:        Partial batch response: identifiers of failed jobs in ``batchItemFailures``.
+        """
+
+        failed = failed if failed is not None else []
+        not_extracted = len(failed)
+
+        self.schedule_tasks(self.iter_tasks_from_jobs(batch, failed=failed), resume=False)
+
+        if os.path.isfile(self.local_queue_file) or self._queue_file_locked:
+            self.process_file()
+
+        self.stats['jobs_in_batches'] += len(batch) + not_extracted
+        self.stats['failed_jobs_in_batches'] += len(failed)
+
+        return {'batchItemFailures': [{'itemIdentifier': x} for x in dict.fromkeys(failed)]}
+
+
+    def schedule_tasks(self, tasks: Iterator[Dict], resume: bool = True) -> bool:
+        """
+        Schedule the `tasks` chunked from the job(s). Small jobs are written to DynamoDB directly without
+        the queue file in S3. Otherwise the tasks are written to the queue file (or sharded files) for ``process_file()``.
+
+        The retry of a killed invocation (same ``aws_request_id``) finds its own queue file locked in S3 and resumes
+        from the checkpoint instead. Small jobs never have the queue file, so S3 is not checked for them.
+
+        :param resume:  Look for the `locked_` queue file of the previous attempt. Pointless if the name of the queue
+                        file changes between the attempts (e.g. redelivered SQS batches).
+        :return:        True if the queue file of the previous attempt was resumed.
+        """
+
+        head = list(islice(tasks, self.config['in_memory_tasks_threshold'] + 1))
+
+        in_memory = len(head) <= self.config['in_memory_tasks_threshold'] and self.fits_in_time_budget(len(head)) \
+            and not self.get_paused_labourers(head)
+
+        if resume and not in_memory and self.resume_locked_queue_file():
+            logger.warning("Resuming the queue file %s left by the previous attempt of this invocation.",
+                           self.remote_queue_locked_file)
+            return True
+
+        if in_memory:
+            tasks = self.process_tasks_in_memory(head)
+            head = []
+
+        # Construct new data file(s) from the remaining tasks and share the extra shards with siblings.
+        if head or tasks:
+            shards = self.parse_job_to_file(tasks=chain(head, tasks))
+            self.spawn_queue_shard_consumers(shards[1:])
+
+        return False
+
+
     def apply_job_schema(self, name: str = None):
         """ Apply a job_schema from job_schema_variants by the name or apply the default one."""
 
@@ -170,19 +392,37 @@ class Scheduler(Essential):
     def initialize_from_job_schema(self):
         """Initialize attributes that are mapped to the `job_schema` in self.config"""
 
-        # Initalize chunkable attrs
+        # Initalize chunkable attrs. This also compiles the `chunking_plan`.
         self.chunkable_attrs = list([x[0] for x in self.config['job_schema']['chunkable_attrs']])
         assert not any(x.endswith('s') for x in self.chunkable_attrs), \
             f"We do not currently support attributes that end with 's'. " \
             f"In the config you should use singular form of attribute. Received from config: {self.chunkable_attrs}"
 
 
-    def parse_job_to_file(self, job: Dict):
+    @property
+    def chunkable_attrs(self) -> List[str]:
+        return self.chunking_plan.attrs
+
+
+    @chunkable_attrs.setter
+    def chunkable_attrs(self, value: List[str]):
+        self.chunking_plan = ChunkingPlan(value)
+
+
+    def parse_job_to_file(self, job: Optional[Dict] = None, tasks: Optional[Iterable[Dict]] = None) -> List[str]:
         """
         Splits the Job to multiple tasks and writes them down in self.local_queue_file.
 
+        If sharding is enabled (see ``get_number_of_queue_shards()``) the tasks are distributed round-robin between
+        several shard files. The first shard becomes the current queue file and the rest should be given
+        to siblings for concurrent processing.
+
         :param dict job:    Payload from Scheduled Rule.
-                            Should be already parsed from whatever payload to dict and contain the raw `job`
+                            Should be already parsed from whatever payload to dict and contain the raw `job`.
+                            Not required if the `tasks` are provided.
+        :param tasks:       Tasks already chunked from the job(s) with ``iter_tasks_from_job()``.
+                            If not provided, the `job` is chunked here.
+        :return:            Names of the queue files created. The first one is the current queue file.
         """
 
         if os.path.isfile(self.local_queue_file):
@@ -192,6 +432,42 @@ class Scheduler(Essential):
                             "processing new ones.")
             raise RuntimeError(f"The current Lambda container is already having some unprocessed file.")
 
+        data = tasks if tasks is not None else self.iter_tasks_from_job(job)
+
+        shards = self.get_queue_shard_names(self.get_number_of_queue_shards())
+
+        try:
+            with ExitStack() as stack:
+                files = [stack.enter_context(self.open_queue_file_for_writing(f"/tmp/{name}")) for name in shards]
+                for i, row in enumerate(data):
+                    files[i % len(files)].write(f"{json.dumps(row)}\n")
+
+        # Do not leave the partially written files in the container if chunking failed.
+        except Exception:
+            for name in shards:
+                self.clean_tmp(f"/tmp/{name}")
+            raise
+
+        # There could be less tasks than shards.
+        for name in shards[1:]:
+            if os.path.getsize(f"/tmp/{name}") == 0:
+                self.clean_tmp(f"/tmp/{name}")
+        shards = [shards[0]] + [name for name in shards[1:] if os.path.isfile(f"/tmp/{name}")]
+
+        self.set_queue_file(shards[0])
+        self._queue_shards_count = len(shards)
+
+        logger.info("Finished step: parse_job_to_file()")
+        return shards
+
+
+    def iter_tasks_from_job(self, job: Dict) -> Iterator[Dict]:
+        """
+        Validate the Labourer of the `job` and chunk the job to tasks. The tasks are generated lazily.
+
+        :param dict job:    Payload from Scheduled Rule. The `lambda_name` is popped from it.
+        """
+
         labourer = self.task_client.get_labourer(labourer_id=job.pop('lambda_name'))
         if not labourer:
             raise RuntimeError(f"Invalid (unregistered) Labourer: {labourer}. "
@@ -200,17 +476,318 @@ class Scheduler(Essential):
 
         # In case there is not chunking required, we just schedule `task` directly from the `job`.
         if not all([self.chunkable_attrs, self.needs_chunking(plural(self.chunkable_attrs[0]), job)]):
-            data = [{'labourer_id': labourer.id, **job}]
+            return iter([{'labourer_id': labourer.id, **job}])
 
         # Else there is much more logic how to chunk the job to tasks.
-        else:
-            data = self.construct_job_data(job, skeleton={'labourer_id': labourer.id})
+        return self.iter_job_data(job, skeleton={'labourer_id': labourer.id})
 
-        with open(self.local_queue_file, 'w') as f:
-            for row in data:
-                f.write(f"{json.dumps(row)}\n")
 
-        logger.info("Finished step: parse_job_to_file()")
+    def plan_job(self, job: Dict, invocation_seconds: Optional[int] = None) -> Dict:
+        """
+        Dry run of the `job`. Walks the job with the same chunking logic, but only counts the tasks instead
+        of writing them anywhere, so it is safe to call for huge jobs before the real run.
+
+        The writes are estimated from the size of the task items in DynamoDB (1 WCU per started KB) and the time
+        from the rate of ``write_limiter`` at the current capacity of the tasks table. For on-demand tables
+        the `duration_seconds` and `siblings` are None, because there is no capacity to divide by.
+
+        :param dict job:                The job the same as for ``__call__()``. Is not modified.
+        :param invocation_seconds:      Execution time of a single Scheduler invocation. By default the remaining
+                                        time of the current Lambda context.
+        :return:                        Dictionary with the estimations.
+        """
+
+        _ = self.get_db_field_name
+
+        self.apply_job_schema(name=job.get('job_schema_name'))
+
+        tasks = payload_bytes = wcu = 0
+        for row in self.iter_tasks_from_job(dict(job)):
+            row.pop(_('labourer_id'), None)
+            size = len(self.task_client.construct_payload_for_task(**row).encode('utf-8'))
+
+            tasks += 1
+            payload_bytes += size
+            wcu += math.ceil((size + self.TASK_ITEM_OVERHEAD_BYTES) / 1024)
+
+        in_memory = tasks <= self.config['in_memory_tasks_threshold']
+        shards = 1 if in_memory else min(self.get_number_of_queue_shards(), tasks)
+
+        if invocation_seconds is None:
+            invocation_seconds = global_vars.lambda_context.get_remaining_time_in_millis() / 1000
+        usable_seconds = max(invocation_seconds - self.config['shutdown_period'], 1)
+
+        capacity = self.task_client.dynamo_db_client.get_capacity()
+        write_rate = capacity['write'] * self.config['write_capacity_utilization'] if capacity else None
+
+        duration = siblings = None
+        if write_rate:
+            duration = wcu / write_rate
+            siblings = max(math.ceil(duration / usable_seconds), shards) - 1
+
+        return {
+            'tasks':             tasks,
+            'avg_payload_bytes': round(payload_bytes / tasks) if tasks else 0,
+            'wcu':               wcu,
+            'write_rate':        write_rate,
+            'in_memory':         in_memory,
+            'queue_shards':      shards,
+            'siblings':          siblings,
+            'duration_seconds':  round(duration, 1) if duration is not None else None,
+        }
+
+
+    def iter_tasks_from_jobs(self, batch: List[Tuple[str, Union[str, Dict]]], failed: List[str]) -> Iterator[Dict]:
+        """
+        Chain the tasks of all the jobs from the `batch`. The job schema of every job is applied right before
+        chunking it, so the jobs with different schemas could be mixed in the batch.
+
+        :param batch:   List of tuples: (identifier, job).
+        :param failed:  The identifiers of the failed jobs are appended to this list.
+        """
+
+        for identifier, raw_job in batch:
+            try:
+                job = self.extract_job_from_payload(raw_job)
+                if 'file_name' in job or job.get('dry_run'):
+                    raise InvalidJob(f"Siblings and dry runs are supported only for single jobs: {job}")
+
+                self.apply_job_schema(name=job.get('job_schema_name'))
+                yield from self.iter_tasks_from_job(job)
+
+            except Exception:
+                logger.exception("Failed to chunk job %s from the batch: %s", identifier, raw_job)
+                failed.append(identifier)
+
+
+    def fits_in_time_budget(self, tasks_count: int) -> bool:
+        """
+        Check if `tasks_count` tasks can be written to DynamoDB before the shutdown period.
+        The estimation assumes a single WCU per task at the current rate of ``write_limiter``.
+        """
+
+        if not self.sufficient_execution_time_left:
+            return False
+
+        limiter = self.write_limiter
+        if not limiter:
+            return True
+
+        time_left = global_vars.lambda_context.get_remaining_time_in_millis() / 1000 - self.config['shutdown_period']
+        return tasks_count / limiter.effective_rate < time_left
+
+
+    def process_tasks_in_memory(self, tasks: List[Dict]) -> List[Dict]:
+        """
+        Create the `tasks` in DynamoDB directly, without the queue file. This is the fast path for small jobs.
+
+        :param list tasks:  Tasks chunked from the job.
+        :return:            Tasks left unprocessed, if the execution time ran out.
+                            These should be persisted in the queue file.
+        """
+
+        logger.info("Processing %s tasks in memory", len(tasks))
+        self.stats['jobs_processed_in_memory'] += 1
+
+        for i in range(0, len(tasks), self._rows_to_process):
+            if not self.sufficient_execution_time_left:
+                logger.info("Ran out of execution time in `process_tasks_in_memory`. Persisting the remaining tasks.")
+                return tasks[i:]
+
+            self.create_tasks_from_rows(tasks[i:i + self._rows_to_process])
+
+        return []
+
+
+    def create_tasks_from_rows(self, rows: List[Dict]):
+        """
+        Create tasks in DynamoDB from the rows of the queue. The rows are grouped by Labourers to create tasks in bulk.
+        """
+
+        _ = self.get_db_field_name
+
+        rows_by_labourer = defaultdict(list)
+        for row in rows:
+            rows_by_labourer[row[_('labourer_id')]].append(row)
+
+        for labourer_id, labourer_rows in rows_by_labourer.items():
+            logger.debug("Pushing %s tasks of %s to DynamoDB", len(labourer_rows), labourer_id)
+            labourer = self.task_client.get_labourer(labourer_id)
+            new_tasks = self.task_client.create_tasks(labourer=labourer, rows=labourer_rows,
+                                                      rate_limiter=self.write_limiter)
+
+            if labourer_id in self._queue_depths:
+                depth, checked_at = self._queue_depths[labourer_id]
+                self._queue_depths[labourer_id] = depth + len(new_tasks), checked_at
+
+            for new_task in new_tasks:
+                self.meta_handler.post(task_id=new_task[_('task_id')], action='created', labourer=labourer_id)
+
+
+    def get_queue_watermarks(self, labourer_id: str) -> Tuple[Optional[int], Optional[int]]:
+        """
+        High and low watermarks of the queue length for the Labourer. The settings of the Labourer take precedence
+        over the ones of the Scheduler. If the low watermark is not set, it is the same as the high one.
+        """
+
+        labourer = self.task_client.get_labourer(labourer_id)
+
+        high = getattr(labourer, 'queue_high_watermark', None) or self.config['queue_high_watermark']
+        low = getattr(labourer, 'queue_low_watermark', None) or self.config['queue_low_watermark']
+
+        return high, low if low is not None else high
+
+
+    def get_queue_depth(self, labourer_id: str, refresh: bool = False) -> int:
+        """
+        Number of tasks in the queue of the Labourer. The count from DynamoDB is cached for
+        ``config['queue_depth_ttl']`` seconds and the tasks created meanwhile are added to it.
+        """
+
+        depth, checked_at = self._queue_depths.get(labourer_id, (None, 0))
+
+        if refresh or depth is None or time.time() - checked_at > self.config['queue_depth_ttl']:
+            labourer = self.task_client.get_labourer(labourer_id)
+            depth = self.task_client.get_length_of_queue_for_labourer(labourer)
+            self._queue_depths[labourer_id] = depth, time.time()
+            self.stats['queue_depth_queries'] += 1
+
+        return depth
+
+
+    def is_labourer_paused(self, labourer_id: str, refresh: bool = False) -> bool:
+        """
+        Check if the creation of tasks for the Labourer should wait for its queue to drain.
+        The Labourer is paused above the high watermark and stays paused until the queue is below the low one.
+        """
+
+        high, low = self.get_queue_watermarks(labourer_id)
+        if not high:
+            return False
+
+        depth = self.get_queue_depth(labourer_id, refresh=refresh)
+
+        if labourer_id in self._paused_labourers:
+            if depth <= low:
+                logger.info("Queue of %s drained to %s tasks. Resuming.", labourer_id, depth)
+                self._paused_labourers.discard(labourer_id)
+
+        elif depth >= high:
+            logger.info("Queue of %s has %s tasks, high watermark is %s. Pausing.", labourer_id, depth, high)
+            self._paused_labourers.add(labourer_id)
+            self.stats['labourers_paused'] += 1
+
+        return labourer_id in self._paused_labourers
+
+
+    def get_paused_labourers(self, rows: List[Dict]) -> Set[str]:
+        """ IDs of the paused (see ``is_labourer_paused()``) Labourers of `rows`. """
+
+        _ = self.get_db_field_name
+
+        return {x for x in set(row[_('labourer_id')] for row in rows) if self.is_labourer_paused(x)}
+
+
+    def wait_for_queue_drain(self, labourer_ids: Set[str]) -> bool:
+        """
+        Sleep for ``config['backpressure_wait_seconds']`` (or less if the execution time or
+        ``config['backpressure_max_wait_seconds']`` are ending) and check again the queues of the paused Labourers.
+
+        :return:    True if all the `labourer_ids` are resumed.
+        """
+
+        time_left = global_vars.lambda_context.get_remaining_time_in_millis() / 1000 - self.config['shutdown_period']
+        wait = min(self.config['backpressure_wait_seconds'], time_left,
+                   self.config['backpressure_max_wait_seconds'] - self._backpressure_waited)
+
+        if wait > 0:
+            logger.info("Waiting %s seconds for the queues of %s to drain.", wait, labourer_ids)
+            time.sleep(wait)
+            self._backpressure_waited += wait
+            self.stats['backpressure_waits'] += 1
+
+        return not any([self.is_labourer_paused(x, refresh=True) for x in labourer_ids])
+
+
+    def open_queue_file_for_writing(self, file_name: str):
+        """
+        Open the local queue file for writing rows. Files with extension of some compression
+        (see ``config['queue_file_compression']``) are written as compressed frames of ``config['rows_to_process']``
+        rows. The frames are read one per batch and the offsets of checkpoints are always at the frame boundaries.
+        Other files are written as plain NDJSON.
+
+        :return:    File-like object with `write()` method for rows, that is also a context manager.
+        """
+
+        compression = get_compression(file_name)
+        if compression:
+            return FramedFileWriter(file_name, compression=compression, rows_per_frame=self._rows_to_process)
+
+        return open(file_name, 'w')
+
+
+    def get_number_of_queue_shards(self) -> int:
+        """
+        Number of shard files to split the queue of a new job to. Every shard is processed by a separate sibling.
+
+        The ``config['queue_shards']`` is either a number or `'auto'`. In the latter case the number is derived from
+        the write capacity of the tasks table (one shard per ``config['wcu_per_queue_shard']``) and for on-demand
+        tables the ``config['max_queue_shards']`` is used. The result is never greater than ``max_queue_shards``.
+
+        Sharding is disabled if the siblings can not be spawned.
+        """
+
+        shards = self.config['queue_shards']
+
+        if shards == 'auto':
+            capacity = self.task_client.dynamo_db_client.get_capacity()
+            if capacity and capacity.get('write'):
+                shards = math.ceil(capacity['write'] / self.config['wcu_per_queue_shard'])
+            else:
+                shards = self.config['max_queue_shards']
+
+        shards = max(1, min(int(shards), self.config['max_queue_shards']))
+
+        if shards > 1 and not self.siblings_client.any_events_rules_enabled(global_vars.lambda_context):
+            logger.warning("Sharding of the queue file is configured, but the siblings can not be spawned. "
+                           "Using a single queue file.")
+            return 1
+
+        return shards
+
+
+    def get_queue_shard_names(self, shards: int) -> List[str]:
+        """ Names of shard files for the current queue file. A single shard is the current queue file itself. """
+
+        if shards == 1:
+            return [self._queue_file_name]
+
+        name, ext = self._queue_file_name.split('.', 1)
+        return [f"{name}_shard_{i}.{ext}" for i in range(shards)]
+
+
+    def spawn_queue_shard_consumers(self, shards: List[str]):
+        """
+        Upload the local shard files to S3 and spawn a sibling to process each of them.
+        The siblings get the total number of shards in payload to share the write capacity of the table.
+
+        :param list shards: Names of shard files in the local /tmp/ (not including the current queue file).
+        """
+
+        if not shards:
+            return
+
+        payloads = []
+        for name in shards:
+            self.s3_client.upload_file(Filename=f"/tmp/{name}", Bucket=self._queue_bucket,
+                                       Key=f"{self.config['s3_prefix'].strip('/')}/{name}")
+            self.clean_tmp(f"/tmp/{name}")
+            payloads.append({'file_name': name, 'queue_shards': self._queue_shards_count})
+
+        # We have already checked that the siblings can be spawned while deciding the number of shards.
+        # Siblings with a `file_name` never shard the queue again, so there is no risk of infinite loop here.
+        self.stats['queue_shards_spawned'] += self.siblings_client.spawn_siblings(global_vars.lambda_context,
+                                                                                  payloads=payloads, force=True)
 
 
     # def create_tasks(self, labourer: Labourer, data: List):
@@ -333,14 +910,23 @@ class Scheduler(Essential):
     def chunk_dates(self, job: Dict, skeleton: Dict = None) -> List[Dict]:
         """
         There is a support for multiple not nested parameters to chunk. Dates is one very specific of them.
+        Returns a list of tasks. See ``iter_chunk_dates()`` for the lazy version.
         """
 
-        data = []
-        skeleton = deepcopy(skeleton) or {}
-        job = deepcopy(job)
+        return list(self.iter_chunk_dates(job=job, skeleton=skeleton))
 
-        period = job.pop('period', None)
-        isolate = job.pop('isolate_days', None)
+
+    def iter_chunk_dates(self, job: Dict, skeleton: Dict = None) -> Iterator[Dict]:
+        """
+        Lazy version of ``chunk_dates()``. Yields tasks one by one.
+        The `job` is not modified and the nested values are shared with the resulting tasks.
+        """
+
+        skeleton = skeleton or {}
+
+        period = job.get('period')
+        isolate = job.get('isolate_days')
+        job = {k: v for k, v in job.items() if k not in ('period', 'isolate_days')}
 
         period_patterns = ['last_[0-9]+_days', '[0-9]+_days_back', 'yesterday', 'today', 'previous_[0-9]+_days',
                            'last_week']
@@ -383,25 +969,36 @@ class Scheduler(Essential):
                 assert len(date_list) > 0, f"The chunking period: {period} did not generate date_list. Bad."
 
                 for d in date_list:
-                    data.append({**job, **skeleton, 'date_list': [d]})
+                    yield {**job, **skeleton, 'date_list': [d]}
             else:
                 if len(date_list) > 1:
                     logger.debug("Running chunking for multiple days, but without date isolation. "
                                  "Your workers might feel bad.")
-                data.append({**job, **skeleton, 'date_list': date_list})
+                yield {**job, **skeleton, 'date_list': date_list}
 
         else:
             logger.debug("No `period` chunking requested in job %s", job)
-            data.append({**job, **skeleton})
-
-        return data
+            yield {**job, **skeleton}
 
 
     def construct_job_data(self, job: Dict, skeleton: Dict = None) -> List[Dict]:
         """
         Chunks the job to tasks using several layers. Each layer is represented with a `chunker` method.
-        All chunkers should accept `job` and optional `skeleton` for tasks and return a list of tasks.
-        If there is nothing to chunk for some chunker, return same `job` (with injected `skeleton`) wrapped in a list.
+        Returns a list of tasks. See ``iter_job_data()`` for the lazy version and details about chunkers.
+        """
+
+        return list(self.iter_job_data(job=job, skeleton=skeleton))
+
+
+    def iter_job_data(self, job: Dict, skeleton: Dict = None) -> Iterator[Dict]:
+        """
+        Chunks the job to tasks using several layers. Each layer is represented with a `chunker` method.
+        All chunkers should accept `job` and optional `skeleton` for tasks and yield tasks.
+        If there is nothing to chunk for some chunker, yield same `job` (with injected `skeleton`).
+
+        The tasks are yielded lazily one by one, so the memory footprint does not depend on the size of the job.
+        The nested values are not copied, so the tasks share them with the `job` and between each other.
+        Treat them as read-only or serialize straight away.
 
         Default chunkers:
 
@@ -410,60 +1007,74 @@ class Scheduler(Essential):
 
         """
 
-        CHUNKERS = [self.chunk_dates, self.chunk_job]
+        CHUNKERS = [self.iter_chunk_dates, self.iter_chunk_job]
 
-        data = [job]
-        skeleton = deepcopy(skeleton) or {}
+        skeleton = skeleton or {}
 
-        for chunker in CHUNKERS:
-            chunked = []  # Container for results of current chunker method.
-            for task in data:
+
+        def apply(chunker, tasks):
+            for task in tasks:
                 logger.debug("Chunking %s with %s", task, chunker)
-                chunked.extend(chunker(job=task))
+                yield from chunker(job=task)
 
-            data = deepcopy(chunked)
+
+        data = iter([job])
+        for chunker in CHUNKERS:
+            data = apply(chunker, data)
 
         # Inject the skeleton to the resulting tasks
         for task in data:
-            task.update(skeleton)
-
-        return data
+            yield {**task, **skeleton}
 
 
     def chunk_job(self, job: dict, skeleton: Dict = None, attr: str = None) -> List[Dict]:
+        """
+        Recursively parses a job, validates everything and chunks to simple tasks what should be chunked.
+        Returns a list of tasks. See ``iter_chunk_job()`` for the lazy version.
+        """
+
+        return list(self.iter_chunk_job(job=job, skeleton=skeleton, attr=attr))
+
+
+    def iter_chunk_job(self, job: dict, skeleton: Dict = None, attr: str = None) -> Iterator[Dict]:
         """
         Recursively parses a job, validates everything and chunks to simple tasks what should be chunked.
         The Scenario of chunking and isolation is worth another story, so you should put a link here once it is ready.
+
+        Tasks are yielded lazily. Neither the `job` nor the `skeleton` are modified or copied: the tasks are new
+        dictionaries of the first level, but share the nested values.
         """
 
-        data = []
-        skeleton = deepcopy(skeleton) or {}
-        job = deepcopy(job)
+        skeleton = skeleton or {}
 
         # The current attribute we are looking for in this iteration or the first one of preconfigured chunkables.
         attr = attr or self.chunkable_attrs[0] if self.chunkable_attrs else None
 
         # We have to return here the full job to let it work correctly with recursive calls.
         if not attr:
-            return [{**job, **skeleton}]
+            yield {**job, **skeleton}
+            return
+
+        plan = self.chunking_plan
+        attr_plural = plan.plural(attr)
 
         # If we shall need batching of flat vals of this attr we find out the batch size.
         # First we search in job (means the current level of recursive subdata being chunked.
         # If not specified per job, we try the setting inherited from level(s) upper probably even the root of main job.
         MAX_BATCH = 1000000  # This is not configurable!
-        batch_size = int(job.get(f'max_{plural(attr)}_per_batch',
-                                 skeleton.get(f'max_{plural(attr)}_per_batch', MAX_BATCH)))
+        batch_size = int(job.get(f'max_{attr_plural}_per_batch',
+                                 skeleton.get(f'max_{attr_plural}_per_batch', MAX_BATCH)))
 
 
-        def push_list_chunks():
-            """ Appends chunks of lists using current skeleton and vals to chunk. """
+        def list_chunks(task_skeleton, vals):
+            """ Yields chunks of lists using given skeleton and vals to chunk. """
             for v in chunks(vals, batch_size):
-                data.append({**task_skeleton, **{plural(attr): v}})
+                yield {**task_skeleton, attr_plural: v}
 
 
         logger.debug(f"Testing for chunking %s from %s with skeleton %s", attr, job, skeleton)
         # First of all decide whether we need to chunk current job (or a sub-job if called recursively).
-        if self.needs_chunking(plural(attr), {**job, **skeleton}):
+        if self.needs_chunking(attr_plural, {**job, **skeleton}):
 
             # Force batches to isolate if we shall be dealing with flat data.
             # But we still respect the `max_PARAM_per_batch` if it is provided in job.
@@ -471,11 +1082,11 @@ class Scheduler(Essential):
             batch_size = 1 if batch_size == MAX_BATCH else batch_size
 
             # Next attribute is either name of attribute according to config, or None if we are already in last level.
-            next_attr = self.get_next_chunkable_attr(attr)
+            next_attr = plan.next_attr(attr)
             logger.debug("Next attr: %s", next_attr)
 
             # Here and many places further we support both single and plural versions of attribute names.
-            for possible_attr in single_or_plural(attr):
+            for possible_attr in plan.variants(attr):
                 logger.debug("Iterating possible: %s", possible_attr)
                 current_vals = get_list_of_multiple_or_one_or_empty_from_dict(job, possible_attr)
                 if not current_vals:
@@ -487,7 +1098,7 @@ class Scheduler(Essential):
                 logger.debug("For %s we got current_vals: %s from %s, leaving job_skeleton: %s", possible_attr,
                              current_vals, job, job_skeleton)
 
-                task_skeleton = {**deepcopy(skeleton), **job_skeleton}
+                task_skeleton = {**skeleton, **job_skeleton}
 
                 # For dictionaries we have to either go deeper recursively, or just flatten keys if values are None-s.
                 if all(isinstance(v, dict) for v in current_vals):
@@ -495,8 +1106,7 @@ class Scheduler(Essential):
 
                         if all(x is None for x in val.values()):
                             logger.debug("Value %s is all a dict of Nones. Need to flatten", val)
-                            vals = self.validate_list_of_vals(val)
-                            push_list_chunks()
+                            yield from list_chunks(task_skeleton, self.validate_list_of_vals(val))
 
                         else:
                             logger.debug("Real dictionary with values. Can't flatten it to dict: %s", val)
@@ -504,59 +1114,58 @@ class Scheduler(Essential):
                                 logger.debug("SubIterating `%s` with %s", name, subdata)
 
                                 # Merge parts of task
-                                task = {**deepcopy(task_skeleton), **{plural(attr): [name]}}
+                                task = {**task_skeleton, **{attr_plural: [name]}}
                                 logger.debug("Task sample:  %s", task)
 
                                 if isinstance(subdata, dict):
                                     if not next_attr:
                                         # If there is no lower level configured to chunk, just keep this subdata in payload
                                         task.update(subdata)
-                                        data.append(task)
+                                        yield task
                                     else:
                                         logger.debug("Call recursive for %s from subdata: %s", next_attr, subdata)
-                                        data.extend(self.chunk_job(job=subdata, skeleton=task, attr=next_attr))
+                                        yield from self.iter_chunk_job(job=subdata, skeleton=task, attr=next_attr)
 
                                 # If None-s we just add a task. `Name` (which is actually a value in this scenario)
                                 # was already added when creating task skeleton.
                                 elif subdata is None:
                                     logger.debug("Appending task to data for %s from %s", name, val)
-                                    data.append(task)
+                                    yield task
                                 else:
                                     raise InvalidJob(
                                         f"Unsupported type of val: {subdata} for attribute {possible_attr}")
 
                 # If current vals are not dictionaries, we just validate that they are flat supported values
                 else:
-                    vals = self.validate_list_of_vals(current_vals)
-                    push_list_chunks()
+                    yield from list_chunks(task_skeleton, self.validate_list_of_vals(current_vals))
 
         else:
             logger.debug("No need for chunking for attr: %s in job: %s. Current skeleton is: %s", attr, job, skeleton)
-            task_skeleton = {**deepcopy(skeleton)}
-            for a in single_or_plural(attr):
+            for a in plan.variants(attr):
                 if a in job:
-                    attr_value = job.pop(a, None)
+                    attr_value = job[a]
                     if attr_value:
                         try:
                             vals = self.validate_list_of_vals(attr_value)
-                            push_list_chunks()
-
-                            # We are done here for not-chunkable attr. Return now.
-                            return data
 
                         except InvalidJob:
                             logger.warning("Caught InvalidJob exception.")
                             # If a custom payload is not following the chunking convention - just translate it as is.
-                            # And return the pop-ed value back to the job.
-                            job[a] = attr_value
+
+                        else:
+                            # We are done here for not-chunkable attr.
+                            yield from list_chunks(skeleton, vals)
+                            return
+
                         break
+
+                    # Empty values of the attribute are not translated to the task.
+                    job = {k: v for k, v in job.items() if k != a}
             else:
                 logger.error("Did not find values for %s in job: %s", attr, job)
-            # Populate the remaining parts of the job back to task.
-            task_skeleton.update(job)
-            data.append(task_skeleton)
 
-        return data
+            # Populate the remaining parts of the job back to task.
+            yield {**skeleton, **job}
 
 
     @staticmethod
@@ -578,12 +1187,7 @@ class Scheduler(Essential):
     def get_next_chunkable_attr(self, attr):
         """ Return the next by order after `attr` chunkable attribute. """
 
-        attrs = single_or_plural(attr)
-        for a in attrs:
-            try:
-                return self.chunkable_attrs[self.get_index_from_list(a, self.chunkable_attrs) + 1]
-            except (IndexError, KeyError, TypeError, ValueError):
-                pass
+        return self.chunking_plan.next_attr(attr)
 
 
     @staticmethod
@@ -592,7 +1196,7 @@ class Scheduler(Essential):
         Get a dictionary with settings for isolation from data.
         """
 
-        return {k: v for k, v in data.items() if re.match('isolate_[\w]*|max_[\w]*_per_batch', k)}
+        return {k: v for k, v in data.items() if ChunkingPlan.is_isolate_key(k)}
 
 
     def needs_chunking(self, attr: str, data: Dict) -> bool:
@@ -604,37 +1208,78 @@ class Scheduler(Essential):
         :param data:    Input dictionary to analyse.
         """
 
-        attrs = single_or_plural(attr)
-        isolate_attrs = [f"isolate_{a}" for a in attrs] + [f"max_{a}_per_batch" for a in attrs]
+        plan = self.chunking_plan
 
-        root_isolate_attrs = self.get_isolate_attributes_from_job(data)
-
-        if any(data[x] for x in isolate_attrs if x in data):
+        if any(data[x] for x in plan.isolate_keys(attr) if x in data):
             logger.debug("needs_chunking(): Got requirement to isolate %s in the current scope: %s", attr, data)
             return True
 
-        next_attr = self.get_next_chunkable_attr(attr)
+        next_attr = plan.next_attr(attr)
+        if not next_attr:
+            return False
+
+        attrs = plan.variants(attr)
+        root_isolate_attrs = self.get_isolate_attributes_from_job(data)
 
         logger.debug("needs_chunking(): Found next attr %s, for %s from %s", next_attr, attr, data)
         # We are not yet lowest level going recursive
-        if next_attr:
-            for a in attrs:
-                current_vals = get_list_of_multiple_or_one_or_empty_from_dict(data, a)
-                logger.debug("needs_chunking(): For %s got current_vals: %s from %s. Analysing %s",
-                             a, current_vals, data, next_attr)
+        for a in attrs:
+            current_vals = get_list_of_multiple_or_one_or_empty_from_dict(data, a)
+            logger.debug("needs_chunking(): For %s got current_vals: %s from %s. Analysing %s",
+                         a, current_vals, data, next_attr)
 
-                for val in current_vals:
+            for val in current_vals:
 
-                    for name, subdata in val.items():
-                        logger.debug("needs_chunking(): Going recursive for %s in %s", next_attr, subdata)
-                        if isinstance(subdata, dict) and self.needs_chunking(next_attr,
-                                                                             {**subdata, **root_isolate_attrs}):
-                            logger.debug("needs_chunking(): Returning True for %s from %s", next_attr, subdata)
-                            return True
+                for name, subdata in val.items():
+                    logger.debug("needs_chunking(): Going recursive for %s in %s", next_attr, subdata)
+                    if isinstance(subdata, dict) and self.needs_chunking(next_attr,
+                                                                         {**subdata, **root_isolate_attrs}):
+                        logger.debug("needs_chunking(): Returning True for %s from %s", next_attr, subdata)
+                        return True
 
         return False
 
 
+    def extract_jobs_from_event(self, event: Union[str, List, Dict],
+                                failed: Optional[List[str]] = None) -> Optional[List[Tuple[str, Union[str, Dict]]]]:
+        """
+        Extract the batch of jobs from the `event`. Supported batches:
+
+        - A list of jobs.
+        - A dictionary with the list of jobs in `jobs`.
+        - An SQS event. Every message could also be wrapped in SNS. The `messageId` of the record identifies the job.
+
+        :param failed:  The `messageId` of SQS records that can not be parsed are appended to this list.
+        :return:        List of tuples: (identifier, job) or None if the `event` is a single job.
+        """
+
+        if isinstance(event, str):
+            event = json.loads(event)
+
+        if isinstance(event, list):
+            return [(str(i), job) for i, job in enumerate(event)]
+
+        if 'jobs' in event:
+            return [(str(i), job) for i, job in enumerate(event['jobs'])]
+
+        if is_event_from_sqs(event):
+            result = []
+            for record in event['Records']:
+                try:
+                    messages = unwrap_event_recursively(json.loads(record['body']))
+                except Exception:
+                    logger.exception("Failed to parse the body of SQS message %s: %s",
+                                     record.get('messageId'), record.get('body'))
+                    if failed is not None:
+                        failed.append(record['messageId'])
+                    continue
+
+                result.extend((record['messageId'], message) for message in messages)
+            return result
+
+        return None
+
+
     def extract_job_from_payload(self, event: Dict):
         """ Parse and basically validate job from the event. """
 
@@ -646,6 +1291,10 @@ class Scheduler(Essential):
         jh = load(event)
         job = load(jh['job']) if 'job' in jh else jh
 
+        # Continuations of the queue files (siblings) do not belong to a single Labourer.
+        if 'file_name' in job and 'lambda_name' not in job:
+            return job
+
         assert 'lambda_name' in job, f"Job is missing required parameter 'lambda_name': {job}"
         job['lambda_name'] = trim_arn_to_name(job['lambda_name'])
 
@@ -657,9 +1306,17 @@ class Scheduler(Essential):
         Process a file for creating tasks, then uploading it to S3.
         In case of execution time reached its limit, spawning a new sibling to continue the processing.
 
+        If some Labourers of the next batch are paused by the backpressure (see ``is_labourer_paused()``), their rows
+        are deferred (see ``defer_rows()``) and the rows of other Labourers are processed. If all the rows of
+        the batch are paused (or too many rows are already deferred), the batch is not consumed and the processing
+        waits for the queues to drain. If they do not drain in ``config['backpressure_max_wait_seconds']``
+        (or in time), the sibling continues from the same row.
+        After ``config['backpressure_max_continuations']`` such siblings in a row no more are spawned and the file
+        is left unlocked in S3 with its offset. Call the Scheduler with its `file_name` to resume it later.
         """
 
         _ = self.get_db_field_name
+
         file_name = self.get_and_lock_queue_file()
 
         if not file_name:
@@ -668,57 +1325,267 @@ class Scheduler(Essential):
 
         else:
             logger.info("Processing a file: %s", file_name)
+            self._backpressure_waited = 0
+            waiting_for, out_of_time = set(), False
+
             while self.sufficient_execution_time_left:
                 logger.debug(f"Execution time left: {global_vars.lambda_context.get_remaining_time_in_millis()}ms "
-                             f"Working next batch of {self._rows_to_process} tasks from file {file_name}")
-                data = self.pop_rows_from_file(file_name, rows=self._rows_to_process)
+                             f"Working next batch of {self._rows_to_process} tasks from file {file_name} "
+                             f"at offset {self._queue_file_offset}")
+                data, next_offset = self.read_rows_from_file(file_name, offset=self._queue_file_offset,
+                                                             rows=self._rows_to_process)
                 if not data:
                     logger.info("No rows in file: %s", file_name)
                     break
 
-                for raw_task in data:
-                    logger.debug("Pushing task to DynamoDB: %s", raw_task)
-                    task = json.loads(raw_task)
-                    labourer = self.task_client.get_labourer(task[_('labourer_id')])
-                    new_task = self.task_client.create_task(labourer=labourer, **task)
-                    self.meta_handler.post(task_id=new_task[_('task_id')], action='created',
-                                           labourer=task[_('labourer_id')])
-                    time.sleep(self._sleeptime_for_dynamo)
+                rows = [json.loads(raw_task) for raw_task in data]
+
+                paused = self.get_paused_labourers(rows)
+                deferred = [raw for raw, row in zip(data, rows) if row[_('labourer_id')] in paused]
+
+                if paused and (len(deferred) == len(data) or len(self._deferred_rows) + len(deferred)
+                               > self.config['backpressure_max_deferred_rows']):
+                    waiting_for = paused
+                    if self._backpressure_waited >= self.config['backpressure_max_wait_seconds']:
+                        logger.info("Queues of %s did not drain in %s seconds.", paused, self._backpressure_waited)
+                        break
+
+                    self.wait_for_queue_drain(paused)
+
+                    # Keep claiming the file while waiting.
+                    if time.time() - self._last_checkpoint_time >= self.config['checkpoint_every_seconds']:
+                        self.checkpoint_queue_file()
+                    continue
+
+                waiting_for = set()
+                if paused:
+                    self.defer_rows(deferred)
+                    rows = [row for row in rows if row[_('labourer_id')] not in paused]
+
+                self.create_tasks_from_rows(rows)
+                self._queue_file_offset = next_offset
+
+                self._rows_since_checkpoint += len(data)
+                if self._rows_since_checkpoint >= self.config['checkpoint_every_rows'] \
+                        or time.time() - self._last_checkpoint_time >= self.config['checkpoint_every_seconds']:
+                    self.checkpoint_queue_file()
 
             else:
-                # Spawning another sibling to continue the processing
-                logger.info("Ran out of execution time in `process_file`. Spawning sibling.")
-                payload = dict(file_name=file_name)
-                try:
-                    self.siblings_client.spawn_sibling(global_vars.lambda_context, payload=payload)
-                    self.stats['siblings_spawned'] += 1
-                except Exception:
-                    logger.exception("Could not spawn sibling with context: %s, payload: %s",
-                                     global_vars.lambda_context, payload)
+                logger.info("Ran out of execution time in `process_file`.")
+                out_of_time = True
+
+            if self._deferred_rows:
+                self.hand_over_deferred_rows()
+
+            if waiting_for or out_of_time:
+                self.spawn_queue_file_continuation(backpressure=bool(waiting_for))
 
             self.upload_and_unlock_queue_file()
             self.clean_tmp()
 
 
+    def defer_rows(self, rows: List[str]):
+        """
+        Put aside the raw `rows` of the paused Labourers. They are saved to the `locked_` deferred queue file in S3
+        before every checkpoint of the current queue file, so a resumed processor never loses them. In the end of
+        processing the deferred file is handed over to a sibling (see ``hand_over_deferred_rows()``).
+        """
+
+        self._deferred_rows.extend(rows)
+        self.stats['deferred_rows'] += len(rows)
+
+
+    def save_deferred_rows(self, key: str):
+        """ Write all the deferred rows to the local deferred queue file and upload it to S3 with the `key`. """
+
+        with self.open_queue_file_for_writing(self.local_deferred_file) as f:
+            for row in self._deferred_rows:
+                f.write(row if row.endswith('\n') else f"{row}\n")
+
+        self.s3_client.upload_file(Filename=self.local_deferred_file, Bucket=self._queue_bucket, Key=key)
+        self.clean_tmp(self.local_deferred_file)
+
+
+    def load_deferred_rows(self):
+        """ Download the rows deferred by the previous processor of the current queue file if there are any. """
+
+        try:
+            self.s3_client.download_file(Bucket=self._queue_bucket, Key=self.remote_deferred_locked_file,
+                                         Filename=self.local_deferred_file)
+        except self.s3_client.exceptions.ClientError:
+            return
+
+        offset = 0
+        while True:
+            data, offset = self.read_rows_from_file(self.local_deferred_file, offset=offset,
+                                                    rows=self._rows_to_process)
+            if not data:
+                break
+            self._deferred_rows.extend(data)
+
+        self.clean_tmp(self.local_deferred_file)
+        logger.info("Loaded %s deferred rows of %s", len(self._deferred_rows), self._queue_file_name)
+
+
+    def hand_over_deferred_rows(self):
+        """
+        Upload the deferred rows as a new unlocked queue file and spawn a sibling to process it once the queues
+        of the paused Labourers drain. The sibling is a backpressure continuation of the current one.
+        """
+
+        self.save_deferred_rows(self.remote_deferred_file)
+        logger.info("Handing over %s deferred rows in %s", len(self._deferred_rows), self.remote_deferred_file)
+
+        try:
+            self.s3_client.delete_object(Bucket=self._queue_bucket, Key=self.remote_deferred_locked_file)
+        except self.s3_client.exceptions.ClientError:
+            logger.debug("No locked deferred file to remove: %s", self.remote_deferred_locked_file)
+
+        self._deferred_rows = []
+        self.spawn_queue_file_continuation(backpressure=True, file_name=self.deferred_queue_file_name)
+
+
+    def spawn_queue_file_continuation(self, backpressure: bool = False, file_name: Optional[str] = None):
+        """
+        Spawn a sibling to continue the processing of the queue file.
+
+        :param bool backpressure:   The file is handed over because of the paused Labourers. The number of such
+                                    siblings in a row is limited by ``config['backpressure_max_continuations']``.
+        :param str file_name:       Name of the queue file. Default is the current one.
+        """
+
+        file_name = file_name or self._queue_file_name
+
+        continuations = self._backpressure_continuations + 1 if backpressure else 0
+        if continuations > self.config['backpressure_max_continuations']:
+            if not self.redrive_queue_file(file_name):
+                logger.error("Labourers are paused for %s siblings in a row. Leaving %s unlocked in S3. "
+                             "Call the Scheduler with this `file_name` to resume it.",
+                             self._backpressure_continuations, file_name)
+                self.stats['backpressure_stalled_files'] += 1
+            return
+
+        logger.info("Spawning sibling to continue the processing of %s.", file_name)
+        payload = dict(file_name=file_name, queue_shards=self._queue_shards_count)
+        if continuations:
+            payload['backpressure_continuations'] = continuations
+
+        try:
+            self.siblings_client.spawn_sibling(global_vars.lambda_context, payload=payload)
+            self.stats['siblings_spawned'] += 1
+        except Exception:
+            logger.exception("Could not spawn sibling with context: %s, payload: %s",
+                             global_vars.lambda_context, payload)
+
+
+    def redrive_queue_file(self, file_name: str) -> bool:
+        """
+        Send the continuation of the queue file to ``config['backpressure_redrive_queue_url']`` with the delay
+        of ``config['backpressure_redrive_delay_seconds']``. The Scheduler processes it later as a sibling with
+        a new chain of backpressure continuations.
+
+        :return:    True if the continuation is sent.
+        """
+
+        queue_url = self.config['backpressure_redrive_queue_url']
+        if not queue_url:
+            return False
+
+        payload = dict(file_name=file_name, queue_shards=self._queue_shards_count)
+        delay = min(self.config['backpressure_redrive_delay_seconds'], 900)
+
+        try:
+            self.sqs_client.send_message(QueueUrl=queue_url, MessageBody=json.dumps(payload), DelaySeconds=delay)
+        except Exception:
+            logger.exception("Failed to re-drive %s with the queue %s", file_name, queue_url)
+            return False
+
+        logger.warning("Labourers are still paused. Re-driving %s in %s seconds.", file_name, delay)
+        self.stats['backpressure_redrives'] += 1
+        return True
+
+
     @property
-    def _sleeptime_for_dynamo(self) -> float:
+    def write_limiter(self) -> Optional[TokenBucket]:
         """
-        Pull DynamoDB write capacity dynamically and configure speed of writing.
+        TokenBucket of Write Capacity Units to pace writing the tasks to DynamoDB.
 
-        Calculates based on the assumption that a single write action consumes a full WCU.
-        It also assumes that the duration of processing the task itself takes some time and decreases sleep accordingly.
-        This duration is theoretically configurable in ``config['task_operational_overhead_for_ddb']``, but after
-        several versions this should probably be removed from config.
+        The writes are metered by the actual ``ConsumedCapacity`` reported by DynamoDB and the rate backs off
+        adaptively on throttling, so the table can be driven close to its full capacity. The rate is the
+        ``config['write_capacity_utilization']`` share of the write capacity of the table, divided between
+        the consumers of queue shards. The bucket lives as long as the container to preserve the adaptation.
 
-        For on-demand billing of the DynamoDB table returns zero.
+        For on-demand billing of the DynamoDB table returns None (no limit).
         """
+
+        capacity = self.task_client.dynamo_db_client.get_capacity()
+        if not capacity or not capacity.get('write'):
+            return None
+
+        rate = capacity['write'] * self.config['write_capacity_utilization'] / self._queue_shards_count
+
+        if self._write_limiter is None:
+            self._write_limiter = TokenBucket(rate=rate)
+        elif self._write_limiter.rate != rate:
+            self._write_limiter.set_rate(rate)
+
+        return self._write_limiter
+
+
+    def get_stats(self, recursive: bool = True):
+        """
+        The counters of the write limiter are included. The limiter lives as long as the container, so its counters
+        are reset together with the stats of the Scheduler and report only the current invocation.
+        """
+
+        if recursive and self._write_limiter:
+            self.stats.update(self._write_limiter.stats)
+
+        return super().get_stats(recursive=recursive)
+
+
+    def reset_stats(self, recursive: bool = True):
+        super().reset_stats(recursive=recursive)
+
+        if recursive and self._write_limiter:
+            self._write_limiter.reset_stats()
+
+
+    @staticmethod
+    def read_rows_from_file(file_name: str, offset: int = 0, rows: Optional[int] = 1) -> Tuple[List[str], int]:
+        """
+        Reads the rows from file starting at the byte `offset`. The file itself is not modified, so draining
+        the whole file costs a single pass over it no matter how small the batches are.
+
+        Compressed (framed) files are read by whole frames, so there could be more rows than requested.
+
+        :param str file_name:   File to read.
+        :param int offset:      Byte offset in the file to start reading from. Default: 0
+        :param int rows:        Number of rows to read. Default: 1
+        :return:                List of strings read from file and the byte offset of the next unread row.
+        """
+
+        result = []
+        compression = get_compression(file_name)
+
         try:
-            write_throughput = 1 / self.task_client.dynamo_db_client.get_capacity()['write']
-        except ZeroDivisionError:
-            return 0
+            with open(file_name, 'rb') as f:
+                f.seek(offset)
+                if compression:
+                    result = read_frames(f, compression=compression, rows=rows)
+                else:
+                    for _ in range(rows):
+                        line = f.readline()
+                        if not line:
+                            break
+                        result.append(line.decode())
+
+                offset = f.tell()
 
-        operational_overhead = self.config['task_operational_overhead_for_ddb']
-        return max(write_throughput - operational_overhead, 0)
+        except FileNotFoundError:
+            pass
+
+        return result, offset
 
 
     @staticmethod
@@ -726,6 +1593,9 @@ class Scheduler(Essential):
         """
         Reads the rows from the top of file. Along the way removes them from original file.
 
+        ..  warning:: Rewrites the remaining file on every call. For draining large files use ``read_rows_from_file``
+                      with an offset cursor like ``process_file`` does.
+
         :param str file_name:    File to read.
         :param int rows:        Number of rows to read. Default: 1
         :return:                List of strings read from file top.
@@ -785,44 +1655,194 @@ class Scheduler(Essential):
         Either take a new (recently created) file in local /tmp/, or download the version of queue file from S3.
         We move the file in S3 to `locked_` by prefix state or simply upload the new one there in `locked_` state.
 
+        If there is no unlocked remote file, but the `locked_` one was not checkpointed for
+        ``config['stale_lock_seconds']``, the processor that locked it is considered dead and the file is resumed
+        from the last checkpoint.
+
         :return: Local path to the file.
         """
 
-        if not os.path.isfile(self.local_queue_file):
-            try:
-                self.s3_client.download_file(Bucket=self._queue_bucket, Key=self.remote_queue_file,
-                                             Filename=self.local_queue_file)
-            except self.s3_client.exceptions.ClientError:
-                self.stats['non_existing_remote_queue'] += 1
-                logger.exception("Not found remote file to download")
+        # The file was already resumed from the `locked_` state.
+        if self._queue_file_locked:
+            return self.local_queue_file
 
-            else:
-                self.s3_client.copy_object(Bucket=self._queue_bucket,
-                                           CopySource=f"{self._queue_bucket}/{self.remote_queue_file}",
-                                           Key=self.remote_queue_locked_file)
+        if not os.path.isfile(self.local_queue_file):
+            if self.download_queue_file(self.remote_queue_file):
+                self.copy_queue_file(self.remote_queue_file, self.remote_queue_locked_file)
 
                 self.s3_client.delete_object(Bucket=self._queue_bucket, Key=self.remote_queue_file)
+                self._queue_file_locked = True
 
                 logger.debug("Downloaded a copy of %s for processing and moved the remote one to %s.",
                              self.local_queue_file, self.remote_queue_locked_file)
 
+            elif not self.resume_locked_queue_file(stale_after=self.config['stale_lock_seconds']):
+                self.stats['non_existing_remote_queue'] += 1
+                logger.warning("Not found remote file to download: %s", self.remote_queue_file)
+
         # If the local file exists (means we have probably just created it). Then we upload it in `locked_` state.
         else:
             self.s3_client.upload_file(Filename=self.local_queue_file, Bucket=self._queue_bucket,
                                        Key=self.remote_queue_locked_file)
+            self._queue_file_locked = True
 
         return self.local_queue_file
 
 
+    def download_queue_file(self, key: str, stale_after: Optional[int] = None) -> bool:
+        """
+        Download the remote queue file to the local one. Only the rows after the ``offset`` from the metadata
+        of the remote file are downloaded. The rows processed before are never fetched again.
+
+        :param str key:             S3 Key of the queue file.
+        :param int stale_after:     If specified, download the file only if it was not checkpointed (or modified)
+                                    for this number of seconds.
+        :return:                    True if the file was downloaded.
+        """
+
+        try:
+            head = self.s3_client.head_object(Bucket=self._queue_bucket, Key=key)
+        except self.s3_client.exceptions.ClientError:
+            logger.debug("Remote queue file %s does not exist.", key)
+            return False
+
+        metadata = head.get('Metadata', {})
+
+        if stale_after is not None:
+            checkpoint_at = metadata.get('checkpoint_at')
+            checkpoint_at = float(checkpoint_at) if checkpoint_at else head['LastModified'].timestamp()
+            if time.time() - checkpoint_at < stale_after:
+                logger.info("Remote queue file %s was checkpointed less than %s seconds ago. Not touching it.",
+                            key, stale_after)
+                return False
+
+        offset = int(metadata.get('offset', 0))
+
+        if not offset:
+            self.s3_client.download_file(Bucket=self._queue_bucket, Key=key, Filename=self.local_queue_file)
+
+        else:
+            with open(self.local_queue_file, 'wb') as f:
+                # Requesting the range after the end of file is an error in S3.
+                if offset < head['ContentLength']:
+                    response = self.s3_client.get_object(Bucket=self._queue_bucket, Key=key, Range=f"bytes={offset}-")
+                    for chunk in response['Body'].iter_chunks():
+                        f.write(chunk)
+
+        self._queue_file_base_offset = offset
+        self._queue_file_offset = 0
+        logger.info("Downloaded %s starting from offset %s", key, offset)
+
+        return True
+
+
+    def resume_locked_queue_file(self, stale_after: Optional[int] = None) -> bool:
+        """
+        Take over the `locked_` queue file left by a killed (or otherwise failed) processor and continue
+        from its last checkpoint. The checkpoint is immediately refreshed to claim the file.
+
+        :param int stale_after: See ``download_queue_file()``.
+        :return:                True if the file was resumed.
+        """
+
+        if not self.download_queue_file(self.remote_queue_locked_file, stale_after=stale_after):
+            return False
+
+        self._queue_file_locked = True
+        self.stats['resumed_locked_queue_files'] += 1
+        self.load_deferred_rows()
+        self.checkpoint_queue_file(force=True)
+
+        return True
+
+
+    def checkpoint_queue_file(self, force: bool = False):
+        """
+        Save the position of processing in the metadata of the `locked_` queue file in S3. The object is copied onto
+        itself on the server side, so the file is not uploaded again. A resumed processor continues from this
+        position and never duplicates the tasks created before the checkpoint.
+
+        S3 copies the objects larger than ``S3_COPY_OBJECT_MAX_SIZE`` (5 GB) only in multiple parts, which takes
+        much longer. Such files are checkpointed not more often than ``config['large_queue_file_checkpoint_seconds']``
+        and the tasks created since the last checkpoint may be created again by a resumed processor. Use more
+        ``queue_shards`` to keep the queue files smaller.
+
+        :param bool force:  Checkpoint even the large file right now. Used to claim the resumed file.
+        """
+
+        now = time.time()
+
+        if not force and self.is_large_queue_file \
+                and now - self._last_checkpoint_time < self.config['large_queue_file_checkpoint_seconds']:
+            self._rows_since_checkpoint = 0
+            return
+
+        # The offset could be already after the deferred rows, so they must be saved first.
+        if self._deferred_rows:
+            self.save_deferred_rows(self.remote_deferred_locked_file)
+
+        self.copy_queue_file(self.remote_queue_locked_file, self.remote_queue_locked_file,
+                             metadata={'offset': str(self.queue_file_remote_offset), 'checkpoint_at': str(now)})
+
+        self._rows_since_checkpoint = 0
+        self._last_checkpoint_time = now
+        self.stats['queue_file_checkpoints'] += 1
+
+
+    def copy_queue_file(self, source: str, key: str, metadata: Optional[Dict[str, str]] = None):
+        """
+        Copy the remote queue file `source` to `key` on the server side. The `metadata` replaces the one of `source`
+        if provided. The files larger than ``S3_COPY_OBJECT_MAX_SIZE`` are copied in multiple parts.
+        """
+
+        extra_args = {'Metadata': metadata, 'MetadataDirective': 'REPLACE'} if metadata is not None else {}
+
+        if self.is_large_queue_file:
+            self.s3_client.copy(CopySource={'Bucket': self._queue_bucket, 'Key': source},
+                                Bucket=self._queue_bucket, Key=key, ExtraArgs=extra_args)
+            self.stats['multipart_queue_file_copies'] += 1
+        else:
+            self.s3_client.copy_object(Bucket=self._queue_bucket, CopySource=f"{self._queue_bucket}/{source}",
+                                       Key=key, **extra_args)
+
+
+    @property
+    def queue_file_remote_offset(self) -> int:
+        """ Byte offset of the first unprocessed row in the remote queue file. """
+        return self._queue_file_base_offset + self._queue_file_offset
+
+
+    @property
+    def is_large_queue_file(self) -> bool:
+        """
+        The remote queue file is too large for a single ``copy_object`` request of S3.
+        The local file is the tail of the remote one after the base offset.
+        """
+
+        if not os.path.isfile(self.local_queue_file):
+            return False
+
+        return self._queue_file_base_offset + os.path.getsize(self.local_queue_file) > self.S3_COPY_OBJECT_MAX_SIZE
+
+
     def upload_and_unlock_queue_file(self):
         """
         Upload the local queue file to S3 and remove the `locked_` by prefix copy if it exists.
+
+        If some rows of the file were already processed, the file is not uploaded again. The `locked_` copy of the same
+        file is moved back (server side) with the ``offset`` marker in metadata for siblings to resume from.
         """
 
         # If there is data left unprocessed in the file, upload it for future processing by siblings or someone else.
-        if os.path.isfile(self.local_queue_file):
-            self.s3_client.upload_file(Filename=self.local_queue_file, Bucket=self._queue_bucket,
-                                       Key=self.remote_queue_file)
+        if os.path.isfile(self.local_queue_file) \
+                and self._queue_file_offset < os.path.getsize(self.local_queue_file):
+
+            if self.queue_file_remote_offset:
+                self.copy_queue_file(self.remote_queue_locked_file, self.remote_queue_file,
+                                     metadata={'offset': str(self.queue_file_remote_offset)})
+            else:
+                self.s3_client.upload_file(Filename=self.local_queue_file, Bucket=self._queue_bucket,
+                                           Key=self.remote_queue_file)
 
         # Delete the locked file from S3 (aka unlock)
         try:
@@ -830,6 +1850,8 @@ class Scheduler(Essential):
         except self.s3_client.exceptions.ClientError:
             logger.debug("No remote locked file to remove: %s. This is probably new.", self.remote_queue_locked_file)
 
+        self._queue_file_locked = False
+
 
     @property
     def _queue_bucket(self):
@@ -840,13 +1862,23 @@ class Scheduler(Essential):
     def set_queue_file(self, name: str = None):
         """
         Initialize a unique file_name to store the queue of tasks to write.
+        Resets the offset of processed rows in it and the state of checkpoints.
         """
 
+        self._queue_file_offset = 0
+        self._queue_file_base_offset = 0
+        self._queue_file_locked = False
+        self._rows_since_checkpoint = 0
+        self._last_checkpoint_time = time.time()
+        self._deferred_rows = []
+
         if name is None:
             filename_parts = self.config['queue_file'].rsplit('.', 1)
             assert len(filename_parts) == 2, "Got bad file name"
+            compression = self.config['queue_file_compression']
+            extension = COMPRESSION_EXTENSIONS[compression] if compression else ''
             self._queue_file_name = \
-                f"{filename_parts[0]}_{global_vars.lambda_context.aws_request_id}.{filename_parts[1]}"
+                f"{filename_parts[0]}_{global_vars.lambda_context.aws_request_id}.{filename_parts[1]}{extension}"
         else:
             self._queue_file_name = name
 
@@ -862,6 +1894,29 @@ class Scheduler(Essential):
         return f"{self.config['s3_prefix'].strip('/')}/{self._queue_file_name}"
 
 
+    @property
+    def deferred_queue_file_name(self):
+        """ Name of the queue file for the rows of the paused Labourers deferred from the current one. """
+
+        name, ext = self._queue_file_name.split('.', 1)
+        return f"{name}_deferred.{ext}"
+
+
+    @property
+    def local_deferred_file(self):
+        return f"/tmp/{self.deferred_queue_file_name}"
+
+
+    @property
+    def remote_deferred_file(self):
+        return f"{self.config['s3_prefix'].strip('/')}/{self.deferred_queue_file_name}"
+
+
+    @property
+    def remote_deferred_locked_file(self):
+        return f"{self.config['s3_prefix'].strip('/')}/locked_{self.deferred_queue_file_name}"
+
+
     @property
     def remote_queue_locked_file(self):
         """
@@ -339,7 +339,8 @@ class AutotestDdbManager:
         if not tables:
             # By default, we create all main tables, but you can specify explicit ones
             tables = [autotest_dynamo_db_tasks_setup, autotest_dynamo_db_meta_setup,
-                      autotest_dynamo_db_closed_tasks_setup, autotest_dynamo_db_retry_tasks_setup]
+                      autotest_dynamo_db_closed_tasks_setup, autotest_dynamo_db_retry_tasks_setup,
+                      autotest_dynamo_db_labourer_stats_setup, autotest_dynamo_db_labourer_counters_setup]
         self.tables = tables
         asyncio.run(self.create_ddbs(self.tables))
 
@@ -494,3 +495,9 @@ autotest_dynamo_db_retry_tasks_setup = add_gsi(setup=autotest_dynamo_db_retry_ta
                                                index_name='labourer_id_greenfield',
                                                hash_key=('labourer_id', 'S'),
                                                range_key=('desired_launch_time', 'N'))
+
+autotest_dynamo_db_labourer_stats_setup = get_table_setup(hash_key=('labourer_id', 'S'),
+                                                          table_name=get_autotest_ddb_name() + '_sosw_labourer_stats')
+
+autotest_dynamo_db_labourer_counters_setup = get_table_setup(
+        hash_key=('labourer_id', 'S'), table_name=get_autotest_ddb_name() + '_sosw_labourer_counters')
@@ -9,8 +9,13 @@ from .unit.test_worker_assistant import WorkerAssistant_UnitTestCase
 
 # Components
 from ..components.test.unit.test_config import Config_UnitTestCase
+from ..components.test.unit.test_duration_stats import DurationStats_UnitTestCase
 from ..components.test.unit.test_dynamo_db import dynamodb_client_UnitTestCase
+from ..components.test.unit.test_framed_file import FramedFile_UnitTestCase
 from ..components.test.unit.test_helpers import helpers_UnitTestCase
+from ..components.test.unit.test_invocation_controller import InvocationController_UnitTestCase
+from ..components.test.unit.test_rate_limiter import TokenBucket_UnitTestCase
+from ..components.test.unit.test_ttl_cache import TTLCache_UnitTestCase
 from sosw.components.test.unit.test_siblings import siblings_TestCase
 from sosw.components.test.unit.test_sns import sns_TestCase
 from sosw.components.test.unit.test_sigv4 import sigv4_TestCase
@@ -34,8 +39,13 @@ def suite():
 
     # Components
     test_suite.addTest(unittest.makeSuite(Config_UnitTestCase))
+    test_suite.addTest(unittest.makeSuite(DurationStats_UnitTestCase))
     test_suite.addTest(unittest.makeSuite(dynamodb_client_UnitTestCase))
+    test_suite.addTest(unittest.makeSuite(FramedFile_UnitTestCase))
     test_suite.addTest(unittest.makeSuite(helpers_UnitTestCase))
+    test_suite.addTest(unittest.makeSuite(InvocationController_UnitTestCase))
+    test_suite.addTest(unittest.makeSuite(TokenBucket_UnitTestCase))
+    test_suite.addTest(unittest.makeSuite(TTLCache_UnitTestCase))
     test_suite.addTest(unittest.makeSuite(siblings_TestCase))
     test_suite.addTest(unittest.makeSuite(sns_TestCase))
     test_suite.addTest(unittest.makeSuite(sigv4_TestCase))
@@ -86,6 +86,19 @@ class app_UnitTestCase(unittest.TestCase):
         self.assertEqual(str(type(getattr(processor, 'dynamodb_client'))), str(type(boto3.client('dynamodb'))))
 
 
+    @patch("boto3.client")
+    def test_app_init__boto_client_config(self, mock_boto_client):
+        custom_config = {
+            'init_clients':  ['lambda'],
+            'lambda_config': {'max_pool_connections': 50},
+        }
+        Processor(custom_config=custom_config)
+
+        name, = mock_boto_client.call_args[0]
+        self.assertEqual(name, 'lambda')
+        self.assertEqual(mock_boto_client.call_args[1]['config'].max_pool_connections, 50)
+
+
     @patch("boto3.client")
     def test_app_init__with_some_invalid_client(self, mock_boto_client):
         custom_config = {
@@ -63,3 +63,22 @@ class Labourer_UnitTestCase(unittest.TestCase):
         self.labourer.set_custom_attribute('start', time.time())
 
         self.assertLessEqual(self.labourer.start, time.time())
+
+
+    def test_set_lazy_attribute(self):
+        calls = []
+        self.labourer.set_lazy_attribute('max_duration', lambda: calls.append(1) or 300)
+
+        self.assertEqual(calls, [])
+        self.assertEqual(self.labourer.get_attr('max_duration'), 300)
+        self.assertEqual(self.labourer.max_duration, 300)
+        self.assertEqual(len(calls), 1)
+
+        self.assertRaises(ValueError, self.labourer.set_lazy_attribute, 'invalid', lambda: 1)
+
+
+    def test_set_lazy_attribute__custom_overrides(self):
+        self.labourer.set_lazy_attribute('max_duration', lambda: 300)
+        self.labourer.set_custom_attribute('max_duration', 60)
+
+        self.assertEqual(self.labourer.get_attr('max_duration'), 60)
@@ -1,5 +1,7 @@
 import boto3
 import os
+import threading
+import time
 import unittest
 import uuid
 
@@ -7,6 +9,7 @@ from copy import deepcopy
 from unittest import mock
 from unittest.mock import MagicMock, patch
 
+from sosw.components.invocation_controller import AIMDInvocationController
 from sosw.orchestrator import Orchestrator
 from sosw.labourer import Labourer
 from sosw.managers.meta_handler import MetaHandler
@@ -147,6 +150,74 @@ class Orchestrator_UnitTestCase(unittest.TestCase):
         self.orchestrator.meta_handler.post.assert_called_once()
 
 
+    def test_invoke_for_labourer__records_invocations(self):
+        some_labourer = self.orchestrator.task_client.register_labourers()[0]
+
+        self.orchestrator.get_desired_invocation_number_for_labourer = MagicMock(return_value=3)
+        self.orchestrator.task_client.get_next_for_labourer = MagicMock(return_value=[self.SAMPLE_TASK] * 3)
+        self.orchestrator.task_client.invoke_tasks = MagicMock(
+                return_value={'a': 'invoked', 'b': 'skipped', 'c': 'invoked'})
+        self.orchestrator.invocation_controller = MagicMock()
+
+        self.orchestrator.invoke_for_labourer(some_labourer)
+
+        self.orchestrator.invocation_controller.record_invocations.assert_called_once_with(some_labourer, 2)
+
+
+    def test_invoke_for_labourer__adds_running_tasks(self):
+        self.orchestrator.task_client = MagicMock()
+        self.orchestrator.get_desired_invocation_number_for_labourer = MagicMock(return_value=2)
+        self.orchestrator.task_client.invoke_tasks.return_value = {'a': 'invoked', 'b': 'invoked'}
+
+        self.orchestrator.invoke_for_labourer(self.LABOURER)
+
+        self.orchestrator.task_client.ecology_client.add_running_tasks_for_labourer.assert_called_once_with(
+                self.LABOURER, count=2)
+
+
+    def test_publish_ecology_snapshot(self):
+        self.orchestrator.task_client = MagicMock()
+        ecology = self.orchestrator.task_client.ecology_client
+        ecology.config = {'ecology_snapshot_mode': None}
+        self.orchestrator.process_labourers = MagicMock()
+
+        self.orchestrator({})
+        ecology.publish_snapshot.assert_not_called()
+
+        ecology.config['ecology_snapshot_mode'] = 'producer'
+        self.orchestrator({})
+        ecology.publish_snapshot.assert_called_once_with(self.orchestrator.task_client.register_labourers.return_value)
+
+        # Failures do not affect the Orchestrator.
+        ecology.publish_snapshot.side_effect = Exception("Boom")
+        self.orchestrator({})
+        self.assertEqual(self.orchestrator.stats['failed_ecology_snapshots'], 1)
+
+
+    def test_invocation_controller__configurable(self):
+        self.custom_config['invocation_controller'] = 'AIMDInvocationController'
+        self.custom_config['invocation_controller_config'] = {'drain_seconds': 30}
+
+        with patch('boto3.client'):
+            orchestrator = Orchestrator(custom_config=self.custom_config)
+
+        self.assertIsInstance(orchestrator.invocation_controller, AIMDInvocationController)
+        self.assertEqual(orchestrator.invocation_controller.config['drain_seconds'], 30)
+
+
+    def test_get_desired_invocation_number_for_labourer__aimd(self):
+        some_labourer = self.orchestrator.task_client.register_labourers()[0]
+
+        self.orchestrator.invocation_controller = AIMDInvocationController()
+        self.orchestrator.task_client = MagicMock()
+        self.orchestrator.task_client.ecology_client.get_labourer_status.return_value = 4
+        self.orchestrator.task_client.ecology_client.count_running_tasks_for_labourer.return_value = 0
+        self.orchestrator.task_client.get_length_of_queue_for_labourer.return_value = 3
+
+        self.assertEqual(self.orchestrator.get_desired_invocation_number_for_labourer(some_labourer), 3)
+        self.orchestrator.task_client.get_length_of_queue_for_labourer.assert_called_once_with(some_labourer)
+
+
     def test_invoke_for_labourer__desired_zero(self):
         self.orchestrator.get_desired_invocation_number_for_labourer = MagicMock(return_value=0)
         self.orchestrator.task_client.get_next_for_labourer = MagicMock()
@@ -157,3 +228,176 @@ class Orchestrator_UnitTestCase(unittest.TestCase):
         self.orchestrator.task_client.get_next_for_labourer.assert_not_called()
         self.orchestrator.task_client.invoke_task.assert_not_called()
         self.orchestrator.meta_handler.post.assert_not_called()
+
+
+    def test_invoke_for_labourer__over_time_budget(self):
+        self.orchestrator.get_desired_invocation_number_for_labourer = MagicMock(return_value=1)
+        self.orchestrator.task_client.get_next_for_labourer = MagicMock(return_value=[self.SAMPLE_TASK])
+        self.orchestrator.task_client.invoke_tasks = MagicMock()
+
+        self.orchestrator.invoke_for_labourer(self.LABOURER, deadline=0)
+
+        self.orchestrator.task_client.invoke_tasks.assert_not_called()
+        self.assertEqual(self.orchestrator.stats['labourers_over_time_budget'], 1)
+
+
+    def test_process_labourers__isolates_errors(self):
+        labourers = [Labourer(id=f"lab_{i}") for i in range(4)]
+
+        def invoke_for_labourer(labourer, deadline, stop_event):
+            if labourer.id == 'lab_2':
+                raise RuntimeError("Boom")
+
+        self.orchestrator.invoke_for_labourer = MagicMock(side_effect=invoke_for_labourer)
+
+        self.orchestrator.process_labourers(labourers)
+
+        self.assertEqual(self.orchestrator.invoke_for_labourer.call_count, 4)
+        self.assertEqual(self.orchestrator.stats['processed_labourers'], 3)
+        self.assertEqual(self.orchestrator.stats['failed_labourers'], 1)
+        for labourer in labourers:
+            self.assertIn(f"orchestration_seconds_{labourer.id}", self.orchestrator.stats)
+
+
+    def test_process_labourers__time_budget(self):
+        labourers = [Labourer(id=f"lab_{i}") for i in range(10)]
+        self.orchestrator.invoke_for_labourer = MagicMock()
+
+        with patch.object(self.orchestrator, 'get_time_budget', return_value=40), \
+                patch.object(self.orchestrator, 'process_labourer') as process_labourer:
+            self.orchestrator.process_labourers(labourers)
+
+        # 5 threads, so every Labourer gets a half of the budget.
+        self.assertEqual(process_labourer.call_count, 10)
+        for call in process_labourer.call_args_list:
+            self.assertEqual(call[0][1], 20)
+
+
+    def test_process_labourers__timed_out(self):
+        release = threading.Event()
+        self.orchestrator.invoke_for_labourer = MagicMock(side_effect=lambda labourer, **kwargs: release.wait(5))
+
+        with patch.object(self.orchestrator, 'get_time_budget', return_value=0.1):
+            self.orchestrator.process_labourers([self.LABOURER])
+
+        release.set()
+        self.assertEqual(self.orchestrator.stats['timed_out_labourers'], 1)
+
+
+    def test_process_labourers__no_invocations_after_time_budget(self):
+        release = threading.Event()
+        self.orchestrator.task_client = MagicMock()
+        self.orchestrator.get_desired_invocation_number_for_labourer = MagicMock(return_value=1)
+
+        # The query of tasks is slower than the whole time budget of the Orchestrator.
+        self.orchestrator.task_client.get_next_for_labourer.side_effect = \
+            lambda **kwargs: release.wait(5) and [self.SAMPLE_TASK]
+
+        with patch.object(self.orchestrator, 'get_time_budget', return_value=0.1):
+            self.orchestrator.process_labourers([self.LABOURER])
+
+        self.assertEqual(self.orchestrator.stats['timed_out_labourers'], 1)
+
+        # Let the abandoned thread continue and wait for it to finish.
+        release.set()
+        for _ in range(50):
+            if f"orchestration_seconds_{self.LABOURER.id}" in self.orchestrator.stats:
+                break
+            time.sleep(0.1)
+
+        self.orchestrator.task_client.invoke_tasks.assert_not_called()
+        self.assertEqual(self.orchestrator.stats['labourers_over_time_budget'], 1)
+
+
+    def test_call__single_cycle_by_default(self):
+        self.orchestrator.task_client = MagicMock()
+        self.orchestrator.process_labourers = MagicMock()
+
+        self.orchestrator({})
+
+        self.orchestrator.process_labourers.assert_called_once()
+        self.orchestrator.task_client.refresh_labourers.assert_not_called()
+        self.assertEqual(self.orchestrator.stats['dispatch_cycles'], 0)
+
+
+    def test_call__dispatch_loop(self):
+        self.orchestrator.config['dispatch_loop_interval'] = 0.05
+        self.orchestrator.config['dispatch_loop_min_cycle_seconds'] = 0.01
+        self.orchestrator.task_client = MagicMock()
+        self.orchestrator.task_client.register_labourers.return_value = [self.LABOURER]
+        self.orchestrator.task_client.refresh_labourers.return_value = [self.LABOURER]
+        self.orchestrator.process_labourers = MagicMock()
+
+        with patch.object(self.orchestrator, 'get_time_budget', return_value=0.3):
+            self.orchestrator({})
+
+        cycles = self.orchestrator.stats['dispatch_cycles']
+        self.assertGreater(cycles, 2)
+        self.assertLessEqual(cycles, 6)
+        self.assertEqual(self.orchestrator.process_labourers.call_count, cycles)
+
+        # Labourers are registered once and refreshed before every next cycle.
+        self.orchestrator.task_client.register_labourers.assert_called_once()
+        self.assertEqual(self.orchestrator.task_client.refresh_labourers.call_count, cycles - 1)
+
+        # Every cycle gets the rest of the time budget.
+        budgets = [x[1]['budget'] for x in self.orchestrator.process_labourers.call_args_list]
+        self.assertEqual(budgets, sorted(budgets, reverse=True))
+        self.assertLessEqual(budgets[0], 0.3)
+
+
+    def test_call__dispatch_loop__refreshes_health(self):
+        self.orchestrator.config['dispatch_loop_interval'] = 0.03
+        self.orchestrator.config['dispatch_loop_min_cycle_seconds'] = 0.01
+
+        task_client = self.orchestrator.task_client
+        task_client.dynamo_db_client = MagicMock()
+        task_client.config['labourer_attributes_ttl']['health'] = 0
+        task_client.config['labourers']['some_function']['health_metrics'] = {
+            'cpu': {
+                'details':                     {'Name': 'CPUUtilization', 'Namespace': 'AWS/RDS'},
+                'feelings':                    {3: 50, 4: 25},
+                'feeling_comparison_operator': '__le__',
+            },
+        }
+
+        # The downstream gets overloaded after the first cycle.
+        values = [10]
+        ecology = task_client.ecology_client
+        ecology.fetch_metric_stats = MagicMock(side_effect=lambda metric: values.pop(0) if values else 90)
+
+        health = []
+
+        def process_labourers(labourers, budget):
+            labourer = next(x for x in labourers if x.id == 'some_function')
+            health.append((ecology.get_labourer_status(labourer=labourer), labourer.get_attr('health')))
+
+        self.orchestrator.process_labourers = MagicMock(side_effect=process_labourers)
+
+        with patch.object(self.orchestrator, 'get_time_budget', return_value=0.1):
+            self.orchestrator({})
+
+        self.assertGreater(len(health), 1)
+        self.assertEqual(health[0], (4, 4))
+        self.assertEqual(health[-1], (0, 0))
+
+
+    def test_call__dispatch_loop__slow_cycle(self):
+        self.orchestrator.config['dispatch_loop_interval'] = 0.01
+        self.orchestrator.config['dispatch_loop_min_cycle_seconds'] = 0.15
+        self.orchestrator.task_client = MagicMock()
+        self.orchestrator.process_labourers = MagicMock(side_effect=lambda labourers, budget: time.sleep(0.1))
+
+        with patch.object(self.orchestrator, 'get_time_budget', return_value=0.3):
+            self.orchestrator({})
+
+        # The second cycle would not have enough time left for the third one.
+        self.assertEqual(self.orchestrator.stats['dispatch_cycles'], 2)
+
+
+    def test_get_time_budget(self):
+        self.assertEqual(self.orchestrator.get_time_budget(), self.orchestrator.config['default_time_budget'])
+
+        with patch('sosw.orchestrator.global_vars') as global_vars:
+            global_vars.lambda_context.get_remaining_time_in_millis.return_value = 60000
+            self.assertEqual(self.orchestrator.get_time_budget(), 60 - self.orchestrator.config['shutdown_period'])
@@ -66,6 +66,7 @@ class Scavenger_UnitTestCase(unittest.TestCase):
         self.assertEqual(self.scavenger.handle_expired_tasks.call_count, 3)
         self.assertEqual(self.scavenger.archive_tasks.call_count, 3)
         self.assertEqual(self.scavenger.retry_tasks.call_count, 3)
+        self.assertEqual(self.scavenger.task_client.reconcile_labourer_counters.call_count, 3)
 
 
     def test_handle_expired_tasks_for_labourer(self):
@@ -118,6 +119,40 @@ class Scavenger_UnitTestCase(unittest.TestCase):
         self.scavenger.task_client.archive_task.assert_not_called()
 
 
+    def test_archive_tasks__records_missing_durations(self):
+        recorded = {**self.task, 'completed_at': 1000}
+        not_recorded = {**self.task, 'task_id': '124', 'completed_at': 1000}
+        recorded['duration_recorded'] = 1
+
+        self.scavenger.task_client.get_completed_tasks_for_labourer.return_value = [recorded, not_recorded]
+        self.scavenger.task_client.get_task_duration.return_value = 42
+
+        self.scavenger.archive_tasks(self.labourer)
+
+        self.scavenger.task_client.get_task_duration.assert_called_once_with(not_recorded)
+        self.scavenger.task_client.record_labourer_duration.assert_called_once_with('lambda3', 42)
+        self.scavenger.task_client.archive_task.assert_has_calls([call('123'), call('124')])
+
+
+    def test_archive_tasks__duration_stats_disabled(self):
+        self.scavenger.task_client.config = {'labourer_duration_stats': False}
+        self.scavenger.task_client.get_completed_tasks_for_labourer.return_value = [{**self.task, 'completed_at': 1}]
+
+        self.scavenger.archive_tasks(self.labourer)
+
+        self.scavenger.task_client.record_labourer_duration.assert_not_called()
+        self.scavenger.task_client.archive_task.assert_called_once_with('123')
+
+
+    def test_archive_tasks__record_duration_fails(self):
+        self.scavenger.task_client.get_completed_tasks_for_labourer.return_value = [{**self.task, 'completed_at': 1}]
+        self.scavenger.task_client.record_labourer_duration.side_effect = Exception("Boom")
+
+        self.scavenger.archive_tasks(self.labourer)
+
+        self.scavenger.task_client.archive_task.assert_called_once_with('123')
+
+
     def test_calculate_delay_for_task_retry(self):
         _ = self.scavenger.get_db_field_name
         labourer = Labourer(id='some_lambda', arn='some_arn', max_duration=45)
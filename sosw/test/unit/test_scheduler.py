@@ -1,5 +1,6 @@
 import boto3
 import datetime
+import inspect
 import json
 import logging
 import os
@@ -10,17 +11,19 @@ import time
 import unittest
 import types
 
+from botocore.exceptions import ClientError
 from copy import deepcopy
 from pathlib import Path
 import pprint
 from unittest import mock
 from unittest.mock import MagicMock, PropertyMock, patch
 
-from sosw.scheduler import Scheduler, InvalidJob, global_vars
+from sosw.scheduler import Scheduler, ChunkingPlan, InvalidJob, global_vars
 from sosw.labourer import Labourer
 from sosw.components.helpers import chunks
 from sosw.managers.meta_handler import MetaHandler
-from sosw.test.variables import TEST_SCHEDULER_CONFIG
+from sosw.managers.task import TaskManager
+from sosw.test.variables import TEST_SCHEDULER_CONFIG, TEST_TASK_CLIENT_CONFIG
 from sosw.test.helpers_test import line_count
 
 import sosw.scheduler as module
@@ -92,9 +95,14 @@ class Scheduler_UnitTestCase(unittest.TestCase):
             self.scheduler = module.Scheduler(custom_config=self.custom_config)
 
         self.scheduler.s3_client = MagicMock()
+        self.scheduler.s3_client.exceptions.ClientError = ClientError
+        # By default there are no files in the remote queue.
+        self.scheduler.s3_client.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
         self.scheduler.sns_client = MagicMock()
         self.scheduler.task_client = MagicMock()
         self.scheduler.task_client.get_labourer.return_value = self.LABOURER
+        # On-demand table by default.
+        self.scheduler.task_client.dynamo_db_client.get_capacity.return_value = None
         self.scheduler.get_db_field_name = lambda key: key
         self.scheduler.siblings_client = MagicMock()
         self.scheduler.meta_handler = MagicMock(signature=MetaHandler)
@@ -147,6 +155,30 @@ class Scheduler_UnitTestCase(unittest.TestCase):
         self.assertIsNone(self.scheduler.get_next_chunkable_attr('bad_name'))
 
 
+    def test_chunking_plan(self):
+        plan = self.scheduler.chunking_plan
+
+        self.assertEqual(plan.attrs, ['section', 'store', 'product'])
+        self.assertEqual(plan.next_attr('sections'), 'store')
+        self.assertEqual(plan.plural('store'), 'stores')
+        self.assertCountEqual(plan.variants('stores'), ['store', 'stores', 'storess'])
+        self.assertIn('isolate_stores', plan.isolate_keys('store'))
+        self.assertIn('max_stores_per_batch', plan.isolate_keys('stores'))
+
+        self.assertTrue(ChunkingPlan.is_isolate_key('isolate_sections'))
+        self.assertTrue(ChunkingPlan.is_isolate_key('max_stores_per_batch'))
+        self.assertFalse(ChunkingPlan.is_isolate_key('max_stores'))
+        self.assertFalse(ChunkingPlan.is_isolate_key('not_isolate_sections'))
+
+
+    def test_chunkable_attrs__recompiles_plan(self):
+        self.scheduler.chunkable_attrs = ['a', 'b']
+
+        self.assertEqual(self.scheduler.chunking_plan.attrs, ['a', 'b'])
+        self.assertEqual(self.scheduler.get_next_chunkable_attr('a'), 'b')
+        self.assertIsNone(self.scheduler.get_next_chunkable_attr('section'))
+
+
     def test__queue_bucket(self):
         self.assertEqual(self.scheduler._queue_bucket, self.scheduler.config['queue_bucket'])
 
@@ -207,24 +239,257 @@ class Scheduler_UnitTestCase(unittest.TestCase):
         self.assertFalse(os.path.isfile(self.FNAME))
 
 
+    def test_read_rows_from_file(self):
+        self.put_local_file(self.FNAME)
+
+        r, offset = self.scheduler.read_rows_from_file(self.FNAME, rows=3)
+        self.assertEqual(len(r), 3)
+        self.assertTrue(r[0].startswith('Hello Aglaya 0'))
+
+        # The file is not modified.
+        self.assertEqual(self.line_count(self.FNAME), 10)
+
+        # Continue from the offset
+        r, offset = self.scheduler.read_rows_from_file(self.FNAME, offset=offset, rows=5)
+        self.assertEqual(len(r), 5)
+        self.assertTrue(r[0].startswith('Hello Aglaya 3'))
+
+        # Return only remaining and the offset of the end of file.
+        r, offset = self.scheduler.read_rows_from_file(self.FNAME, offset=offset, rows=42)
+        self.assertEqual(len(r), 2)
+        self.assertEqual(offset, os.path.getsize(self.FNAME))
+
+        r, new_offset = self.scheduler.read_rows_from_file(self.FNAME, offset=offset, rows=42)
+        self.assertEqual(r, [])
+        self.assertEqual(new_offset, offset)
+
+
+    def test_read_rows_from_file__missing_file(self):
+        self.assertEqual(self.scheduler.read_rows_from_file(self.FNAME, offset=42), ([], 42))
+
+
+    def test_get_and_lock_queue_file__sets_offset_from_remote(self):
+        self.scheduler.s3_client.head_object.side_effect = None
+        self.scheduler.s3_client.head_object.return_value = {'Metadata': {'offset': '420'}, 'ContentLength': 1000}
+        self.scheduler.s3_client.get_object.return_value = {'Body': MagicMock(iter_chunks=lambda: [b'row\n'])}
+
+        self.scheduler.get_and_lock_queue_file()
+
+        # Only the unprocessed part of the file is downloaded.
+        self.scheduler.s3_client.download_file.assert_not_called()
+        _, call_kwargs = self.scheduler.s3_client.get_object.call_args
+        self.assertEqual(call_kwargs['Range'], 'bytes=420-')
+        self.assertEqual(self.scheduler._queue_file_offset, 0)
+        self.assertEqual(self.scheduler.queue_file_remote_offset, 420)
+        self.assertEqual(line_count(self.scheduler.local_queue_file), 1)
+
+
+    def test_get_and_lock_queue_file__resumes_stale_locked(self):
+        not_found = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        stale_head = {'Metadata':     {'offset': '42', 'checkpoint_at': str(time.time() - 1000)},
+                      'ContentLength': 42}
+        self.scheduler.s3_client.head_object.side_effect = [not_found, stale_head]
+
+        self.scheduler.get_and_lock_queue_file()
+
+        self.assertEqual(self.scheduler.stats['resumed_locked_queue_files'], 1)
+        self.assertEqual(self.scheduler.queue_file_remote_offset, 42)
+        self.assertTrue(os.path.isfile(self.scheduler.local_queue_file))
+
+        # The checkpoint is refreshed to claim the file.
+        _, call_kwargs = self.scheduler.s3_client.copy_object.call_args
+        self.assertEqual(call_kwargs['Key'], self.scheduler.remote_queue_locked_file)
+        self.assertEqual(call_kwargs['Metadata']['offset'], '42')
+
+
+    def test_get_and_lock_queue_file__not_touches_live_locked(self):
+        not_found = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        live_head = {'Metadata': {'offset': '42', 'checkpoint_at': str(time.time() - 10)}, 'ContentLength': 100}
+        self.scheduler.s3_client.head_object.side_effect = [not_found, live_head]
+
+        self.scheduler.get_and_lock_queue_file()
+
+        self.assertEqual(self.scheduler.stats['non_existing_remote_queue'], 1)
+        self.scheduler.s3_client.get_object.assert_not_called()
+        self.scheduler.s3_client.copy_object.assert_not_called()
+        self.assertFalse(os.path.isfile(self.scheduler.local_queue_file))
+
+
+    def test_checkpoint_queue_file(self):
+        self.scheduler._queue_file_base_offset = 100
+        self.scheduler._queue_file_offset = 42
+        self.scheduler._rows_since_checkpoint = 10
+
+        self.scheduler.checkpoint_queue_file()
+
+        _, call_kwargs = self.scheduler.s3_client.copy_object.call_args
+        self.assertEqual(call_kwargs['Key'], self.scheduler.remote_queue_locked_file)
+        self.assertEqual(call_kwargs['CopySource'], f"{self.scheduler._queue_bucket}/"
+                                                    f"{self.scheduler.remote_queue_locked_file}")
+        self.assertEqual(call_kwargs['Metadata']['offset'], '142')
+        self.assertEqual(call_kwargs['MetadataDirective'], 'REPLACE')
+        self.assertEqual(self.scheduler._rows_since_checkpoint, 0)
+
+
+    def test_checkpoint_queue_file__large_file(self):
+        self.put_local_file()
+        self.scheduler.S3_COPY_OBJECT_MAX_SIZE = 10
+        self.scheduler._queue_file_offset = 42
+        self.scheduler._rows_since_checkpoint = 10
+
+        # The large file was checkpointed recently.
+        self.scheduler.checkpoint_queue_file()
+
+        self.scheduler.s3_client.copy.assert_not_called()
+        self.assertEqual(self.scheduler._rows_since_checkpoint, 0)
+
+        # The checkpoint is made with a multipart copy.
+        self.scheduler.checkpoint_queue_file(force=True)
+
+        self.scheduler.s3_client.copy_object.assert_not_called()
+        _, call_kwargs = self.scheduler.s3_client.copy.call_args
+        self.assertEqual(call_kwargs['CopySource'], {'Bucket': self.scheduler._queue_bucket,
+                                                     'Key':    self.scheduler.remote_queue_locked_file})
+        self.assertEqual(call_kwargs['Key'], self.scheduler.remote_queue_locked_file)
+        self.assertEqual(call_kwargs['ExtraArgs']['Metadata']['offset'], '42')
+        self.assertEqual(call_kwargs['ExtraArgs']['MetadataDirective'], 'REPLACE')
+        self.assertEqual(self.scheduler.stats['multipart_queue_file_copies'], 1)
+
+
+    def test_checkpoint_queue_file__saves_deferred_rows(self):
+        self.scheduler._deferred_rows = ['{"labourer_id": "some_function"}\n']
+        uploaded = []
+        self.scheduler.s3_client.upload_file.side_effect = \
+            lambda Filename, Bucket, Key: uploaded.append((Key, Path(Filename).read_text()))
+
+        self.scheduler.checkpoint_queue_file()
+
+        # The deferred rows are saved before the offset is moved after them.
+        self.assertEqual(uploaded, [(self.scheduler.remote_deferred_locked_file, '{"labourer_id": "some_function"}\n')])
+        self.assertEqual(self.scheduler.s3_client.method_calls[0][0], 'upload_file')
+        self.scheduler.s3_client.copy_object.assert_called_once()
+        self.assertFalse(os.path.isfile(self.scheduler.local_deferred_file))
+
+
+    def test_resume_locked_queue_file__loads_deferred_rows(self):
+        self.scheduler.s3_client.head_object.side_effect = None
+        self.scheduler.s3_client.head_object.return_value = {'Metadata': {'offset': '0'}, 'ContentLength': 100}
+
+        def download_file(Bucket, Key, Filename):
+            if Key == self.scheduler.remote_deferred_locked_file:
+                Path(Filename).write_text('{"a": 1}\n{"a": 2}\n')
+
+        self.scheduler.s3_client.download_file.side_effect = download_file
+
+        self.assertTrue(self.scheduler.resume_locked_queue_file())
+        self.assertEqual(self.scheduler._deferred_rows, ['{"a": 1}\n', '{"a": 2}\n'])
+
+
+    def test_call__resumes_own_locked_file(self):
+        self.scheduler.config['in_memory_tasks_threshold'] = 0
+        self.scheduler.s3_client.head_object.side_effect = None
+        self.scheduler.s3_client.head_object.return_value = {'Metadata': {'offset': '0'}, 'ContentLength': 100}
+        self.scheduler.parse_job_to_file = MagicMock()
+        self.scheduler.process_file = MagicMock()
+
+        self.scheduler({'job': {'lambda_name': 'test_lambda'}})
+
+        self.scheduler.parse_job_to_file.assert_not_called()
+        self.scheduler.s3_client.download_file.assert_any_call(Bucket=self.scheduler._queue_bucket,
+                                                               Key=self.scheduler.remote_queue_locked_file,
+                                                               Filename=self.scheduler.local_queue_file)
+        self.assertTrue(self.scheduler._queue_file_locked)
+
+
+    def test_call__in_memory_does_not_look_for_locked_file(self):
+        self.scheduler.task_client.create_tasks.return_value = [{'task_id': '1'}]
+
+        with patch('sosw.scheduler.Scheduler.write_limiter', new_callable=PropertyMock) as mock_limiter:
+            mock_limiter.return_value = None
+            self.scheduler({'job': {'lambda_name': self.LABOURER.id}})
+
+        self.scheduler.s3_client.head_object.assert_not_called()
+        self.scheduler.task_client.create_tasks.assert_called_once()
+
+
+    def test_call__batch_of_jobs__does_not_look_for_locked_file(self):
+        self.scheduler.config['in_memory_tasks_threshold'] = 0
+        JOB = {'lambda_name': self.LABOURER.id}
+        SQS_EVENT = {'Records': [
+            {'messageId': 'm1', 'eventSource': 'aws:sqs', 'body': json.dumps(JOB),
+             'attributes': {'ApproximateReceiveCount': '2'}},
+        ]}
+        self.scheduler.process_file = MagicMock()
+
+        self.scheduler(SQS_EVENT)
+
+        # The redelivered batch has a new queue file. The locked file of the previous attempt is never found.
+        self.scheduler.s3_client.head_object.assert_not_called()
+        self.assertEqual(line_count(self.scheduler.local_queue_file), 1)
+        self.scheduler.process_file.assert_called_once()
+
+
+    def test_upload_and_unlock_queue_file__partially_processed(self):
+        self.put_local_file()
+        self.scheduler._queue_file_offset = 42
+
+        self.scheduler.upload_and_unlock_queue_file()
+
+        self.scheduler.s3_client.upload_file.assert_not_called()
+        self.scheduler.s3_client.copy_object.assert_called_once()
+        _, call_kwargs = self.scheduler.s3_client.copy_object.call_args
+        self.assertEqual(call_kwargs['Key'], self.scheduler.remote_queue_file)
+        self.assertEqual(call_kwargs['Metadata'], {'offset': '42'})
+        self.scheduler.s3_client.delete_object.assert_called_once()
+
+
+    def test_upload_and_unlock_queue_file__large_file(self):
+        self.put_local_file()
+        self.scheduler.S3_COPY_OBJECT_MAX_SIZE = 10
+        self.scheduler._queue_file_offset = 42
+
+        self.scheduler.upload_and_unlock_queue_file()
+
+        self.scheduler.s3_client.copy_object.assert_not_called()
+        _, call_kwargs = self.scheduler.s3_client.copy.call_args
+        self.assertEqual(call_kwargs['Key'], self.scheduler.remote_queue_file)
+        self.assertEqual(call_kwargs['ExtraArgs'], {'Metadata': {'offset': '42'}, 'MetadataDirective': 'REPLACE'})
+        self.scheduler.s3_client.delete_object.assert_called_once()
+
+
+    def test_upload_and_unlock_queue_file__fully_processed(self):
+        self.put_local_file()
+        self.scheduler._queue_file_offset = os.path.getsize(self.scheduler.local_queue_file)
+
+        self.scheduler.upload_and_unlock_queue_file()
+
+        self.scheduler.s3_client.upload_file.assert_not_called()
+        self.scheduler.s3_client.copy_object.assert_not_called()
+        self.scheduler.s3_client.delete_object.assert_called_once()
+
+
     def test_process_file(self):
         self.put_local_file(self.FNAME, json=True)
         self.scheduler.get_and_lock_queue_file = MagicMock(return_value=self.FNAME)
         self.scheduler.upload_and_unlock_queue_file = MagicMock()
         self.scheduler.task_client = MagicMock()
+        self.scheduler.task_client.get_labourer.return_value = self.LABOURER
         self.scheduler.clean_tmp = MagicMock()
 
         # This is a specific test patch for logging of remaining time.
         # We actually want two rounds: first OK, second - low time. But the context.method is called twice each round.
         self.custom_lambda_context.get_remaining_time_in_millis.side_effect = [300000, 300000, 1000, 1000]
 
-        with patch('sosw.scheduler.Scheduler._sleeptime_for_dynamo', new_callable=PropertyMock) as mock_sleeptime:
-            mock_sleeptime.return_value = 0.0001
+        with patch('sosw.scheduler.Scheduler.write_limiter', new_callable=PropertyMock) as mock_limiter:
+            mock_limiter.return_value = None
 
             self.scheduler.process_file()
 
-            self.assertEqual(self.scheduler.task_client.create_task.call_count, 10)
-            self.assertEqual(mock_sleeptime.call_count, 10)
+            # All the rows are read in one batch and created in bulk.
+            self.scheduler.task_client.create_tasks.assert_called_once()
+            _, call_kwargs = self.scheduler.task_client.create_tasks.call_args
+            self.assertEqual(len(call_kwargs['rows']), 10)
+            self.assertEqual(mock_limiter.call_count, 1)
 
             self.scheduler.upload_and_unlock_queue_file.assert_called_once()
             self.scheduler.clean_tmp.assert_called_once()
@@ -232,17 +497,319 @@ class Scheduler_UnitTestCase(unittest.TestCase):
             self.assertEqual(self.scheduler.siblings_client.spawn_sibling.call_count, 1)
 
 
+    def test_process_file__checkpoints(self):
+        self.put_local_file(self.FNAME, json=True)
+        self.scheduler.get_and_lock_queue_file = MagicMock(return_value=self.FNAME)
+        self.scheduler.upload_and_unlock_queue_file = MagicMock()
+        self.scheduler.clean_tmp = MagicMock()
+        self.scheduler.checkpoint_queue_file = MagicMock()
+        self.scheduler.config['rows_to_process'] = 3
+        self.scheduler.config['checkpoint_every_rows'] = 6
+
+        with patch('sosw.scheduler.Scheduler.write_limiter', new_callable=PropertyMock) as mock_limiter:
+            mock_limiter.return_value = None
+            self.scheduler.checkpoint_queue_file.side_effect = \
+                lambda: setattr(self.scheduler, '_rows_since_checkpoint', 0)
+
+            self.scheduler.process_file()
+
+        # 10 rows in batches of 3: checkpoint after 6 rows, then remaining 4 rows are less than 6.
+        self.assertEqual(self.scheduler.checkpoint_queue_file.call_count, 1)
+        self.assertEqual(self.scheduler._rows_since_checkpoint, 4)
+
+
+    def test_process_file__groups_rows_by_labourer(self):
+        with open(self.FNAME, 'w') as f:
+            for labourer_id in ['some_function', 'other_function', 'some_function']:
+                f.write(f"{json.dumps({'labourer_id': labourer_id, 'key': 'val'})}\n")
+
+        self.scheduler.get_and_lock_queue_file = MagicMock(return_value=self.FNAME)
+        self.scheduler.upload_and_unlock_queue_file = MagicMock()
+        self.scheduler.clean_tmp = MagicMock()
+        self.scheduler.task_client.create_tasks.side_effect = \
+            lambda labourer, rows, rate_limiter: [{'task_id': 1}] * len(rows)
+
+        with patch('sosw.scheduler.Scheduler.write_limiter', new_callable=PropertyMock) as mock_limiter:
+            mock_limiter.return_value = None
+
+            self.scheduler.process_file()
+
+        self.assertEqual(self.scheduler.task_client.create_tasks.call_count, 2)
+        rows_per_call = [len(c[1]['rows']) for c in self.scheduler.task_client.create_tasks.call_args_list]
+        self.assertEqual(rows_per_call, [2, 1])
+        self.assertEqual(self.scheduler.meta_handler.post.call_count, 3)
+
+
+    def test_process_file__backpressure(self):
+        self.put_local_file(self.FNAME, json=True)
+        self.scheduler.get_and_lock_queue_file = MagicMock(return_value=self.FNAME)
+        self.scheduler.upload_and_unlock_queue_file = MagicMock()
+        self.scheduler.clean_tmp = MagicMock()
+        self.scheduler.config['queue_high_watermark'] = 1000
+        self.scheduler.config['queue_low_watermark'] = 500
+
+        # Above the high mark, then still above the low one, then drained.
+        self.scheduler.task_client.get_length_of_queue_for_labourer.side_effect = [1200, 700, 400]
+
+        with patch('sosw.scheduler.Scheduler.write_limiter', new_callable=PropertyMock) as mock_limiter, \
+                patch('time.sleep') as mock_sleep:
+            mock_limiter.return_value = None
+
+            self.scheduler.process_file()
+
+        self.assertEqual(mock_sleep.call_count, 2)
+        self.assertEqual(self.scheduler.stats['labourers_paused'], 1)
+        self.scheduler.task_client.create_tasks.assert_called_once()
+        self.assertEqual(len(self.scheduler.task_client.create_tasks.call_args[1]['rows']), 10)
+        self.assertEqual(self.scheduler.siblings_client.spawn_sibling.call_count, 0)
+
+
+    def test_process_file__backpressure_continues_in_sibling(self):
+        self.put_local_file(self.FNAME, json=True)
+        self.scheduler.get_and_lock_queue_file = MagicMock(return_value=self.FNAME)
+        self.scheduler.upload_and_unlock_queue_file = MagicMock()
+        self.scheduler.clean_tmp = MagicMock()
+        self.scheduler.config['queue_high_watermark'] = 1000
+        self.scheduler.task_client.get_length_of_queue_for_labourer.return_value = 5000
+        self.custom_lambda_context.get_remaining_time_in_millis.side_effect = [300000, 300000, 300000, 1000]
+
+        with patch('time.sleep'):
+            self.scheduler.process_file()
+
+        # Nothing is consumed, the sibling continues from the same row.
+        self.scheduler.task_client.create_tasks.assert_not_called()
+        self.assertEqual(self.scheduler._queue_file_offset, 0)
+        self.scheduler.siblings_client.spawn_sibling.assert_called_once()
+        self.assertEqual(self.scheduler.siblings_client.spawn_sibling.call_args[1]['payload'],
+                         {'file_name': self.scheduler._queue_file_name, 'queue_shards': 1,
+                          'backpressure_continuations': 1})
+        self.scheduler.upload_and_unlock_queue_file.assert_called_once()
+
+
+    def test_process_file__backpressure_max_wait(self):
+        self.put_local_file(self.FNAME, json=True)
+        self.scheduler.get_and_lock_queue_file = MagicMock(return_value=self.FNAME)
+        self.scheduler.upload_and_unlock_queue_file = MagicMock()
+        self.scheduler.clean_tmp = MagicMock()
+        self.scheduler.config['queue_high_watermark'] = 1000
+        self.scheduler.config['backpressure_wait_seconds'] = 30
+        self.scheduler.config['backpressure_max_wait_seconds'] = 100
+        self.scheduler.task_client.get_length_of_queue_for_labourer.return_value = 5000
+
+        with patch('time.sleep') as mock_sleep:
+            self.scheduler.process_file()
+
+        # Plenty of execution time left, but the total wait is capped.
+        self.assertEqual([x[0][0] for x in mock_sleep.call_args_list], [30, 30, 30, 10])
+        self.scheduler.task_client.create_tasks.assert_not_called()
+        self.assertEqual(self.scheduler.siblings_client.spawn_sibling.call_args[1]['payload']
+                         ['backpressure_continuations'], 1)
+        self.scheduler.upload_and_unlock_queue_file.assert_called_once()
+
+
+    def test_process_file__backpressure_max_continuations(self):
+        self.put_local_file(self.FNAME, json=True)
+        self.scheduler.get_and_lock_queue_file = MagicMock(return_value=self.FNAME)
+        self.scheduler.upload_and_unlock_queue_file = MagicMock()
+        self.scheduler.clean_tmp = MagicMock()
+        self.scheduler.config['queue_high_watermark'] = 1000
+        self.scheduler.task_client.get_length_of_queue_for_labourer.return_value = 5000
+        self.scheduler._backpressure_continuations = self.scheduler.config['backpressure_max_continuations']
+
+        with patch('time.sleep'):
+            self.scheduler.process_file()
+
+        # The chain of siblings is over. The file is left unlocked in S3 with its offset.
+        self.scheduler.siblings_client.spawn_sibling.assert_not_called()
+        self.assertEqual(self.scheduler.stats['backpressure_stalled_files'], 1)
+        self.scheduler.upload_and_unlock_queue_file.assert_called_once()
+
+
+    def test_spawn_queue_file_continuation__stalled(self):
+        self.scheduler._backpressure_continuations = self.scheduler.config['backpressure_max_continuations']
+
+        with self.assertLogs(level='ERROR') as logs:
+            self.scheduler.spawn_queue_file_continuation(backpressure=True)
+
+        self.assertIn(self.scheduler._queue_file_name, logs.output[0])
+        self.assertEqual(self.scheduler.stats['backpressure_stalled_files'], 1)
+        self.scheduler.siblings_client.spawn_sibling.assert_not_called()
+
+
+    def test_spawn_queue_file_continuation__redrive_with_delay(self):
+        self.scheduler.config['backpressure_redrive_queue_url'] = 'https://sqs.us-west-2.amazonaws.com/0/scheduler'
+        self.scheduler.sqs_client = MagicMock()
+        self.scheduler._backpressure_continuations = self.scheduler.config['backpressure_max_continuations']
+
+        self.scheduler.spawn_queue_file_continuation(backpressure=True)
+
+        self.scheduler.sqs_client.send_message.assert_called_once_with(
+                QueueUrl='https://sqs.us-west-2.amazonaws.com/0/scheduler', DelaySeconds=900,
+                MessageBody=json.dumps({'file_name': self.scheduler._queue_file_name, 'queue_shards': 1}))
+        self.assertEqual(self.scheduler.stats['backpressure_redrives'], 1)
+        self.assertEqual(self.scheduler.stats['backpressure_stalled_files'], 0)
+        self.scheduler.siblings_client.spawn_sibling.assert_not_called()
+
+        # If SQS fails, the file is reported as stalled.
+        self.scheduler.sqs_client.send_message.side_effect = Exception("Boom")
+        self.scheduler.spawn_queue_file_continuation(backpressure=True)
+        self.assertEqual(self.scheduler.stats['backpressure_stalled_files'], 1)
+
+
+    def test_call__redriven_queue_file(self):
+        SQS_EVENT = {'Records': [
+            {'messageId': 'm1', 'eventSource': 'aws:sqs',
+             'body': json.dumps({'file_name': 'tasks_queue_x.txt', 'queue_shards': 1})},
+        ]}
+        self.scheduler.process_file = MagicMock()
+
+        self.assertIsNone(self.scheduler(SQS_EVENT))
+
+        self.assertEqual(self.scheduler.local_queue_file, '/tmp/tasks_queue_x.txt')
+        self.assertEqual(self.scheduler._backpressure_continuations, 0)
+        self.scheduler.process_file.assert_called_once()
+
+
+    def test_process_file__out_of_time_resets_continuations(self):
+        self.put_local_file(self.FNAME, json=True)
+        self.scheduler.get_and_lock_queue_file = MagicMock(return_value=self.FNAME)
+        self.scheduler.upload_and_unlock_queue_file = MagicMock()
+        self.scheduler.clean_tmp = MagicMock()
+        self.scheduler._backpressure_continuations = 3
+        self.custom_lambda_context.get_remaining_time_in_millis.return_value = 1000
+
+        self.scheduler.process_file()
+
+        self.assertEqual(self.scheduler.siblings_client.spawn_sibling.call_args[1]['payload'],
+                         {'file_name': self.scheduler._queue_file_name, 'queue_shards': 1})
+
+
+    def test_process_file__backpressure__mixed_file(self):
+        with open(self.FNAME, 'w') as f:
+            for i in range(6):
+                f.write(f"{json.dumps({'labourer_id': ['some_function', 'other_function'][i % 2], 'i': i})}\n")
+
+        self.scheduler.get_and_lock_queue_file = MagicMock(return_value=self.FNAME)
+        self.scheduler.upload_and_unlock_queue_file = MagicMock()
+        self.scheduler.config['rows_to_process'] = 2
+        self.scheduler.config['queue_high_watermark'] = 1000
+        self.scheduler.task_client.get_labourer.side_effect = lambda labourer_id: Labourer(id=labourer_id)
+        self.scheduler.task_client.get_length_of_queue_for_labourer.side_effect = \
+            lambda labourer: 5000 if labourer.id == 'some_function' else 0
+        self.scheduler.task_client.create_tasks.side_effect = \
+            lambda labourer, rows, rate_limiter: [{'task_id': str(row['i'])} for row in rows]
+
+        uploaded = {}
+        self.scheduler.s3_client.upload_file.side_effect = \
+            lambda Filename, Bucket, Key: uploaded.update({Key: Path(Filename).read_text()})
+
+        with patch('sosw.scheduler.Scheduler.write_limiter', new_callable=PropertyMock) as mock_limiter, \
+                patch('time.sleep') as mock_sleep:
+            mock_limiter.return_value = None
+            self.scheduler.process_file()
+
+        # The other Labourer does not wait for the paused one.
+        mock_sleep.assert_not_called()
+        created = [row['i'] for c in self.scheduler.task_client.create_tasks.call_args_list for row in c[1]['rows']]
+        self.assertEqual(created, [1, 3, 5])
+        self.assertEqual(self.scheduler.stats['deferred_rows'], 3)
+
+        # The rows of the paused Labourer are handed over to a sibling in a separate queue file.
+        deferred = [json.loads(x)['i'] for x in uploaded[self.scheduler.remote_deferred_file].splitlines()]
+        self.assertEqual(deferred, [0, 2, 4])
+        self.scheduler.siblings_client.spawn_sibling.assert_called_once()
+        self.assertEqual(self.scheduler.siblings_client.spawn_sibling.call_args[1]['payload'],
+                         {'file_name': self.scheduler.deferred_queue_file_name, 'queue_shards': 1,
+                          'backpressure_continuations': 1})
+        self.assertEqual(self.scheduler._deferred_rows, [])
+
+
+    def test_process_file__backpressure__max_deferred_rows(self):
+        with open(self.FNAME, 'w') as f:
+            for i in range(4):
+                f.write(f"{json.dumps({'labourer_id': ['some_function', 'other_function'][i % 2], 'i': i})}\n")
+
+        self.scheduler.get_and_lock_queue_file = MagicMock(return_value=self.FNAME)
+        self.scheduler.upload_and_unlock_queue_file = MagicMock()
+        self.scheduler.clean_tmp = MagicMock()
+        self.scheduler.config['queue_high_watermark'] = 1000
+        self.scheduler.config['backpressure_max_deferred_rows'] = 1
+        self.scheduler.task_client.get_labourer.side_effect = lambda labourer_id: Labourer(id=labourer_id)
+        self.scheduler.task_client.get_length_of_queue_for_labourer.side_effect = \
+            lambda labourer: 5000 if labourer.id == 'some_function' else 0
+
+        with patch('time.sleep'):
+            self.scheduler.process_file()
+
+        # Too many rows to defer. The whole batch waits as before.
+        self.scheduler.task_client.create_tasks.assert_not_called()
+        self.assertEqual(self.scheduler._queue_file_offset, 0)
+        self.assertEqual(self.scheduler.siblings_client.spawn_sibling.call_args[1]['payload']['file_name'],
+                         self.scheduler._queue_file_name)
+
+
+    def test_is_labourer_paused(self):
+        self.assertFalse(self.scheduler.is_labourer_paused(self.LABOURER.id))
+        self.scheduler.task_client.get_length_of_queue_for_labourer.assert_not_called()
+
+        self.scheduler.config['queue_high_watermark'] = 1000
+        self.scheduler.config['queue_low_watermark'] = 500
+        depth = self.scheduler.task_client.get_length_of_queue_for_labourer
+
+        for value, expected in [(900, False), (1000, True), (700, True), (500, False), (700, False)]:
+            depth.return_value = value
+            self.assertEqual(self.scheduler.is_labourer_paused(self.LABOURER.id, refresh=True), expected,
+                             f"Failed for depth {value}")
+
+        # The depth is cached and the created tasks are added to it.
+        self.scheduler.task_client.create_tasks.return_value = [{'task_id': str(i)} for i in range(300)]
+        self.scheduler.create_tasks_from_rows([{'labourer_id': self.LABOURER.id}])
+        self.assertTrue(self.scheduler.is_labourer_paused(self.LABOURER.id))
+        self.assertEqual(depth.call_count, 5)
+
+
+    def test_get_queue_watermarks(self):
+        self.assertEqual(self.scheduler.get_queue_watermarks(self.LABOURER.id), (None, None))
+
+        self.scheduler.config['queue_high_watermark'] = 1000
+        self.assertEqual(self.scheduler.get_queue_watermarks(self.LABOURER.id), (1000, 1000))
+
+        # The marks of the Labourer from the shared config of TaskManager.
+        task_config = deepcopy(TEST_TASK_CLIENT_CONFIG)
+        task_config['labourers'][self.LABOURER.id].update(queue_high_watermark=10, queue_low_watermark=5)
+        with patch('boto3.client'):
+            task_client = TaskManager(custom_config=task_config)
+        task_client.ecology_client = MagicMock()
+        task_client.register_labourers()
+
+        self.scheduler.task_client.get_labourer.side_effect = task_client.get_labourer
+        self.assertEqual(self.scheduler.get_queue_watermarks(self.LABOURER.id), (10, 5))
+
+
     ### Tests of construct_job_data ###
     def test_construct_job_data(self):
 
-        self.scheduler.chunk_dates = MagicMock(return_value=[{'a': 'foo'}, {'b': 'bar'}])
-        self.scheduler.chunk_job = MagicMock()
+        self.scheduler.iter_chunk_dates = MagicMock(return_value=[{'a': 'foo'}, {'b': 'bar'}])
+        self.scheduler.iter_chunk_job = MagicMock(side_effect=lambda job: [job])
 
         r = self.scheduler.construct_job_data({'pl': 1})
 
-        self.scheduler.chunk_dates.assert_called_once()
-        self.scheduler.chunk_job.assert_called()
-        self.assertEqual(self.scheduler.chunk_job.call_count, 2)
+        self.scheduler.iter_chunk_dates.assert_called_once()
+        self.scheduler.iter_chunk_job.assert_called()
+        self.assertEqual(self.scheduler.iter_chunk_job.call_count, 2)
+        self.assertEqual(r, [{'a': 'foo'}, {'b': 'bar'}])
+
+
+    def test_iter_job_data__is_lazy(self):
+
+        self.scheduler.iter_chunk_dates = MagicMock(return_value=[{'a': 'foo'}, {'b': 'bar'}])
+        self.scheduler.iter_chunk_job = MagicMock(side_effect=lambda job: [job])
+
+        r = self.scheduler.iter_job_data({'pl': 1})
+
+        self.scheduler.iter_chunk_dates.assert_not_called()
+        self.assertEqual(next(r), {'a': 'foo'})
+        self.assertEqual(self.scheduler.iter_chunk_job.call_count, 1)
 
 
     def test_construct_job_data__preserve_skeleton_through_chunkers(self):
@@ -603,6 +1170,28 @@ class Scheduler_UnitTestCase(unittest.TestCase):
         self.check_number_of_tasks(NUMBER_TASKS_EXPECTED, response)
 
 
+    def test_chunk_job__does_not_modify_job(self):
+
+        pl = deepcopy(self.PAYLOAD)
+        pl['sections']['section_weddings']['stores']['store_music']['isolate_products'] = True
+        pl['period'] = 'last_2_days'
+        pl['isolate_days'] = True
+        original = deepcopy(pl)
+
+        tasks = self.scheduler.construct_job_data(job=pl, skeleton={'labourer_id': 'some'})
+
+        self.assertEqual(pl, original)
+        self.assertEqual(len(tasks), 2 * len(self.scheduler.chunk_job(job=original)))
+
+
+    def test_iter_chunk_job__is_generator(self):
+
+        r = self.scheduler.iter_chunk_job(job=deepcopy(self.PAYLOAD))
+
+        self.assertTrue(inspect.isgenerator(r))
+        self.assertEqual(list(r), self.scheduler.chunk_job(job=deepcopy(self.PAYLOAD)))
+
+
     def test_chunk_job__unchunckable_preserve_custom_attrs(self):
 
         pl = {
@@ -801,6 +1390,8 @@ class Scheduler_UnitTestCase(unittest.TestCase):
 
 
     def test_get_and_lock_queue_file__s3_calls(self):
+        self.scheduler.s3_client.head_object.side_effect = None
+        self.scheduler.s3_client.head_object.return_value = {'Metadata': {}, 'ContentLength': 100}
 
         self.scheduler.get_and_lock_queue_file()
         self.scheduler.s3_client.download_file.assert_called_once()
@@ -869,6 +1460,55 @@ class Scheduler_UnitTestCase(unittest.TestCase):
                 self.assertIn(parsed_row['sections'][0], SAMPLE_SIMPLE_JOB['sections'])
 
 
+    def test_parse_job_to_file__compressed(self):
+
+        self.scheduler.config['queue_file_compression'] = 'gzip'
+        self.scheduler.config['rows_to_process'] = 2
+        self.scheduler.set_queue_file()
+        self.assertTrue(self.scheduler.local_queue_file.endswith('.txt.gz'))
+
+        SAMPLE_JOB = {
+            'lambda_name':      self.LABOURER.id,
+            'isolate_sections': True,
+            'sections':         {f"section_{i}": None for i in range(5)},
+        }
+
+        self.scheduler.parse_job_to_file(SAMPLE_JOB)
+
+        # Frames of `rows_to_process` rows are read one by one. The offsets are at the frame boundaries.
+        rows, offset = self.scheduler.read_rows_from_file(self.scheduler.local_queue_file, rows=2)
+        self.assertEqual([json.loads(r)['sections'] for r in rows], [['section_0'], ['section_1']])
+
+        rows, offset = self.scheduler.read_rows_from_file(self.scheduler.local_queue_file, offset=offset, rows=2)
+        self.assertEqual([json.loads(r)['sections'] for r in rows], [['section_2'], ['section_3']])
+
+        rows, offset = self.scheduler.read_rows_from_file(self.scheduler.local_queue_file, offset=offset, rows=2)
+        self.assertEqual([json.loads(r)['sections'] for r in rows], [['section_4']])
+        self.assertEqual(offset, os.path.getsize(self.scheduler.local_queue_file))
+
+
+    def test_get_queue_shard_names__compressed(self):
+        self.scheduler.set_queue_file('tasks_queue_ID.txt.gz')
+
+        self.assertEqual(self.scheduler.get_queue_shard_names(2),
+                         ['tasks_queue_ID_shard_0.txt.gz', 'tasks_queue_ID_shard_1.txt.gz'])
+
+
+    def test_parse_job_to_file__cleans_up_on_invalid_job(self):
+
+        SAMPLE_INVALID_JOB = {
+            'lambda_name':      self.LABOURER.id,
+            'isolate_sections': True,
+            'sections':         {
+                'section_technic':   None,
+                'section_furniture': 'not_a_dict',
+            },
+        }
+
+        self.assertRaises(InvalidJob, self.scheduler.parse_job_to_file, SAMPLE_INVALID_JOB)
+        self.assertFalse(os.path.isfile(self.scheduler.local_queue_file))
+
+
     def test_call__sample(self):
         SAMPLE_SIMPLE_JOB = {
             'lambda_name':  self.LABOURER.id,
@@ -876,35 +1516,333 @@ class Scheduler_UnitTestCase(unittest.TestCase):
         }
         print(json.dumps(SAMPLE_SIMPLE_JOB))
 
-        self.scheduler.task_client.create_task.return_value = {'task_id': 123,
-                                                               'labourer_id': SAMPLE_SIMPLE_JOB['lambda_name'],
-                                                               **SAMPLE_SIMPLE_JOB}
+        self.scheduler.task_client.create_tasks.return_value = [{'task_id': 123,
+                                                                 'labourer_id': SAMPLE_SIMPLE_JOB['lambda_name'],
+                                                                 **SAMPLE_SIMPLE_JOB}]
 
-        with patch('sosw.scheduler.Scheduler._sleeptime_for_dynamo', new_callable=PropertyMock) as mock_sleeptime:
-            mock_sleeptime.return_value = 0.0001
+        with patch('sosw.scheduler.Scheduler.write_limiter', new_callable=PropertyMock) as mock_limiter:
+            mock_limiter.return_value = None
 
             r = self.scheduler(json.dumps(SAMPLE_SIMPLE_JOB))
             print(r)
 
-        self.scheduler.task_client.create_task.assert_called_once()
+        self.scheduler.task_client.create_tasks.assert_called_once()
+        self.scheduler.meta_handler.post.assert_called_once()
 
+        # Small jobs are processed in memory without the queue file.
         self.scheduler.s3_client.download_file.assert_not_called()
         self.scheduler.s3_client.copy_object.assert_not_called()
+        self.scheduler.s3_client.upload_file.assert_not_called()
+        self.scheduler.s3_client.delete_object.assert_not_called()
+        self.assertFalse(os.path.isfile(self.scheduler.local_queue_file))
+        self.assertEqual(self.scheduler.stats['jobs_processed_in_memory'], 1)
+
+
+    def test_call__large_job_uses_queue_file(self):
+        # Scheduler is called with the default job schema which chunks `b` attribute.
+        self.scheduler.config['in_memory_tasks_threshold'] = 2
+        SAMPLE_JOB = {
+            'lambda_name': self.LABOURER.id,
+            'isolate_bs':  True,
+            'bs':          {f"b_{i}": None for i in range(3)},
+        }
+
+        self.scheduler.process_file = MagicMock()
+        self.scheduler(json.dumps(SAMPLE_JOB))
+
+        self.scheduler.task_client.create_tasks.assert_not_called()
+        self.scheduler.process_file.assert_called_once()
+        self.assertEqual(line_count(self.scheduler.local_queue_file), 3)
+
+
+    def test_call__in_memory_persists_remaining_if_no_time(self):
+        self.scheduler.config['rows_to_process'] = 2
+        SAMPLE_JOB = {
+            'lambda_name': self.LABOURER.id,
+            'isolate_bs':  True,
+            'bs':          {f"b_{i}": None for i in range(5)},
+        }
+
+        # Enough time for the first batch only. Each check of the time calls the context once.
+        self.custom_lambda_context.get_remaining_time_in_millis.side_effect = [300000, 300000, 1000, 1000, 1000]
+        self.scheduler.process_file = MagicMock()
+
+        self.scheduler(json.dumps(SAMPLE_JOB))
+
+        self.scheduler.task_client.create_tasks.assert_called_once()
+        self.scheduler.process_file.assert_called_once()
+        self.assertEqual(line_count(self.scheduler.local_queue_file), 3)
 
-        self.scheduler.s3_client.upload_file.assert_called_once()
-        self.scheduler.s3_client.delete_object.assert_called_once()
 
+    def test_extract_jobs_from_event(self):
+        JOB = {'lambda_name': self.LABOURER.id, 'a': 1}
 
-    def test_sleeptime_for_dynamo(self):
+        self.assertIsNone(self.scheduler.extract_jobs_from_event(JOB))
+        self.assertIsNone(self.scheduler.extract_jobs_from_event({'job': json.dumps(JOB)}))
+        self.assertIsNone(self.scheduler.extract_jobs_from_event(json.dumps({'file_name': 'x'})))
 
+        self.assertEqual(self.scheduler.extract_jobs_from_event([JOB, JOB]), [('0', JOB), ('1', JOB)])
+        self.assertEqual(self.scheduler.extract_jobs_from_event(json.dumps({'jobs': [JOB]})), [('0', JOB)])
+
+        SNS_WRAPPED = {'Records': [{'Sns': {'Message': json.dumps(JOB)}}]}
+        SQS_EVENT = {'Records': [
+            {'messageId': 'm1', 'eventSource': 'aws:sqs', 'body': json.dumps(JOB)},
+            {'messageId': 'm2', 'eventSource': 'aws:sqs', 'body': json.dumps(SNS_WRAPPED)},
+        ]}
+        self.assertEqual(self.scheduler.extract_jobs_from_event(SQS_EVENT), [('m1', JOB), ('m2', JOB)])
+
+
+    def test_call__batch_of_jobs(self):
+        JOBS = [
+            {'lambda_name': self.LABOURER.id, 'isolate_bs': True, 'bs': ['b1', 'b2']},
+            {'lambda_name': 'unregistered_function'},
+            {'no_lambda_name': True},
+            {'lambda_name': self.LABOURER.id, 'some_payload': 'foo'},
+        ]
+
+        def get_labourer(labourer_id):
+            return self.LABOURER if labourer_id == self.LABOURER.id else None
+
+        self.scheduler.task_client.get_labourer.side_effect = get_labourer
+        self.scheduler.task_client.create_tasks.side_effect = \
+            lambda labourer, rows, rate_limiter: [{'task_id': str(i)} for i, _ in enumerate(rows)]
+
+        r = self.scheduler(json.dumps(JOBS))
+
+        self.assertEqual(r, {'batchItemFailures': [{'itemIdentifier': '1'}, {'itemIdentifier': '2'}]})
+
+        # All the tasks of the good jobs are combined to a single stream.
+        self.scheduler.task_client.create_tasks.assert_called_once()
+        rows = self.scheduler.task_client.create_tasks.call_args[1]['rows']
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(self.scheduler.stats['jobs_in_batches'], 4)
+        self.assertEqual(self.scheduler.stats['failed_jobs_in_batches'], 2)
+        self.scheduler.s3_client.upload_file.assert_not_called()
+
+
+    def test_call__batch_of_jobs__sqs_to_queue_file(self):
+        self.scheduler.config['in_memory_tasks_threshold'] = 2
+        JOB = {'lambda_name': self.LABOURER.id, 'isolate_bs': True, 'bs': ['b1', 'b2']}
+        SQS_EVENT = {'Records': [
+            {'messageId': 'm1', 'eventSource': 'aws:sqs', 'body': json.dumps(JOB)},
+            {'messageId': 'm2', 'eventSource': 'aws:sqs', 'body': json.dumps({**JOB, 'dry_run': True})},
+            {'messageId': 'm3', 'eventSource': 'aws:sqs', 'body': json.dumps(JOB)},
+        ]}
+        self.scheduler.process_file = MagicMock()
+
+        r = self.scheduler(SQS_EVENT)
+
+        self.assertEqual(r, {'batchItemFailures': [{'itemIdentifier': 'm2'}]})
+        self.scheduler.task_client.create_tasks.assert_not_called()
+        self.scheduler.process_file.assert_called_once()
+        self.assertEqual(line_count(self.scheduler.local_queue_file), 4)
+
+
+    def test_call__batch_of_jobs__sqs_bad_body(self):
+        JOB = {'lambda_name': self.LABOURER.id, 'some_payload': 'foo'}
+        SQS_EVENT = {'Records': [
+            {'messageId': 'm1', 'eventSource': 'aws:sqs', 'body': json.dumps(JOB)},
+            {'messageId': 'm2', 'eventSource': 'aws:sqs', 'body': '{"lambda_name": broken'},
+            {'messageId': 'm3', 'eventSource': 'aws:sqs', 'body': json.dumps(JOB)},
+        ]}
+        self.scheduler.task_client.create_tasks.side_effect = \
+            lambda labourer, rows, rate_limiter: [{'task_id': str(i)} for i, _ in enumerate(rows)]
+
+        with patch('sosw.scheduler.Scheduler.write_limiter', new_callable=PropertyMock) as mock_limiter:
+            mock_limiter.return_value = None
+            r = self.scheduler(SQS_EVENT)
+
+        # The bad message does not affect the others.
+        self.assertEqual(r, {'batchItemFailures': [{'itemIdentifier': 'm2'}]})
+        self.assertEqual(len(self.scheduler.task_client.create_tasks.call_args[1]['rows']), 2)
+        self.assertEqual(self.scheduler.stats['jobs_in_batches'], 3)
+        self.assertEqual(self.scheduler.stats['failed_jobs_in_batches'], 1)
+
+
+    def test_plan_job(self):
+        SAMPLE_JOB = {
+            'lambda_name': self.LABOURER.id,
+            'isolate_bs':  True,
+            'bs':          {f"b_{i}": None for i in range(250)},
+        }
+        self.scheduler.task_client.construct_payload_for_task.side_effect = lambda **kw: json.dumps(kw)
         self.scheduler.task_client.dynamo_db_client.get_capacity.return_value = {'read': 10, 'write': 10}
-        self.assertEqual(round(self.scheduler._sleeptime_for_dynamo, 2), 0.07)
 
-        self.scheduler.task_client.dynamo_db_client.get_capacity.return_value = {'read': 10, 'write': 25}
-        self.assertEqual(round(self.scheduler._sleeptime_for_dynamo, 2), 0.01)
+        plan = self.scheduler.plan_job(SAMPLE_JOB, invocation_seconds=70)
+
+        self.assertEqual(plan['tasks'], 250)
+        self.assertEqual(plan['avg_payload_bytes'], len(json.dumps({'isolate_bs': True, 'bs': ['b_100']})))
+        self.assertEqual(plan['wcu'], 250)
+        self.assertEqual(plan['write_rate'], 9.5)
+        self.assertFalse(plan['in_memory'])
+        self.assertAlmostEqual(plan['duration_seconds'], 26.3)
+        # 10 seconds per invocation after the shutdown period.
+        self.assertEqual(plan['siblings'], 2)
+
+        # The job is not modified and nothing is written.
+        self.assertIn('lambda_name', SAMPLE_JOB)
+        self.scheduler.task_client.create_tasks.assert_not_called()
+        self.assertFalse(os.path.isfile(self.scheduler.local_queue_file))
+
+
+    def test_plan_job__on_demand(self):
+        SAMPLE_JOB = {'lambda_name': self.LABOURER.id, 'some_payload': 'x' * 2000}
+        self.scheduler.task_client.construct_payload_for_task.side_effect = lambda **kw: json.dumps(kw)
+
+        plan = self.scheduler.plan_job(SAMPLE_JOB)
+
+        self.assertEqual(plan['tasks'], 1)
+        self.assertEqual(plan['wcu'], 3)
+        self.assertTrue(plan['in_memory'])
+        self.assertIsNone(plan['duration_seconds'])
+        self.assertIsNone(plan['siblings'])
+
+
+    def test_call__dry_run(self):
+        SAMPLE_JOB = {'lambda_name': self.LABOURER.id, 'dry_run': True, 'isolate_bs': True, 'bs': ['b1', 'b2']}
+        self.scheduler.task_client.construct_payload_for_task.side_effect = lambda **kw: json.dumps(kw)
+
+        r = self.scheduler(json.dumps(SAMPLE_JOB))
+
+        self.assertEqual(r['tasks'], 2)
+        self.scheduler.task_client.create_tasks.assert_not_called()
+        self.scheduler.s3_client.upload_file.assert_not_called()
+
+
+    def test_fits_in_time_budget(self):
+        self.assertTrue(self.scheduler.fits_in_time_budget(1000000))
+
+        # 5 minutes left, 60 seconds of shutdown period.
+        self.scheduler.task_client.dynamo_db_client.get_capacity.return_value = {'read': 10, 'write': 10}
+        self.assertTrue(self.scheduler.fits_in_time_budget(2000))
+        self.assertFalse(self.scheduler.fits_in_time_budget(3000))
+
+
+    def test_write_limiter(self):
+
+        self.scheduler.task_client.dynamo_db_client.get_capacity.return_value = {'read': 10, 'write': 100}
+        limiter = self.scheduler.write_limiter
+        self.assertEqual(limiter.rate, 95)
+
+        # The bucket is preserved, but follows the changes of capacity and sharding.
+        self.scheduler._queue_shards_count = 2
+        self.assertIs(self.scheduler.write_limiter, limiter)
+        self.assertEqual(limiter.rate, 47.5)
+
+
+    def test_get_stats__write_limiter_per_invocation(self):
+
+        self.scheduler.task_client.dynamo_db_client.get_capacity.return_value = {'read': 10, 'write': 100}
+        limiter = self.scheduler.write_limiter
+
+        limiter.consume(10)
+        self.assertEqual(self.scheduler.get_stats()['token_bucket_consumed'], 10)
+        self.scheduler.reset_stats()
+
+        # The next invocation reports only its own consumption. The lifetime one goes to the total.
+        limiter.consume(5)
+        stats = self.scheduler.get_stats()
+        self.assertEqual(stats['token_bucket_consumed'], 5)
+        self.assertEqual(stats['total_token_bucket_consumed'], 10)
+
+
+    def test_write_limiter__on_demand(self):
+
+        self.scheduler.task_client.dynamo_db_client.get_capacity.return_value = None
+        self.assertIsNone(self.scheduler.write_limiter)
+
+
+    def test_get_number_of_queue_shards(self):
+
+        self.assertEqual(self.scheduler.get_number_of_queue_shards(), 1)
+
+        self.scheduler.config['queue_shards'] = 4
+        self.assertEqual(self.scheduler.get_number_of_queue_shards(), 4)
+
+        self.scheduler.config['queue_shards'] = 'auto'
+        self.scheduler.task_client.dynamo_db_client.get_capacity.return_value = {'read': 10, 'write': 60}
+        self.assertEqual(self.scheduler.get_number_of_queue_shards(), 3)
+
+        self.scheduler.task_client.dynamo_db_client.get_capacity.return_value = None
+        self.assertEqual(self.scheduler.get_number_of_queue_shards(), self.scheduler.config['max_queue_shards'])
+
+        # On-demand table.
+        self.scheduler.task_client.dynamo_db_client.get_capacity.return_value = {'read': 0, 'write': 0}
+        self.assertEqual(self.scheduler.get_number_of_queue_shards(), self.scheduler.config['max_queue_shards'])
+
+        self.scheduler.siblings_client.any_events_rules_enabled.return_value = False
+        self.assertEqual(self.scheduler.get_number_of_queue_shards(), 1)
+
+
+    def test_parse_job_to_file__sharded(self):
+
+        self.scheduler.config['queue_shards'] = 3
+        JOB = {
+            'lambda_name':      self.LABOURER.id,
+            'isolate_sections': True,
+            'sections':         {f"section_{i}": None for i in range(5)},
+        }
+
+        shards = self.scheduler.parse_job_to_file(JOB)
+
+        try:
+            self.assertEqual(len(shards), 3)
+            self.assertEqual(self.scheduler.local_queue_file, f"/tmp/{shards[0]}")
+            self.assertEqual(self.scheduler._queue_shards_count, 3)
+            self.assertEqual([line_count(f"/tmp/{name}") for name in shards], [2, 2, 1])
+        finally:
+            for name in shards:
+                self.scheduler.clean_tmp(f"/tmp/{name}")
+
+
+    def test_parse_job_to_file__sharded__drops_empty_shards(self):
+
+        self.scheduler.config['queue_shards'] = 3
+        JOB = {
+            'lambda_name':      self.LABOURER.id,
+            'isolate_sections': True,
+            'sections':         {'section_technic': None, 'section_furniture': None},
+        }
+
+        shards = self.scheduler.parse_job_to_file(JOB)
+
+        try:
+            self.assertEqual(len(shards), 2)
+            self.assertEqual(self.scheduler._queue_shards_count, 2)
+            self.assertFalse(os.path.isfile(f"/tmp/{self.scheduler.get_queue_shard_names(3)[2]}"))
+        finally:
+            for name in shards:
+                self.scheduler.clean_tmp(f"/tmp/{name}")
+
+
+    def test_spawn_queue_shard_consumers(self):
+
+        self.scheduler._queue_shards_count = 3
+        shards = ['shard_1.txt', 'shard_2.txt']
+        for name in shards:
+            self.put_local_file(f"/tmp/{name}")
+
+        self.scheduler.spawn_queue_shard_consumers(shards)
+
+        self.assertEqual(self.scheduler.s3_client.upload_file.call_count, 2)
+        self.assertFalse(any(os.path.isfile(f"/tmp/{name}") for name in shards))
+
+        self.scheduler.siblings_client.spawn_siblings.assert_called_once()
+        _, kwargs = self.scheduler.siblings_client.spawn_siblings.call_args
+        self.assertEqual(kwargs['payloads'], [{'file_name': 'shard_1.txt', 'queue_shards': 3},
+                                              {'file_name': 'shard_2.txt', 'queue_shards': 3}])
+
+
+    def test_call__as_shard_consumer(self):
+
+        self.scheduler.process_file = MagicMock()
+        self.scheduler({'job': {'lambda_name': 'test_lambda', 'file_name': 'shard_1.txt', 'queue_shards': 3,
+                                'backpressure_continuations': 2}})
 
-        self.scheduler.task_client.dynamo_db_client.get_capacity.return_value = {'read': 10, 'write': 50}
-        self.assertEqual(round(self.scheduler._sleeptime_for_dynamo, 2), 0)
+        self.assertEqual(self.scheduler.local_queue_file, '/tmp/shard_1.txt')
+        self.assertEqual(self.scheduler._queue_shards_count, 3)
+        self.assertEqual(self.scheduler._backpressure_continuations, 2)
+        self.scheduler.siblings_client.spawn_siblings.assert_not_called()
 
 
     def test_apply_job_schema(self):
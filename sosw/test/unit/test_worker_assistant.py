@@ -1,6 +1,6 @@
 import os
 import unittest
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, MagicMock
 
 
 os.environ["STAGE"] = "test"
@@ -18,6 +18,9 @@ class WorkerAssistant_UnitTestCase(unittest.TestCase):
         with patch('boto3.client'):
             self.worker_assistant = WorkerAssistant(custom_config=self.TEST_CONFIG)
 
+        self.worker_assistant.dynamo_db_client = MagicMock()
+        self.worker_assistant.meta_handler = MagicMock()
+
 
     def test_call__unknown_action__raises(self):
         event = {
@@ -47,3 +50,133 @@ class WorkerAssistant_UnitTestCase(unittest.TestCase):
         }
         with self.assertRaises(Exception):
             self.worker_assistant(event)
+
+
+    def test_mark_task_as_completed__duration_stats_disabled(self):
+        self.worker_assistant.dynamo_db_client.update.return_value = {
+            'task_id': '123', 'labourer_id': 'some_lambda', 'greenfield': 1000,
+        }
+
+        self.worker_assistant.mark_task_as_completed('123')
+
+        self.worker_assistant.dynamo_db_client.update.assert_called_once()
+        self.assertNotIn('duration_recorded',
+                         self.worker_assistant.dynamo_db_client.update.call_args[1]['attributes_to_update'])
+        self.assertIsNone(self.worker_assistant.task_client)
+
+
+    @patch('time.time', return_value=1030)
+    def test_mark_task_as_completed__records_duration(self, _):
+        self.worker_assistant.config['labourer_duration_stats'] = True
+        self.worker_assistant.task_client = MagicMock()
+        self.worker_assistant.task_client.get_task_duration.return_value = 30
+        self.worker_assistant.dynamo_db_client.update.return_value = {
+            'task_id': '123', 'labourer_id': 'some_lambda', 'greenfield': 1000,
+        }
+
+        self.worker_assistant.mark_task_as_completed('123')
+
+        task_update = self.worker_assistant.dynamo_db_client.update.call_args
+        self.assertEqual(task_update[1]['attributes_to_update']['duration_recorded'], 1)
+        self.assertEqual(task_update[1]['return_values'], 'ALL_OLD')
+
+        self.worker_assistant.task_client.get_task_duration.assert_called_once_with(
+                {'task_id': '123', 'labourer_id': 'some_lambda', 'greenfield': 1000, 'completed_at': 1030,
+                 'duration_recorded': 1})
+        self.worker_assistant.task_client.record_labourer_duration.assert_called_once_with('some_lambda', 30)
+
+
+    def test_mark_task_as_completed__record_duration_fails(self):
+        self.worker_assistant.config['labourer_duration_stats'] = True
+        self.worker_assistant.task_client = MagicMock()
+        self.worker_assistant.task_client.record_labourer_duration.side_effect = Exception("Boom")
+        self.worker_assistant.dynamo_db_client.update.side_effect = [
+            {'task_id': '123', 'labourer_id': 'some_lambda', 'greenfield': 1000},
+            None,
+        ]
+
+        self.worker_assistant.mark_task_as_completed('123')
+
+        # The flag is removed, so that Scavenger records the duration later.
+        self.worker_assistant.dynamo_db_client.update.assert_called_with(keys={'task_id': '123'},
+                                                                          attributes_to_remove=['duration_recorded'])
+
+
+    def test_init__registers_task_manager_for_duration_stats(self):
+        with patch('boto3.client'), patch('sosw.worker_assistant.WorkerAssistant.register_clients') as register:
+            WorkerAssistant(custom_config={**self.TEST_CONFIG, 'labourer_duration_stats': True})
+
+        register.assert_any_call(['Task'])
+
+
+    def test_mark_task_as_completed__repeated(self):
+        self.worker_assistant.config['labourer_counters'] = True
+        self.worker_assistant.task_client = MagicMock()
+        self.worker_assistant.task_client.get_task_by_id.return_value = {
+            'task_id': '123', 'labourer_id': 'some_lambda', 'greenfield': 1000, 'completed_at': 1030,
+        }
+
+        self.worker_assistant.mark_task_as_completed('123')
+
+        # Neither the task, nor the counters are updated.
+        self.worker_assistant.task_client.transact_write_with_counters.assert_not_called()
+        self.worker_assistant.dynamo_db_client.update.assert_not_called()
+
+
+    def test_mark_task_as_completed__updates_counters(self):
+        self.worker_assistant.config['labourer_counters'] = True
+        self.worker_assistant.task_client = MagicMock()
+        self.worker_assistant.task_client.get_task_by_id.return_value = {
+            'task_id': '123', 'labourer_id': 'some_lambda', 'greenfield': 1000,
+        }
+        completion = self.worker_assistant.dynamo_db_client.make_update_transaction_item.return_value
+
+        self.worker_assistant.mark_task_as_completed('123')
+
+        # The completion and the counters are written in the same transaction.
+        self.worker_assistant.dynamo_db_client.update.assert_not_called()
+        _, kwargs = self.worker_assistant.dynamo_db_client.make_update_transaction_item.call_args
+        self.assertEqual(kwargs['keys'], {'task_id': '123'})
+        self.assertIn('completed_at', kwargs['attributes_to_update'])
+        self.assertEqual(kwargs['condition_expression'], 'attribute_not_exists completed_at')
+        self.worker_assistant.task_client.transact_write_with_counters.assert_called_once_with(
+                'some_lambda', completion, running=-1, completed=1)
+
+
+    def test_mark_task_as_completed__counters__completed_concurrently(self):
+        self.worker_assistant.config['labourer_counters'] = True
+        self.worker_assistant.config['labourer_duration_stats'] = True
+        self.worker_assistant.task_client = MagicMock()
+        self.worker_assistant.task_client.get_task_by_id.return_value = {
+            'task_id': '123', 'labourer_id': 'some_lambda', 'greenfield': 1000,
+        }
+
+        class ConditionalCheckFailedException(Exception):
+            pass
+
+        self.worker_assistant.task_client.transact_write_with_counters.side_effect = ConditionalCheckFailedException
+
+        self.worker_assistant.mark_task_as_completed('123')
+
+        # The other call has already recorded everything.
+        self.worker_assistant.task_client.record_labourer_duration.assert_not_called()
+
+
+    def test_mark_task_as_completed__counters__transaction_fails(self):
+        self.worker_assistant.config['labourer_counters'] = True
+        self.worker_assistant.task_client = MagicMock()
+        self.worker_assistant.task_client.get_task_by_id.return_value = {
+            'task_id': '123', 'labourer_id': 'some_lambda', 'greenfield': 1000,
+        }
+        self.worker_assistant.task_client.transact_write_with_counters.side_effect = Exception("Boom")
+
+        # The Worker should know that the task is not marked completed.
+        with self.assertRaises(Exception):
+            self.worker_assistant.mark_task_as_completed('123')
+
+
+    def test_init__registers_task_manager_for_counters(self):
+        with patch('boto3.client'), patch('sosw.worker_assistant.WorkerAssistant.register_clients') as register:
+            WorkerAssistant(custom_config={**self.TEST_CONFIG, 'labourer_counters': True})
+
+        register.assert_any_call(['Task'])
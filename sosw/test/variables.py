@@ -58,6 +58,8 @@ TEST_TASK_CLIENT_CONFIG = {
     'sosw_closed_tasks_table':           get_autotest_ddb_name_with_custom_suffix('sosw_closed_tasks'),
     'sosw_retry_tasks_table':            get_autotest_ddb_name_with_custom_suffix('sosw_retry_tasks'),
     'sosw_retry_tasks_greenfield_index': 'labourer_id_greenfield',
+    'sosw_labourer_stats_table':         get_autotest_ddb_name_with_custom_suffix('sosw_labourer_stats'),
+    'sosw_labourer_counters_table':      get_autotest_ddb_name_with_custom_suffix('sosw_labourer_counters'),
     'ecology_config':                    TEST_ECOLOGY_CLIENT_CONFIG,
     'labourers':                         {
         'some_function': {
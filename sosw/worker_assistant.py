@@ -31,6 +31,16 @@ __all__ = ['WorkerAssistant']
 __author__ = "Sophie Fogel"
 __version__ = "1.0"
 
+try:
+    from aws_lambda_powertools import Logger
+
+    logger = Logger()
+
+except ImportError:
+    import logging
+
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
 
 import json
 import time
@@ -38,7 +48,8 @@ import time
 from sosw.essential import Essential
 from sosw.components.dynamo_db import DynamoDbClient
 from sosw.components.helpers import get_one_from_dict
-from typing import Dict
+from sosw.managers.task import TaskManager
+from typing import Dict, Optional
 
 
 class WorkerAssistant(Essential):
@@ -72,15 +83,32 @@ class WorkerAssistant(Essential):
                 'payload':             'S',
                 'stats':               'M',
                 'result':              'S',
+                'duration_recorded':   'N',
             },
             'required_fields':  ['task_id', 'labourer_id', 'created_at', 'greenfield'],
 
             'field_names':      {}
-        }
+        },
+
+        # Opt-in: add the duration of completed task to the running statistics of the Labourer.
+        # Requires TaskManager (configured with `task_config`) with the same option enabled.
+        'labourer_duration_stats':          False,
+
+        # Materialized counters of tasks per Labourer. See `TaskManager.reconcile_labourer_counters()`.
+        # Requires TaskManager (configured with `task_config`) with the same option enabled.
+        'labourer_counters':                False,
     }
 
     # these clients will be initialized by Processor constructor
     dynamo_db_client: DynamoDbClient = None
+    task_client: TaskManager = None
+
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        if (self.config['labourer_duration_stats'] or self.config['labourer_counters']) and not self.task_client:
+            self.register_clients(['Task'])
 
 
     def __call__(self, event):
@@ -130,6 +158,8 @@ class WorkerAssistant(Essential):
         _ = self.get_db_field_name
 
         fields_to_update = {_('completed_at'): int(time.time())}
+        if self.config['labourer_duration_stats']:
+            fields_to_update[_('duration_recorded')] = 1
 
         if stats:
             fields_to_update.update({f'stat_{k}': v for k, v in stats.items()})
@@ -137,12 +167,81 @@ class WorkerAssistant(Essential):
         if result:
             fields_to_update.update({f'result_{k}': v for k, v in result.items()})
 
-        self.dynamo_db_client.update(
-            keys={_('task_id'): task_id},
-            attributes_to_update=fields_to_update,
-        )
+        if self.config['labourer_counters']:
+            old_task = self.complete_task_with_counters(task_id, fields_to_update)
+        else:
+            old_task = self.dynamo_db_client.update(
+                keys={_('task_id'): task_id},
+                attributes_to_update=fields_to_update,
+                return_values='ALL_OLD',
+            )
         self.meta_handler.post(task_id=task_id, action='marked_as_completed')
 
+        if old_task is None:
+            logger.info("Task %s was already marked as completed", task_id)
+            return
+
+        # Repeated completions are not recorded again.
+        task = {**old_task, **fields_to_update}
+        if self.config['labourer_duration_stats'] and not old_task.get(_('duration_recorded')):
+            self.record_duration(task)
+
+
+    def complete_task_with_counters(self, task_id: str, fields_to_update: Dict) -> Optional[Dict]:
+        """
+        Mark the task completed and move it from `running` to `completed` in the counters of its Labourer
+        in a single transaction. The update is conditional, so the repeated completions are not counted.
+
+        :return:    The task before the update or None if it was already completed.
+        """
+
+        _ = self.get_db_field_name
+
+        old_task = self.task_client.get_task_by_id(task_id)
+        if old_task.get(_('completed_at')):
+            return None
+
+        if not old_task.get(_('labourer_id')):
+            logger.warning("Task %s is not found. Marking it completed without counters.", task_id)
+            return self.dynamo_db_client.update(keys={_('task_id'): task_id}, attributes_to_update=fields_to_update,
+                                                return_values='ALL_OLD')
+
+        completion = self.dynamo_db_client.make_update_transaction_item(
+                keys={_('task_id'): task_id}, attributes_to_update=fields_to_update,
+                condition_expression=f"attribute_not_exists {_('completed_at')}")
+
+        try:
+            self.task_client.transact_write_with_counters(old_task[_('labourer_id')], completion,
+                                                          running=-1, completed=1)
+        except Exception as err:
+            if not TaskManager._is_conditional_check_failed(err):
+                raise
+            return None
+
+        return old_task
+
+
+    def record_duration(self, task: Dict):
+        """
+        Add the duration of the completed `task` to the running statistics of its Labourer with
+        ``TaskManager.record_labourer_duration()``. This is best effort: in case of failure the task is left
+        for Scavenger to record the duration while archiving it.
+        """
+
+        _ = self.get_db_field_name
+
+        duration = self.task_client.get_task_duration(task) if task.get(_('labourer_id')) else None
+        if duration is None:
+            logger.warning("Can not record duration of task without `labourer_id` or `greenfield`: %s", task)
+            return
+
+        try:
+            self.task_client.record_labourer_duration(task[_('labourer_id')], duration)
+        except Exception:
+            logger.exception("Failed to record duration of task %s", task.get(_('task_id')))
+            self.dynamo_db_client.update(keys={_('task_id'): task[_('task_id')]},
+                                         attributes_to_remove=[_('duration_recorded')])
+
 
     def mark_task_as_failed(self, task_id: str, stats: Dict = None, result: Dict = None):
         assert isinstance(task_id, str), f"`task_id` must be a string"